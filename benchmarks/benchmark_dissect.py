@@ -0,0 +1,423 @@
+'''
+Headless benchmark for the dissect pipeline
+
+Generates synthetic areas of interest (several sizes and shapes) and synthetic interest
+layers (points, lines, polygons, many vertex polygons, invalid polygons) as local
+GeoPackage/shapefile sources described by a generated configuration, runs the dissect
+algorithm against each area of interest in a standalone QgsApplication and saves the time
+spent in DissectAlg.processAlgorithm, report.add_interest, report.vectorlayer_to_geojson
+and report.report as JSON so runs can be compared.
+
+The script import (what the Processing toolbox pays when it loads) is also timed in fresh
+interpreters twice: as it is (dependencies deferred) and followed by the dependencies dissect
+used to import at module level (EAGER_IMPORTS), the before/after of deferring them.
+
+usage (OSGeo4W shell or any python with qgis importable):
+    python benchmarks/benchmark_dissect.py --sizes 100 10000 --repeat 2
+    python benchmarks/benchmark_dissect.py --compare benchmarks/results/<earlier run>.json
+
+no database is needed, only file sources are configured. Runs use a temporary QGIS profile
+so the metadata/result caches and settings of the real profile are not touched.
+'''
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import statistics
+import datetime
+import platform
+import tempfile
+import functools
+import subprocess
+import importlib.util
+
+try:
+    from bcgov_qgis_boiler_plate import * # your standalone QGIS module here (see install.py)
+except:
+    pass
+
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import (Qgis,
+                       QgsApplication,
+                       QgsFeature,
+                       QgsField,
+                       QgsGeometry,
+                       QgsPointXY,
+                       QgsRectangle,
+                       QgsProject,
+                       QgsSettings,
+                       QgsVectorFileWriter,
+                       QgsVectorLayer)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(REPO_ROOT,'dissect','dissect.py')
+# synthetic data is placed in the middle of BC Albers
+CENTER = (1000000.0, 1000000.0)
+CRS = 'EPSG:3005'
+SHAPES = ['square','circle','irregular','multipart']
+CLASSES = ['ALPHA','BRAVO','CHARLIE','DELTA','ECHO']
+# stages timed by wrapping these (class name, method name)
+TIMED = [('DissectAlg','processAlgorithm'),
+         ('report','add_interest'),
+         ('report','vectorlayer_to_geojson'),
+         ('report','report')]
+# dependencies dissect.py imported at module level before they were deferred (deferred_import)
+EAGER_IMPORTS = ['pandas','jinja2','yaml','osgeo.gdal','osgeo.ogr','osgeo.osr']
+# run in a fresh interpreter: argv script path, then modules to import after it
+# qgis is imported before the clock starts, QGIS has it loaded before the toolbox reads scripts
+IMPORT_PROBE = '''
+import sys, json, time, importlib, importlib.util
+from qgis.PyQt import QtCore, QtGui, QtSql
+from qgis import core, processing
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('dissect_probe',sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+for name in sys.argv[2:]:
+    importlib.import_module(name)
+print(json.dumps({'seconds':time.perf_counter()-started}))
+'''
+
+
+def start_qgis(profile_dir):
+    ''' returns an initialized headless QgsApplication using profile_dir as the QGIS profile '''
+    QCoreApplication.setOrganizationName('dissect_benchmark')
+    QCoreApplication.setApplicationName('dissect_benchmark')
+    QgsApplication.setPrefixPath(os.environ.get('QGIS_PREFIX_PATH',sys.prefix), True)
+    app = QgsApplication([], False, profile_dir)
+    app.initQgis()
+    sys.path.append(os.path.join(QgsApplication.pkgDataPath(),'python','plugins'))
+    from processing.core.Processing import Processing
+    Processing.initialize()
+    return app
+
+def load_dissect():
+    ''' imports dissect.py the way the Processing script provider does, returns the module '''
+    spec = importlib.util.spec_from_file_location('dissect_benchmarked',SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def probe_import(modules):
+    ''' returns seconds to import dissect.py and then modules in a fresh interpreter '''
+    env = dict(os.environ,PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    output = subprocess.check_output([sys.executable,'-c',IMPORT_PROBE,SCRIPT_PATH]+modules,env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])['seconds']
+
+def startup_times(samples):
+    ''' returns median script import seconds with dependencies deferred (current) and followed
+        by EAGER_IMPORTS (the module level imports it replaced), each in fresh interpreters
+    '''
+    deferred = [probe_import([]) for n in range(samples)]
+    eager = [probe_import(EAGER_IMPORTS) for n in range(samples)]
+    return {'samples':samples,
+        'eager_modules':EAGER_IMPORTS,
+        'deferred_seconds':round(statistics.median(deferred),4),
+        'eager_seconds':round(statistics.median(eager),4)}
+
+def time_methods(module,timings):
+    ''' wraps the TIMED methods of module so each call appends its duration to timings[name] '''
+    for class_name, method_name in TIMED:
+        cls = getattr(module,class_name)
+        method = getattr(cls,method_name)
+        name = f'{class_name}.{method_name}'
+        def timed(*args,_method=method,_name=name,**kwargs):
+            started = time.perf_counter()
+            try:
+                return _method(*args,**kwargs)
+            finally:
+                timings.setdefault(_name,[]).append(time.perf_counter()-started)
+        setattr(cls,method_name,functools.wraps(method)(timed))
+
+def aoi_geometry(shape,hectares,rng):
+    ''' returns a polygon geometry of about hectares in the requested shape '''
+    area = hectares*10000
+    x, y = CENTER
+    if shape == 'square':
+        half = math.sqrt(area)/2
+        return QgsGeometry.fromRect(QgsRectangle(x-half,y-half,x+half,y+half))
+    if shape == 'circle':
+        return QgsGeometry.fromPointXY(QgsPointXY(x,y)).buffer(math.sqrt(area/math.pi),64)
+    if shape == 'irregular':
+        # jagged outline with many vertices, scaled to the requested area
+        points = []
+        vertices = 2000
+        for n in range(vertices):
+            angle = 2*math.pi*n/vertices
+            radius = 1+0.35*math.sin(7*angle)+0.1*rng.random()
+            points.append(QgsPointXY(x+radius*math.cos(angle),y+radius*math.sin(angle)))
+        points.append(points[0])
+        geom = QgsGeometry.fromPolygonXY([points])
+        scale = math.sqrt(area/geom.area())
+        return QgsGeometry.fromPolygonXY([[QgsPointXY(x+(p.x()-x)*scale,y+(p.y()-y)*scale) for p in points]])
+    if shape == 'multipart':
+        parts = []
+        half = math.sqrt(area/4)/2
+        spacing = half*3
+        for dx, dy in [(-1,-1),(1,-1),(1,1),(-1,1)]:
+            cx, cy = x+dx*spacing, y+dy*spacing
+            parts.append([[QgsPointXY(cx-half,cy-half),QgsPointXY(cx+half,cy-half),
+                QgsPointXY(cx+half,cy+half),QgsPointXY(cx-half,cy+half),QgsPointXY(cx-half,cy-half)]])
+        return QgsGeometry.fromMultiPolygonXY(parts)
+    raise ValueError(f'Unknown shape {shape}')
+
+def memory_layer(geometry_type,name,geometries,rng):
+    ''' returns a memory layer in CRS with a CLASS attribute '''
+    layer = QgsVectorLayer(f'{geometry_type}?crs={CRS}',name,'memory')
+    provider = layer.dataProvider()
+    provider.addAttributes([QgsField('CLASS',QVariant.String)])
+    layer.updateFields()
+    features = []
+    for geom in geometries:
+        f = QgsFeature(layer.fields())
+        f.setGeometry(geom)
+        f.setAttribute('CLASS',rng.choice(CLASSES))
+        features.append(f)
+    provider.addFeatures(features)
+    return layer
+
+def write_layer(layer,path,layer_name=None):
+    ''' writes layer to a GeoPackage layer (layer_name) or a shapefile, returns the path '''
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    if layer_name is not None:
+        options.driverName = 'GPKG'
+        options.layerName = layer_name
+        if os.path.exists(path):
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    else:
+        options.driverName = 'ESRI Shapefile'
+    error = QgsVectorFileWriter.writeAsVectorFormatV3(layer,path,QgsProject.instance().transformContext(),options)
+    assert error[0] == QgsVectorFileWriter.NoError, f'Could not write {path}: {error}'
+    return path
+
+def interest_layers(extent,features,rng):
+    ''' returns [(name, geometry type, [QgsGeometry])] covering extent (half width in m) '''
+    x, y = CENTER
+    def random_point():
+        return QgsPointXY(x+rng.uniform(-extent,extent),y+rng.uniform(-extent,extent))
+    cell = extent*2/math.sqrt(features)
+    points = [QgsGeometry.fromPointXY(random_point()) for n in range(features)]
+    lines = []
+    for n in range(features):
+        start = random_point()
+        vertices = [start]
+        for v in range(20):
+            last = vertices[-1]
+            vertices.append(QgsPointXY(last.x()+rng.uniform(-cell,cell),last.y()+rng.uniform(-cell,cell)))
+        lines.append(QgsGeometry.fromPolylineXY(vertices))
+    polygons = []
+    columns = int(math.sqrt(features))
+    for col in range(columns):
+        for row in range(columns):
+            x0 = x-extent+col*cell
+            y0 = y-extent+row*cell
+            polygons.append(QgsGeometry.fromPolygonXY([[QgsPointXY(x0,y0),QgsPointXY(x0+cell,y0),
+                QgsPointXY(x0+cell,y0+cell),QgsPointXY(x0,y0+cell),QgsPointXY(x0,y0)]]))
+    dense = [QgsGeometry.fromPointXY(random_point()).buffer(cell*2,250) for n in range(max(features//10,1))]
+    invalid = []
+    for n in range(max(features//10,1)):
+        c = random_point()
+        # self intersecting bow tie
+        invalid.append(QgsGeometry.fromPolygonXY([[QgsPointXY(c.x()-cell,c.y()-cell),QgsPointXY(c.x()+cell,c.y()+cell),
+            QgsPointXY(c.x()+cell,c.y()-cell),QgsPointXY(c.x()-cell,c.y()+cell),QgsPointXY(c.x()-cell,c.y()-cell)]]))
+    return [('points','Point',points),
+            ('lines','LineString',lines),
+            ('polygons','Polygon',polygons),
+            ('dense_polygons','Polygon',dense),
+            ('invalid_polygons','Polygon',invalid)]
+
+def write_config(rows,path,config_format):
+    ''' writes configuration rows [(group, row dict)] as xlsx (one tab per group), yml or csv '''
+    groups = {}
+    for group, row in rows:
+        groups.setdefault(group,[]).append(row)
+    if config_format == 'yml':
+        import yaml
+        with open(path,'w',encoding='utf-8') as f:
+            yaml.safe_dump(groups,f,sort_keys=False)
+    elif config_format == 'csv':
+        import csv
+        columns = ['Group']+list(rows[0][1].keys())
+        with open(path,'w',encoding='utf-8',newline='') as f:
+            writer = csv.DictWriter(f,fieldnames=columns)
+            writer.writeheader()
+            for group, row in rows:
+                writer.writerow(dict(row,Group=group))
+    else:
+        import pandas as pd
+        with pd.ExcelWriter(path) as writer:
+            for group, group_rows in groups.items():
+                pd.DataFrame(group_rows).to_excel(writer,sheet_name=group,index=False)
+    return path
+
+def build_fixtures(data_dir,sizes,features,config_format,rng):
+    ''' writes synthetic areas of interest and interest layers, returns ([aoi dict], config path) '''
+    extent = math.sqrt(max(sizes)*10000)*1.5
+    gpkg = os.path.join(data_dir,'interests.gpkg')
+    rows = []
+    for name, geometry_type, geometries in interest_layers(extent,features,rng):
+        layer = memory_layer(geometry_type,name,geometries,rng)
+        if name == 'points':
+            location = write_layer(layer,os.path.join(data_dir,f'{name}.shp'))
+            table = None
+        else:
+            location = write_layer(layer,gpkg,layer_name=name)
+            table = name
+        rows.append(('Synthetic',{'Layer Name':f'Synthetic {name}',
+            'Feature Class Name':table,
+            'Layer Source':location,
+            'Display Query':None,
+            'Attribute ID':'CLASS',
+            'Layer Group Heading':geometry_type}))
+    config_path = write_config(rows,os.path.join(data_dir,f'benchmark_config.{config_format}'),config_format)
+    aois = []
+    aoi_gpkg = os.path.join(data_dir,'aois.gpkg')
+    for hectares in sizes:
+        for shape in SHAPES:
+            name = f'aoi_{shape}_{hectares}ha'
+            layer = memory_layer('Polygon' if shape != 'multipart' else 'MultiPolygon',name,[aoi_geometry(shape,hectares,rng)],rng)
+            write_layer(layer,aoi_gpkg,layer_name=name)
+            aois.append({'name':name,'shape':shape,'hectares':hectares,
+                'source':f'{aoi_gpkg}|layername={name}'})
+    return aois, config_path
+
+def config_root(root_dir):
+    ''' returns a dissect root folder (templates and an empty protected table list) '''
+    shutil.copytree(os.path.join(REPO_ROOT,'templates'),os.path.join(root_dir,'templates'))
+    with open(os.path.join(root_dir,'config.yml'),'w') as f:
+        f.write('protected_data:\n  tables: []\n')
+    return root_dir
+
+def summarize(durations):
+    ''' returns call count, total, mean and max seconds '''
+    return {'calls':len(durations),
+        'total':round(sum(durations),4),
+        'mean':round(sum(durations)/len(durations),4) if durations else 0,
+        'max':round(max(durations),4) if durations else 0}
+
+def git_commit():
+    ''' returns the current commit of the repository (None outside a git checkout) '''
+    try:
+        return subprocess.check_output(['git','rev-parse','HEAD'],cwd=REPO_ROOT,stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare(current,previous_path):
+    ''' prints the per stage total time of current relative to a previous results file '''
+    with open(previous_path,encoding='utf-8') as f:
+        previous = json.load(f)
+    before = {(r['aoi'],r['repeat']):r for r in previous['runs']}
+    print(f"\nCompared with {previous_path} ({previous.get('commit')})")
+    for run in current['runs']:
+        old = before.get((run['aoi'],run['repeat']))
+        if old is None:
+            continue
+        for stage, stats in run['timings'].items():
+            old_total = old['timings'].get(stage,{}).get('total')
+            if old_total:
+                print(f"{run['aoi']:<28} #{run['repeat']} {stage:<32} {old_total:>9.3f}s -> {stats['total']:>9.3f}s ({stats['total']/old_total:.2f}x)")
+    if previous.get('startup') is not None and current.get('startup') is not None:
+        old = previous['startup']['deferred_seconds']
+        new = current['startup']['deferred_seconds']
+        print(f"{'script import':<61} {old:>9.3f}s -> {new:>9.3f}s ({new/old:.2f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dissect against synthetic data')
+    parser.add_argument('--sizes',type=float,nargs='+',default=[100,10000],help='area of interest sizes (ha)')
+    parser.add_argument('--features',type=int,default=2500,help='features per synthetic interest layer')
+    parser.add_argument('--repeat',type=int,default=1,help='runs per area of interest (later runs reuse the session)')
+    parser.add_argument('--workers',type=int,default=1,help='WORKERS parameter')
+    parser.add_argument('--result-cache',action='store_true',help='allow the result cache (disabled by default)')
+    parser.add_argument('--config-format',choices=['yml','csv','xlsx'],default='xlsx',help='generated configuration format')
+    parser.add_argument('--seed',type=int,default=1,help='random seed for the synthetic data')
+    parser.add_argument('--output',default=None,help='results json (defaults to benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare',default=None,help='earlier results json to compare with')
+    parser.add_argument('--keep',action='store_true',help='keep the generated data and reports')
+    parser.add_argument('--import-samples',type=int,default=3,help='fresh interpreter imports per startup measurement (0 to skip)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='dissect_benchmark_')
+    os.environ.setdefault('TEMP',work_dir)
+    profile_dir = os.path.join(work_dir,'profile')
+    data_dir = os.path.join(work_dir,'data')
+    os.makedirs(profile_dir)
+    os.makedirs(data_dir)
+    app = start_qgis(profile_dir)
+    import processing
+    try:
+        rng = random.Random(args.seed)
+        fixtures_started = time.perf_counter()
+        aois, config_path = build_fixtures(data_dir,args.sizes,args.features,args.config_format,rng)
+        print(f'Synthetic data written to {data_dir} in {time.perf_counter()-fixtures_started:.1f}s')
+
+        settings = QgsSettings()
+        settings.setValue('dissect/root',config_root(os.path.join(work_dir,'root')))
+        import_started = time.perf_counter()
+        dissect = load_dissect()
+        import_seconds = time.perf_counter()-import_started
+        timings = {}
+        time_methods(dissect,timings)
+        startup = None
+        if args.import_samples > 0:
+            startup = startup_times(args.import_samples)
+            print(f"Script import {startup['deferred_seconds']:.3f}s deferred, "
+                f"{startup['eager_seconds']:.3f}s with the module level imports ({', '.join(EAGER_IMPORTS)})")
+
+        results = {'created':datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit':git_commit(),
+            'qgis':Qgis.version(),
+            'python':platform.python_version(),
+            'platform':platform.platform(),
+            'arguments':vars(args),
+            'import_seconds':round(import_seconds,4),
+            'startup':startup,
+            'runs':[]}
+        for aoi in aois:
+            for repeat in range(args.repeat):
+                timings.clear()
+                output = os.path.join(work_dir,'reports',f"{aoi['name']}_{repeat}.html")
+                parameters = {'AOI':aoi['source'],
+                    'XLS_CONFIG_IN':config_path,
+                    'DATABASE':'',
+                    'HOST':'',
+                    'PORT':'',
+                    'AUTH_CONFIG':'',
+                    'OUTPUT':output,
+                    'ADD_INTERESTS':False,
+                    'WORKERS':args.workers,
+                    'USE_RESULT_CACHE':args.result_cache}
+                started = time.perf_counter()
+                processing.run(dissect.DissectAlg(),parameters)
+                wall = time.perf_counter()-started
+                run = {'aoi':aoi['name'],'shape':aoi['shape'],'hectares':aoi['hectares'],'repeat':repeat,
+                    'wall_seconds':round(wall,4),
+                    'report_bytes':os.path.getsize(output) if os.path.exists(output) else None,
+                    'timings':{name:summarize(durations) for name, durations in timings.items()}}
+                results['runs'].append(run)
+                print(f"{aoi['name']:<28} #{repeat} {wall:>8.2f}s  " +
+                    '  '.join([f"{name.split('.')[-1]} {stats['total']:.2f}s" for name, stats in run['timings'].items()]))
+
+        output_path = args.output or os.path.join(REPO_ROOT,'benchmarks','results',
+            datetime.datetime.now().strftime('%Y%m%d-%H%M%S')+'.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)),exist_ok=True)
+        with open(output_path,'w',encoding='utf-8') as f:
+            json.dump(results,f,indent=2)
+        print(f'Results written to {output_path}')
+        if args.compare is not None:
+            compare(results,args.compare)
+    finally:
+        QgsProject.instance().clear()
+        app.exitQgis()
+        if not args.keep:
+            shutil.rmtree(work_dir,ignore_errors=True)
+        else:
+            print(f'Generated data and reports kept in {work_dir}')
+
+if __name__ == '__main__':
+    main()
@@ -11,24 +11,39 @@
 ***************************************************************************
 """
 
+import time
+# measured from here to the end of the module, see IMPORT_TIMES
+_import_started = time.perf_counter()
 import sys
 import os
+import importlib
 import traceback
-import subprocess
-import jinja2
 import json
 import datetime
-from osgeo import (gdal,
-                ogr,
-                osr)
+import math
+import queue
+import zlib
+import base64
+import sqlite3
+import threading
+import hashlib
+import shutil
+import csv
+import statistics
+import tracemalloc
+import contextlib
+import types
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 
-from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtCore import QCoreApplication, QDateTime, QVariant
+from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtSql import QSqlDatabase, QSqlQuery
 from qgis.core import (QgsProcessing,
                        QgsFeatureSink,
                        QgsProcessingException,
                        QgsProcessingFeatureSourceDefinition,
                        QgsProcessingAlgorithm,
+                       QgsProcessingFeedback,
                        QgsProcessingParameterFeatureSource,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterVectorLayer,
@@ -38,14 +53,34 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterAuthConfig,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterBoolean,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterEnum,
+                       QgsProcessingParameterField,
+                       QgsProcessingUtils,
+                       QgsFeature,
                        QgsFeatureRequest,
+                       QgsFields,
+                       QgsField,
+                       QgsExpression,
+                       QgsExpressionContext,
+                       QgsExpressionNode,
+                       QgsExpressionNodeBinaryOperator,
+                       QgsExpressionNodeUnaryOperator,
+                       QgsGeometry,
                        QgsWkbTypes,
+                       QgsUnitTypes,
                        QgsCoordinateReferenceSystem,
                        QgsCoordinateTransform,
                        QgsCoordinateTransformContext,
                        QgsVectorLayer,
+                       QgsVectorLayerUtils,
+                       QgsMemoryProviderUtils,
+                       QgsRectangle,
+                       QgsVectorDataProvider,
+                       QgsFeatureSource,
                        QgsRasterLayer,
                        QgsVectorFileWriter,
+                       QgsJsonExporter,
                        QgsDataSourceUri,
                        QgsProject,
                        QgsMessageLog,
@@ -57,37 +92,61 @@ from qgis.core import (QgsProcessing,
                        )
 
 from qgis import processing
-import pandas as pd
 import tempfile
-import time
-import yaml
 import re
 import uuid
-from PyQt5.QtWidgets import QAction, QMessageBox, QProgressBar,QDockWidget,QTabWidget
-from PyQt5.QtCore import *
-from PyQt5.QtGui import *
 
 # dev only
 import logging
 
 MESSAGE_CATEGORY = 'Messages'
 
-# def enable_logging():
-try:
-    temppath = os.environ['TEMP']
-    logfile = os.path.join(temppath, 'dissect.log')
-    # global logger
-    logger = logging.getLogger('dev')
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-    logger.setLevel(logging.DEBUG)
-    fileHandler = logging.FileHandler(logfile, delay=True)
-    fileHandler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
-    fileHandler.setFormatter(formatter)
-    logger.addHandler(fileHandler)
-except:
-    QgsMessageLog.logMessage("Failed to enable logging", MESSAGE_CATEGORY, Qgis.Info)
+# the Processing toolbox imports every script when it loads, heavy dependencies
+# (pandas, jinja2, yaml, gdal/ogr) are imported with deferred_import where they are used
+# {module: seconds}, 'dissect' is the cost of importing this script
+IMPORT_TIMES = {}
+
+def deferred_import(module_name):
+    ''' returns module_name, importing it on first use and recording the cost in IMPORT_TIMES '''
+    module = sys.modules.get(module_name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        IMPORT_TIMES[module_name] = time.perf_counter()-started
+    return module
+
+def process_rss_mb():
+    ''' returns the resident memory of this process in MB, None if it can not be read
+        (psutil if installed, else /proc on linux)
+    '''
+    try:
+        psutil = deferred_import('psutil')
+        return psutil.Process().memory_info().rss/2**20
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+logger = logging.getLogger('dev')
+
+def enable_logging():
+    ''' sets up the dev file log on first run rather than when the toolbox imports the script '''
+    if len(logger.handlers)>0:
+        return
+    try:
+        temppath = os.environ['TEMP']
+        logfile = os.path.join(temppath, 'dissect.log')
+        logger.setLevel(logging.DEBUG)
+        fileHandler = logging.FileHandler(logfile, delay=True)
+        fileHandler.setLevel(logging.DEBUG)
+        formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+        fileHandler.setFormatter(formatter)
+        logger.addHandler(fileHandler)
+    except:
+        QgsMessageLog.logMessage("Failed to enable logging", MESSAGE_CATEGORY, Qgis.Info)
 
 class DissectAlg(QgsProcessingAlgorithm):
     """
@@ -99,6 +158,8 @@ class DissectAlg(QgsProcessingAlgorithm):
     # calling from the QGIS console.
 
     AOI = 'AOI'
+    BATCH_FIELD = 'BATCH_FIELD'
+    BATCH_MODE = 'BATCH_MODE'
     XLS_CONFIG_IN = 'XLS_CONFIG_IN'
     DATABASE = 'DATABASE'
     HOST = 'HOST'
@@ -106,10 +167,53 @@ class DissectAlg(QgsProcessingAlgorithm):
     AUTH_CONFIG = 'AUTH_CONFIG'
     OUTPUT = 'OUTPUT'
     ADD_INTERESTS = 'ADD_INTERESTS'
+    WORKERS = 'WORKERS'
+    REFRESH_METADATA = 'REFRESH_METADATA'
+    SERVER_CLIP = 'SERVER_CLIP'
+    FILTER_SIMPLIFY = 'FILTER_SIMPLIFY'
+    USE_RESULT_CACHE = 'USE_RESULT_CACHE'
+    REPORT_PRECISION = 'REPORT_PRECISION'
+    DISPLAY_ZOOM = 'DISPLAY_ZOOM'
+    REPORT_GEOMETRY = 'REPORT_GEOMETRY'
+    DIAGNOSTICS = 'DIAGNOSTICS'
+    USE_MIRROR = 'USE_MIRROR'
+    BUILD_INDEXES = 'BUILD_INDEXES'
+    TILE_HECTARES = 'TILE_HECTARES'
+    TIME_BUDGET = 'TIME_BUDGET'
+    MEMORY_PROFILE = 'MEMORY_PROFILE'
+    # batch reports (BATCH_FIELD set): a report per ID or one report summarized by ID
+    BATCH_MODES = ['per id','combined']
+    # prefix of the joined aoi ID field if an interest has a field of the same name
+    BATCH_JOIN_PREFIX = 'aoi_'
+    # aoi tiles are split in four (down to 1/16 of the tile size) while over the vertex budget
+    TILE_MIN_FRACTION = 1/16
+    # raster cells read (and masked) at once by raster_zonal_summary
+    RASTER_STRIP_PIXELS = 2**24
+    # mean earth radius (m), cell areas of geographic rasters
+    EARTH_RADIUS = 6371008.8
+    # run records kept in <profile>/dissect/runs
+    RUN_HISTORY = 100
+    # configuration columns read from each row (missing optional columns are None)
+    REQUIRED_CONFIG_COLUMNS = ['Layer Name','Feature Class Name','Layer Source']
+    CONFIG_COLUMNS = REQUIRED_CONFIG_COLUMNS + ['Display Query','Attribute ID','Layer Group Heading','Server Clip','Time Budget']
+    # csv configurations list every row in one file, grouped by this column (the xlsx tab name)
+    CSV_GROUP_COLUMN = 'Group'
+    # file sources indexed this session (build_indexes), keyed by (location, layer)
+    _indexed_sources = set()
+    _indexed_lock = threading.Lock()
           
     def config(self):
+        enable_logging()
         s = QgsSettings()
         self.CONFIG_PATH = s.value('dissect/root')
+        self.METADATA_TTL = float(s.value('dissect/metadata_ttl') or 24)
+        self.RESULT_CACHE_MB = float(s.value('dissect/result_cache_mb') or 500)
+        self.RESULT_CACHE_TTL = float(s.value('dissect/result_cache_ttl') or 24)
+        # tiles are also split while their part of the aoi has more vertices than this, 0 is off (see plan_tiles)
+        self.TILE_VERTICES = int(s.value('dissect/tile_vertices') or 0)
+        self.mirror = bcgw_mirror(s.value('dissect/mirror_path') or None)
+        connection_pool.instance().configure(max_sessions=s.value('dissect/max_sessions') or None,
+            idle_timeout=s.value('dissect/idle_timeout') or None)
         TEST_MODE = False
         if TEST_MODE:
             self.CONFIG_PATH = x
@@ -125,14 +229,22 @@ class DissectAlg(QgsProcessingAlgorithm):
         # Declare instance attributes      
         self.tool_map_layers = []
         self.failed_layers =[]
+        self.cache_hits = []
+        self.memory_tracing = False
 
     def get_protected_tables(table,config_file):
         ''' Returns list of protected tables
         '''
+        yaml = deferred_import('yaml')
         with open(config_file, 'r') as file:
             conf = yaml.safe_load(file)['protected_data']
         return conf['tables']
 
+    def import_summary(self):
+        ''' returns IMPORT_TIMES as text: 'dissect' (the script import) and each dependency
+            deferred_import has loaded so far this session, in seconds '''
+        return ', '.join([f'{module} {seconds:.3f}' for module, seconds in IMPORT_TIMES.items()])
+
     def tr(self, string):
         """
         Returns a translatable string with the self.tr() function.
@@ -218,7 +330,7 @@ class DissectAlg(QgsProcessingAlgorithm):
         # get settings from QgsSettings (can set manual)
         logger.debug('Initializing script')
         s = QgsSettings()
-        settings_list = ['db', 'host', 'outpath', 'port', 'root', 'size', 'xls_config']
+        settings_list = ['db', 'host', 'outpath', 'port', 'root', 'size', 'xls_config', 'workers', 'metadata_ttl', 'server_clip', 'filter_simplify', 'max_sessions', 'idle_timeout', 'result_cache_mb', 'result_cache_ttl', 'report_precision', 'display_zoom', 'report_geometry', 'diagnostics', 'use_mirror', 'mirror_path', 'build_indexes', 'tile_hectares', 'tile_vertices', 'time_budget', 'memory_profile']
         s.beginGroup('dissect')
         for key in settings_list:
             s.value(key,'')
@@ -237,11 +349,27 @@ class DissectAlg(QgsProcessingAlgorithm):
                 types=[QgsProcessing.TypeVectorPolygon]
             )
         )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.BATCH_FIELD,
+                self.tr('Batch by ID field (blank for one report of the whole area of interest)'),
+                parentLayerParameterName = self.AOI,
+                optional = True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.BATCH_MODE,
+                self.tr('Batch reports (a report per ID next to the output, or one report summarized by ID)'),
+                options = self.BATCH_MODES,
+                defaultValue = 0
+            )
+        )
         xl_param = QgsProcessingParameterFile(
                     name = self.XLS_CONFIG_IN,
-                    description = self.tr('Input .xlsx configuration file'),
+                    description = self.tr('Input configuration file (.xlsx, .yml or .csv)'),
                     optional = False,
-                    extension = "xlsx",
+                    fileFilter = 'Configuration files (*.xlsx *.yml *.yaml *.csv)',
                     defaultValue = s.value('xls_config')
                     )  
         xl_param.setFlags(xl_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
@@ -298,34 +426,230 @@ class DissectAlg(QgsProcessingAlgorithm):
                 defaultValue = False
             )
         )
+
+        workers_param = QgsProcessingParameterNumber(
+                    self.WORKERS,
+                    self.tr('Concurrent layer workers (1 evaluates layers one at a time)'),
+                    type = QgsProcessingParameterNumber.Integer,
+                    minValue = 1,
+                    maxValue = 16,
+                    defaultValue = s.value('workers') or 1
+                    )
+        workers_param.setFlags(workers_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(workers_param)
+
+        refresh_param = QgsProcessingParameterBoolean(
+                    self.REFRESH_METADATA,
+                    self.tr('Refresh cached table metadata'),
+                    defaultValue = False
+                    )
+        refresh_param.setFlags(refresh_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(refresh_param)
+
+        server_clip_param = QgsProcessingParameterBoolean(
+                    self.SERVER_CLIP,
+                    self.tr('Clip BCGW layers on the database server (SDO_INTERSECTION)'),
+                    defaultValue = str(s.value('server_clip')).lower() == 'true'
+                    )
+        server_clip_param.setFlags(server_clip_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(server_clip_param)
+
+        simplify_param = QgsProcessingParameterNumber(
+                    self.FILTER_SIMPLIFY,
+                    self.tr('BCGW filter simplification tolerance (m, 0 filters by the exact area of interest)'),
+                    type = QgsProcessingParameterNumber.Double,
+                    minValue = 0,
+                    defaultValue = s.value('filter_simplify') or 0
+                    )
+        simplify_param.setFlags(simplify_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(simplify_param)
+
+        cache_param = QgsProcessingParameterBoolean(
+                    self.USE_RESULT_CACHE,
+                    self.tr('Reuse cached layer results for an unchanged area of interest'),
+                    defaultValue = True
+                    )
+        cache_param.setFlags(cache_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(cache_param)
+
+        precision_param = QgsProcessingParameterNumber(
+                    self.REPORT_PRECISION,
+                    self.tr('Report map coordinate precision (decimal degrees)'),
+                    type = QgsProcessingParameterNumber.Integer,
+                    minValue = 1,
+                    maxValue = report.GEOJSON_PRECISION,
+                    defaultValue = s.value('report_precision') or report.GEOJSON_PRECISION
+                    )
+        precision_param.setFlags(precision_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(precision_param)
+
+        zoom_param = QgsProcessingParameterNumber(
+                    self.DISPLAY_ZOOM,
+                    self.tr('Simplify report map geometry for this zoom level (0 keeps every vertex)'),
+                    type = QgsProcessingParameterNumber.Integer,
+                    minValue = 0,
+                    maxValue = 22,
+                    defaultValue = s.value('display_zoom') or 0
+                    )
+        zoom_param.setFlags(zoom_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(zoom_param)
+
+        geometry_mode = str(s.value('report_geometry') or report.GEOMETRY_MODES[0]).lower()
+        geometry_param = QgsProcessingParameterEnum(
+                    self.REPORT_GEOMETRY,
+                    self.tr('Report map geometry (inline, packed and decoded on demand, or sidecar files next to the report)'),
+                    options = report.GEOMETRY_MODES,
+                    defaultValue = report.GEOMETRY_MODES.index(geometry_mode) if geometry_mode in report.GEOMETRY_MODES else 0
+                    )
+        geometry_param.setFlags(geometry_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(geometry_param)
+
+        diagnostics_param = QgsProcessingParameterBoolean(
+                    self.DIAGNOSTICS,
+                    self.tr('Add run diagnostics (per layer stage timings, rows, vertices and bytes) to the report'),
+                    defaultValue = str(s.value('diagnostics')).lower() == 'true'
+                    )
+        diagnostics_param.setFlags(diagnostics_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(diagnostics_param)
+
+        mirror_param = QgsProcessingParameterBoolean(
+                    self.USE_MIRROR,
+                    self.tr('Read BCGW layers from the local mirror where a snapshot covers the area of interest'),
+                    defaultValue = str(s.value('use_mirror')).lower() == 'true'
+                    )
+        mirror_param.setFlags(mirror_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(mirror_param)
+
+        index_param = QgsProcessingParameterBoolean(
+                    self.BUILD_INDEXES,
+                    self.tr('Build missing spatial and Display Query field indexes on file layers (written next to the data)'),
+                    defaultValue = str(s.value('build_indexes')).lower() == 'true'
+                    )
+        index_param.setFlags(index_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(index_param)
+
+        tile_param = QgsProcessingParameterNumber(
+                    self.TILE_HECTARES,
+                    self.tr('Query BCGW layers in tiles of this many hectares for large or detailed areas of interest (0 disables)'),
+                    type = QgsProcessingParameterNumber.Double,
+                    minValue = 0,
+                    defaultValue = s.value('tile_hectares') or 0
+                    )
+        tile_param.setFlags(tile_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(tile_param)
+
+        budget_param = QgsProcessingParameterNumber(
+                    self.TIME_BUDGET,
+                    self.tr('Seconds each layer may run before it is reported as timed out (0 for no limit, Time Budget column overrides)'),
+                    type = QgsProcessingParameterNumber.Double,
+                    minValue = 0,
+                    defaultValue = s.value('time_budget') or 0
+                    )
+        budget_param.setFlags(budget_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(budget_param)
+
+        memory_param = QgsProcessingParameterBoolean(
+                    self.MEMORY_PROFILE,
+                    self.tr('Log memory use after each layer (process and Python memory, slows the run)'),
+                    defaultValue = str(s.value('memory_profile')).lower() == 'true'
+                    )
+        memory_param.setFlags(memory_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(memory_param)
         s.endGroup()
         logger.debug('Initialization complete')
 
 
-    def parse_config(self,xlsx):
-        ''' parses xls into list of dictionaries 
+    def parse_config(self,config_file):
+        ''' parses the configuration into list of dictionaries 
             {'xls tab name':[{'Column1':'',
                             'Column2':'',
                             'Column3':'',
                             'Column4':''},{}]
+            .xlsx (one tab per group), .yml/.yaml ({group: [rows]}) or .csv (one row per layer
+            with a Group column) are supported, the validated result is compiled to the
+            config_cache so unchanged files are not parsed again
+        '''
+        assert os.path.exists(config_file), f"Configuration file not found ({config_file})"
+        compiled = config_cache()
+        data = compiled.get(config_file)
+        if data is not None:
+            logger.debug(f'Config loaded from compiled cache ({config_file})')
+            return data
+        extension = os.path.splitext(config_file)[1].lower()
+        if extension in ['.yml','.yaml']:
+            sheets = self.read_yaml_config(config_file)
+        elif extension == '.csv':
+            sheets = self.read_csv_config(config_file)
+        else:
+            sheets = self.read_excel_config(config_file)
+        data = self.compile_config(sheets,config_file)
+        compiled.put(config_file,data)
+        return data
+
+    def read_excel_config(self,xlsx):
+        ''' returns [(tab name, [row dictionaries])] from an xlsx
             since version 1.3.0 pandas requires openpyxl for reading xl file
         '''
         try:
-            import openpyxl
-        except:
-            logger.info('Installing openpyxl requirement')
-            spr = subprocess.check_call(['python',"-m","pip", "install","-U","openpyxl"])
-            logger.debug('openpyxl installed')
-        assert os.path.exists(xlsx)
-        os.path
-        data = []
+            deferred_import('openpyxl')
+        except ImportError:
+            raise QgsProcessingException(f"Reading {xlsx} requires the openpyxl package, which is not installed in this QGIS Python. "
+                "Install openpyxl, or use a .yml or .csv configuration (see example_configurations) which needs no Excel support.")
+        pd = deferred_import('pandas')
+        sheets = []
         xl = pd.ExcelFile(xlsx)
         assert len(xl.sheet_names)>0, f"Problem reading excel file ({xlsx})"
         for worksheet in xl.sheet_names:
             df = xl.parse(worksheet)
-            df = df.where(pd.notnull(df), None)     
-            d = df.to_dict('records')
-            data.append({worksheet:d})
+            df = df.astype(object).where(pd.notnull(df), None)
+            sheets.append((worksheet,df.to_dict('records')))
+        return sheets
+
+    def read_yaml_config(self,yml):
+        ''' returns [(group, [row dictionaries])] from a yaml mapping of group: list of rows '''
+        yaml = deferred_import('yaml')
+        with open(yml, 'r', encoding='utf-8') as file:
+            conf = yaml.safe_load(file)
+        assert isinstance(conf,dict), f"Configuration ({yml}) must map group names to lists of layers"
+        return [(str(group),rows or []) for group, rows in conf.items()]
+
+    def read_csv_config(self,csv_file):
+        ''' returns [(group, [row dictionaries])] from a csv with a Group column, groups keep
+            the order they first appear in '''
+        groups = {}
+        with open(csv_file, 'r', encoding='utf-8-sig', newline='') as file:
+            reader = csv.DictReader(file)
+            assert self.CSV_GROUP_COLUMN in (reader.fieldnames or []), f"Configuration ({csv_file}) is missing the {self.CSV_GROUP_COLUMN} column"
+            for row in reader:
+                row = {k.strip():(v if v is None or v.strip() != '' else None) for k, v in row.items() if k is not None}
+                groups.setdefault(row.pop(self.CSV_GROUP_COLUMN),[]).append(row)
+        return [(str(group),rows) for group, rows in groups.items()]
+
+    def compile_config(self,sheets,config_file):
+        ''' validates and normalizes configuration rows into parse_config output
+            (only CONFIG_COLUMNS are kept, blank cells are None, numbers are plain python types)
+        '''
+        data = []
+        for group, rows in sheets:
+            normalized = []
+            for n, row in enumerate(rows):
+                assert isinstance(row,dict), f"Configuration ({config_file}) {group} row {n+1} is not a mapping of columns"
+                row = {str(k).strip():v for k, v in row.items()}
+                missing = [c for c in self.REQUIRED_CONFIG_COLUMNS if c not in row]
+                assert len(missing) == 0, f"Configuration ({config_file}) {group} row {n+1} is missing columns: {missing}"
+                clean = {}
+                for column in self.CONFIG_COLUMNS:
+                    value = row.get(column)
+                    if hasattr(value,'item'): # numpy scalar
+                        value = value.item()
+                    if isinstance(value,float) and value != value: # NaN
+                        value = None
+                    if isinstance(value,str) and value.strip() == '':
+                        value = None
+                    clean[column] = value
+                normalized.append(clean)
+            data.append({group:normalized})
+        logger.debug(f'Config compiled: {sum(len(rows) for group, rows in sheets)} rows in {len(sheets)} groups')
         return data
 
     def processAlgorithm(self, parameters, context, feedback):
@@ -359,6 +683,22 @@ class DissectAlg(QgsProcessingAlgorithm):
         database = self.parameterAsString(parameters, 'DATABASE', context)
         host = self.parameterAsString(parameters, 'HOST', context)
         port = self.parameterAsString(parameters, 'PORT', context)
+        workers = self.parameterAsInt(parameters, 'WORKERS', context)
+        refresh_metadata = self.parameterAsBoolean(parameters, 'REFRESH_METADATA', context)
+        self.server_clip = self.parameterAsBoolean(parameters, 'SERVER_CLIP', context)
+        self.filter_simplify = self.parameterAsDouble(parameters, 'FILTER_SIMPLIFY', context)
+        use_result_cache = self.parameterAsBoolean(parameters, 'USE_RESULT_CACHE', context)
+        self.report_precision = self.parameterAsInt(parameters, 'REPORT_PRECISION', context)
+        self.display_zoom = self.parameterAsInt(parameters, 'DISPLAY_ZOOM', context)
+        geometry_mode = report.GEOMETRY_MODES[self.parameterAsEnum(parameters, 'REPORT_GEOMETRY', context)]
+        self.diagnostics_enabled = self.parameterAsBoolean(parameters, 'DIAGNOSTICS', context)
+        use_mirror = self.parameterAsBoolean(parameters, 'USE_MIRROR', context)
+        self.build_indexes = self.parameterAsBoolean(parameters, 'BUILD_INDEXES', context)
+        batch_field = self.parameterAsString(parameters, 'BATCH_FIELD', context)
+        tile_hectares = self.parameterAsDouble(parameters, 'TILE_HECTARES', context)
+        self.default_time_budget = self.parameterAsDouble(parameters, 'TIME_BUDGET', context)
+        self.memory_profile = self.parameterAsBoolean(parameters, 'MEMORY_PROFILE', context)
+        batch_mode = self.BATCH_MODES[self.parameterAsEnum(parameters, 'BATCH_MODE', context)]
 
         if feedback.isCanceled():
             feedback.pushInfo('Process cancelled by user.')
@@ -370,23 +710,8 @@ class DissectAlg(QgsProcessingAlgorithm):
         aoi_in = aoi
         xls_file = config_xls
         output = output_html
-        logger.debug('Getting auth config')
-        # get the application's authenticaion manager
-        auth_mgr = QgsApplication.authManager()
-        # create an empty authmethodconfig object
-        auth_cfg = QgsAuthMethodConfig()
-        # load config from manager to the new config instance and decrypt sensitive data
-        auth_mgr.loadAuthenticationConfig(auth_method_id, auth_cfg, True)
-        # get the configuration information (including username and password)
-        auth_info = auth_cfg.configMap()
-        try:
-            user = auth_info['username']
-            password = auth_info['password']
-            logger.debug('Auth config loaded')
-        except:
-            user = ''
-            password = ''
-            logger.debug('Blank user and password loaded')
+        user, password = self.auth_credentials(auth_method_id)
+        oq_helper = None
         try:
                 ## TODO set up warning for many featured input
                 # if aoi_in.featureCount()>20:
@@ -402,366 +727,152 @@ class DissectAlg(QgsProcessingAlgorithm):
             if aoi.sourceCrs().isGeographic:
                 parameter = {'INPUT': aoi, 'TARGET_CRS': 'EPSG:3005','OUTPUT': 'memory:aoi'}
                 aoi = processing.run('native:reprojectlayer', parameter)['OUTPUT']
-            QgsProject.instance().addMapLayer(aoi,False)
+            # layers are passed to processing as objects, the aoi is not added to the project
+            self.release_layers([aoi_in],keep=aoi)
+            aoi_in = None
             
             # create db object 
-            oq_helper = oracle_pyqgis(database=database,host=host,port=port,user=user,password=password,feedback=None)
+            table_cache = metadata_cache(ttl_hours=self.METADATA_TTL)
+            if refresh_metadata:
+                table_cache.invalidate(database=database,user=user)
+                feedback.pushInfo('Cached table metadata cleared')
+            self.db_params = {'database':database,'host':host,'port':port,'user':user,'password':password,'cache':table_cache}
+            # stage timings and counts for the run record (and optional report diagnostics)
+            self.run_record = {'started':datetime.datetime.now().isoformat(timespec='seconds'),
+                'config':xls_file,'report':output,'workers':workers,'server_clip':self.server_clip,
+                'stages':{},'layers':[]}
 
-            # init report with AOI
-            report_obj = report(aoi,template_path=self.CONFIG_PATH,feedback=None)
+            # init report with AOI (a report per ID in per id batches)
+            batch = None
+            if batch_field:
+                batch = {'field':batch_field,'mode':batch_mode,'aoi':aoi,'reports':{},'outputs':{}}
+                self.run_record['batch'] = {'field':batch_field,'mode':batch_mode}
+            with self.stage(self.run_record,'aoi'):
+                if batch is not None and batch_mode == 'per id':
+                    report_obj = None
+                    self.start_batch_reports(batch,output,geometry_mode,feedback)
+                    aoi_area = sum(r.aoi['area'] for r in batch['reports'].values())
+                else:
+                    report_obj = report(aoi,template_path=self.CONFIG_PATH,feedback=None,geojson_files=self.add_interests,
+                        precision=self.report_precision,display_zoom=self.display_zoom,geometry_mode=geometry_mode)
+                    aoi_area = report_obj.aoi['area']
+            self.run_record['aoi_hectares'] = round(aoi_area/10000,2)
+            if batch is not None:
+                # layers are fetched once for the whole batch and split by ID, cached results hold no features to split
+                use_result_cache = False
+            # raster layers are summarized per zone (the aoi, or each batch ID)
+            self.raster_zones = self.aoi_zones(aoi,batch_field if batch is not None else None)
+            # large aois are queried a tile at a time
+            self.tile_crs = aoi.crs()
+            self.aoi_tiles = self.plan_tiles(aoi,tile_hectares)
+            if len(self.aoi_tiles) > 1:
+                feedback.pushInfo(f"Area of interest split into {len(self.aoi_tiles)} tiles for BCGW queries")
+            self.run_record['tiles'] = len(self.aoi_tiles)
+            self.layer_cache = result_cache(max_mb=self.RESULT_CACHE_MB if use_result_cache else 0,ttl_hours=self.RESULT_CACHE_TTL)
+            self.aoi_hash = self.geometry_hash(aoi)
 
             # creates list of all fc to compare aoi too
-            parsed_input = self.parse_config(xls_file)
+            with self.stage(self.run_record,'config'):
+                parsed_input = self.parse_config(xls_file)
             logger.debug(f'Config xlsx parsed successfully ({xls_file})')
 
-            ## TODO set up progress bar
-            # progress.setValue(5)
-            
-            # estimate the number of layers to process
-            estimated_count = 0
-            for t in parsed_input:
-                for k in t:
-                    for d in t[k]:
-                        if d['Layer Name'] is not None:
-                            estimated_count += 1
-            i = (90 / estimated_count)
+            # one task per config row, in config order
+            layer_tasks = self.build_layer_tasks(parsed_input)
+            estimated_count = len(layer_tasks)
             feedback.pushInfo(f"Evaluating {estimated_count} interests")
-            for tab_dict in parsed_input:
-                logger.debug(f'Processing tab_dict')
-                if feedback.isCanceled():
-                    feedback.pushInfo('Process cancelled by user.')
-                    return {}
-                for key in tab_dict:
-                    logger.debug(f'Processing key: {key}')
-                    if feedback.isCanceled():
-                        feedback.pushInfo('Process cancelled by user.')
-                        return {}
-                    tab = tab_dict[key]
-                    for dic in tab:
-                        logger.debug(f'Processing dic: {dic}')
-                        if feedback.isCanceled():
-                            feedback.pushInfo('Process cancelled by user.')
-                            return {}
-                        lyr_start = time.time()
-                        layer_title = dic['Layer Name']
-                        if layer_title is not None:
-                            layer_title = layer_title.strip()
-                            logger.debug(f'Processing layer: {layer_title}')
-                            layer_subgroup = dic['Layer Group Heading']
-                            layer_table = dic['Feature Class Name']
-                            if layer_table is not None:
-                                layer_table = layer_table.strip()
-                            location = dic['Layer Source']
-                            if location is not None:
-                                location = location.strip()
-                            layer_sql = dic['Display Query']
-                            if layer_sql is None or type(layer_sql) is not str:
-                                layer_sql = ''
-                            layer_expansion = dic['Attribute ID']
-                            # TODO remove feature_layer_lst
-                            feature_layer_lst = [] # build empty layer list for each obj to be merged at end of unique feature cycle
-                            feedback.pushInfo('--- ' + str(layer_title) + ' ---')
-                            logger.debug(f'{layer_title} location: {location}')
-                            aoi.selectAll()
-                            if (location == 'BCGW'):
-                                logger.debug(f'{layer_title} - is in BCGW')
-                                assert layer_table is not None
-                                # get overlapping features
-                                has_table = oq_helper.has_table(layer_table)
-                                if has_table == True:
-                                    has_spatial_rows = oq_helper.has_spatial_rows(layer_table)
-                                else:
-                                    has_spatial_rows = False
-                                if has_table == True and has_spatial_rows == True:
-                                    logger.debug(f'{layer_title} - table and rows confirmed')
-                                    # get features from bbox
-                                    selected_features = oq_helper.create_layer_anyinteract(overlay_layer=aoi,layer_name=layer_title,db_table=layer_table,sql=layer_sql)
-                                    try:
-                                        if selected_features.featureCount()>0:
-                                            # clip them
-                                            result = processing.run("native:clip", {'INPUT':selected_features, 'OVERLAY': QgsProcessingFeatureSourceDefinition(aoi.id(), True), 'OUTPUT':f'memory:{layer_title}'})['OUTPUT']
-                                            fc = result.featureCount()
-                                            feedback.pushInfo(f"{layer_title}: ({fc}) overlapping features found")
-                                            logger.debug(f"{layer_title}: ({fc}) overlapping features found")
-                                            fc = None
-                                        else:
-                                            # return layer with no features
-                                            result = selected_features
-                                            feedback.pushInfo(f"{layer_title}: (0) overlapping features found")
-                                            logger.debug(f"{layer_title} returned no overlapping features")
-                                    except:
-                                        try:
-                                            logger.debug(f"{layer_title} fixing geometry")
-                                            f_layer = processing.run("native:fixgeometries", {'INPUT':selected_features,'OUTPUT':'memory:{layer_title}'})['OUTPUT']
-                                            result = processing.run("native:clip", {'INPUT':f_layer, 'OVERLAY': QgsProcessingFeatureSourceDefinition(aoi.id(), True), 'OUTPUT':f'memory:{layer_title}'})['OUTPUT']
-                                            logger.debug(f"{layer_title} geometry fixed and clipped")
-                                        except:
-                                            self.failed_layers.append(layer_title)
-                                            report_obj.add_failed(layer_title, key, comment='BCGW - data/geometry issue')
-                                            feedback.pushInfo(f"Error in accessing {layer_title}")
-                                    if result is not None:
-                                        # feedback.pushInfo(f"result type {type(result)}")
-                                        # feedback.pushInfo(f"clip result count: {result.featureCount()}")
-                                        feature_layer_lst.append(result)
-                                        logger.debug(f"{layer_title} appended to feature_layer_lst")
-                                else:
-                                    if has_table:
-                                        feedback.pushInfo(f"No data in table: BCGW {layer_table}")
-                                        self.failed_layers.append(layer_title)
-                                        report_obj.add_failed(layer_title, key, comment='No data in table: BCGW')
-                                        logger.debug(f"{layer_title} contains no rows")
-                                    else:
-                                        feedback.pushInfo(f"Can not access: BCGW {layer_table}")
-                                        self.failed_layers.append(layer_title)
-                                        if layer_table not in self.protected_tables:
-                                            report_obj.add_failed(layer_title, key, comment='Could not access on BCGW - invalid schema/table or insufficient access')
-                                        else:
-                                            report_obj.add_failed(layer_title, key, comment='🔒 Could not access on BCGW (protected table, likely insufficient access)')
-                                        logger.debug(f"{layer_title} could not be accessed")
-                            elif (location is not None): # non-db file path
-                                if os.path.exists(location):
-                                    logger.debug(f'{layer_title} exists, starting processing')
-                                    rlayer = None
-                                    vlayer = None
-                                    filename, file_extension = os.path.splitext(location)
-                                    if len(layer_sql)>0:
-                                        location_sql = f"|subset={layer_sql}"
-                                    else:
-                                        location_sql = ""
-                                    coverage = False
-                                    if os.path.isdir(location):
-                                        dir_files = os.listdir(location)
-                                        for f in dir_files:
-                                            if ".adf" in f:
-                                                coverage = True
-                                                break
-                                    if coverage is True:
-                                        # load coverage
-                                        for f in os.listdir(location):
-                                            if f in ['arc.adf','pal.adf','lab.adf','cnt.adf']:
-                                                vlayer = QgsVectorLayer(os.path.join(location,f), layer_title, "ogr")
-                                            if f == 'hdr.adf':
-                                                rlayer = QgsRasterLayer(os.path.join(location,f),layer_title)
-                                    elif file_extension in ['.shp','.kml','.kmz','.geojson']:
-                                        file_location = location + location_sql
-                                        vlayer = QgsVectorLayer(file_location, layer_title, "ogr")
-                                        if vlayer.isValid() == False:
-                                            feedback.pushInfo(f"Failed to add {layer_title}:{filename}")
-                                            self.failed_layers.append(layer_title)
-                                            report_obj.add_failed(layer_title, key, comment='Not a valid input')
-                                    elif file_extension in ['.tif']:
-                                        rlayer = QgsRasterLayer(location,layer_title)
-                                        if rlayer.isValid() == False:
-                                            feedback.pushInfo(f"Failed to add {layer_title}:{filename}")
-                                            self.failed_layers.append(layer_title)
-                                            report_obj.add_failed(layer_title, key, comment='Not a valid raster input')
-                                    elif file_extension in ['.gdb','gpkg']:
-                                        ogr_string = f"{location}|layername={layer_table}{location_sql}"
-                                        vlayer = QgsVectorLayer(ogr_string, layer_title, "ogr")
-                                    else:
-                                        feedback.pushInfo(f"No loading function for {layer_title}: {location}")
-                                        self.failed_layers.append(layer_title)
-                                        report_obj.add_failed(layer_title, key, comment='Not a valid file path or input type')
-                                    if vlayer is not None:
-                                        logger.debug(f'{layer_title} is vector layer, starting processing')
-                                        try:
-                                            if vlayer.isValid():
-                                                vlayer.setSubsetString(layer_sql)
-                                                if vlayer.featureCount()>0:
-                                                    logger.debug(f'{layer_title} has valid geometry')
-                                                    result = processing.run("native:clip", {'INPUT':vlayer, 'OVERLAY': QgsProcessingFeatureSourceDefinition(aoi.id(), True), 'OUTPUT':f'memory:{layer_title}'})['OUTPUT']
-                                                    logger.debug(f'{layer_title} clipped')
-                                                else:
-                                                    feedback.pushInfo(f"Definintion Query for {layer_title}: {location} | {layer_sql}")
-                                                
-                                            else:
-                                                feedback.pushInfo(f"Vector layer invalid {layer_title}: {location} | {layer_table}({location_sql})")
-                                        except:
-                                            vlayer.setSubsetString(layer_sql)
-                                            if vlayer.featureCount()>0:
-                                                logger.debug(f'{layer_title} has invalid geometry, fixing...')
-                                                f_layer = processing.run("native:fixgeometries", {'INPUT':vlayer,'OUTPUT':'memory:{layer_title}fix'})['OUTPUT']
-                                                logger.debug(f'{layer_title} geo fixed')
-                                                result = processing.run("native:clip", {'INPUT':f_layer, 'OVERLAY': QgsProcessingFeatureSourceDefinition(aoi.id(), True), 'OUTPUT':f'memory:{layer_title}'})['OUTPUT']
-                                                logger.debug(f'{layer_title} clipped')
-                                            else:
-                                                feedback.pushInfo(f"Definintion Query for {layer_title}: {location} | {layer_sql}")
-                                        
-                                        finally:
-                                            if result is not None:
-                                                if result.crs().authid() != 'EPSG:3005':
-                                                    try:
-                                                        result = processing.run('native:reprojectlayer', {'INPUT': result, 'TARGET_CRS': 'EPSG:3005', 'OUTPUT': f'memory:{layer_title}_BCAlbers'})['OUTPUT']
-                                                        logger.debug(f'{layer_title} reprojected to 3005')
-                                                    except:
-                                                        logger.error(f'{layer_title} could not reproject to 3005')
-                                                        self.failed_layers.append(layer_title) 
-                                                        report_obj.add_failed(layer_title, key, comment='Could not reproject result to BC Albers (try reprojecting input)')
-                                                        break
-                                                feature_layer_lst.append(result)
-                                                logger.debug(f'{layer_title} added to feature_layer_lst')
-                                                fc = result.featureCount()
-                                                feedback.pushInfo(f"{layer_title}: ({fc}) overlapping features found")
-                                                logger.debug(f"{layer_title}: ({fc}) overlapping features found")
-                                    elif rlayer is not None:
-                                        enable_raster = False
-                                        # work below for feature to report on raster layers. This is disabled and
-                                        # TODO: build raster classification algorithm
-                                        if enable_raster is False:
-                                            print ("Raster processing is not yet supported/enabled")
-                                        if enable_raster:
-                                            print ("Starting Raster process")
-                                            # clp_raster = processing.run("gdal:cliprasterbymasklayer", 
-                                            #     {'INPUT':rlayer,
-                                            #     'MASK':QgsProcessingFeatureSourceDefinition(aoi.id(), True),
-                                            #     'SOURCE_CRS':QgsCoordinateReferenceSystem('EPSG:3005'),
-                                            #     'TARGET_CRS':QgsCoordinateReferenceSystem('EPSG:3005'),
-                                            #     'NODATA':None,
-                                            #     'ALPHA_BAND':False,
-                                            #     'CROP_TO_CUTLINE':True,
-                                            #     'KEEP_RESOLUTION':False,
-                                            #     'SET_RESOLUTION':False,
-                                            #     'X_RESOLUTION':None,'Y_RESOLUTION':None,
-                                            #     'MULTITHREADING':False,
-                                            #     'OPTIONS':'',
-                                            #     'DATA_TYPE':0,
-                                            #     'EXTRA':'',
-                                            #     'OUTPUT':'TEMPORARY_OUTPUT'})['OUTPUT']
-                                            clp_raster = self.gdal_raster_clip(rlayer,aoi)
-                                            dbf = location + ".vat.dbf"
-                                            vlookup = {}
-                                            if os.path.exists(dbf):
-                                                dbfdriver = ogr.GetDriverByName("ESRI Shapefile")
-                                                dbfdatasource = dbfdriver.Open(dbf,0)
-                                                dbflayer = dbfdatasource.GetLayer()
-                                                dbflayer_def = dbflayer.GetLayerDefn()
-                                                fields = [dbflayer_def.GetFieldDefn(i).GetName() for i in range(dbflayer_def.GetFieldCount())]
-                                                assert value_field in fields
-                                                for f in dbflayer:
-                                                    vlookup[f.GetField('VALUE')]= f.GetField(value_field)
-                                            # This gdal:polygonize seems to be an issue in QGIS <= 3.22 hopefully fixed at a later date
-                                            # vector = processing.run("gdal:polygonize", 
-                                            #     {'INPUT':clp_raster,'BAND':1,'FIELD':'DN','EIGHT_CONNECTEDNESS':False,
-                                            #     'EXTRA':'','OUTPUT':'TEMPORARY_OUTPUT'})
-                                            # Work around below uses gdal directly
-                                            shp = self.gdal_polygonize(clp_raster)
-                                            shp_vlayer = QgsVectorLayer(shp, layer_title, "ogr")
-                                            # end workaround
-                                            if len(vlookup)>0:
-                                                field_length = len(max(vlookup.values()))
-                                                vector = processing.run("native:addfieldtoattributestable", 
-                                                    {'INPUT':shp_vlayer,
-                                                    'FIELD_NAME':value_field,
-                                                    'FIELD_TYPE':2,
-                                                    'FIELD_LENGTH':field_length,
-                                                    'FIELD_PRECISION':0,
-                                                    'OUTPUT':'TEMPORARY_OUTPUT'})['OUTPUT']
-                                                findex = vector.fields().indexFromName(value_field)
-                                                assert findex != -1
-                                                for feat in vector.getFeatures():
-                                                    vector.changeAttributeValue(feat.id(),findex,vlookup[feat['DN']])
-                                                vector.commitChanges()
-                                            else:
-                                                value_field = 'DN'
-                                                vector = shp_vlayer
-                                            if (re.search(r'\bValue\b', layer_sql) or re.search(r'\bValue\b', layer_sql)):
-                                                layer_sql = layer_sql.replace("VALUE ","DN").replace("Value ","DN")
-                                            if len(layer_sql)>0:
-                                                vector.setSubsetString(layer_sql)
-                                            if vector.featureCount()>0:
-                                                result = vector
-                                            else:
-                                                result = None
-                                            # end raster processing
-                                            # QgsMessageLog.logMessage("No raster summary function",self.PLUGIN_NAME,Qgis.Warning)
-
-                                        if result is not None:
-                                            feature_layer_lst.append(result)
-                                            
-                                else:
-                                    # os.path.exists(location) == False
-                                    feedback.pushInfo(f"Can not make valid: {location}")
-                                    self.failed_layers.append(layer_title)
-                                    report_obj.add_failed(layer_title, key, comment='Not a valid file path')
-
-                            aoi.removeSelection()
-
-                            if len(feature_layer_lst) > 0:
-                                try:
-                                    for feat in feature_layer_lst:
-                                        assert feat.crs().authid() == 'EPSG:3005', 'Feat in feature_layer_lst not 3005'
-                                        assert feat is not None, 'Feature is none'
-                                    if len(feature_layer_lst)>1:
-                                        logger.debug(f'{layer_title} Merging results from multiple AOI features, length: {len(feature_layer_lst)}')
-                                        result = processing.run("native:mergevectorlayers", {'LAYERS':feature_layer_lst, 'OUTPUT':f'memory:{layer_title}_m'})['OUTPUT']
-                                        logger.debug(f'{layer_title} Merged results')
-                                    else:
-                                        result = feature_layer_lst[0]
-                                    if result.crs().authid() != 'EPSG:3005':
-                                        logger.debug(f'{layer_title} reprojecting results')
-                                        result = processing.run('native:reprojectlayer', {'INPUT': result, 'TARGET_CRS': 'EPSG:3005', 'OUTPUT': f'memory:{layer_title}'})['OUTPUT']
-                                    idx = result.fields().indexFromName( 'SE_ANNO_CAD_DATA' )
-                                    if idx != (-1):
-                                        res = result.dataProvider().deleteAttributes([idx])
-                                        result.updateFields()
-                                except Exception as e:
-                                    logger.critical(f"Could not merge: {str(e)}")
-                                    feedback.pushInfo(f"Could not merge results for {layer_title}")
-                                
-                                    
-                            
-                            # test new report
-                            if (layer_expansion is None):
-                                layer_expansion = ''
-                            if len(layer_expansion)>0:
-                                logger.debug(f'{layer_title} Parsing attribute IDs')
-                                # summary_fields = layer_expansion.split(',')
-                                summary_fields = [f.strip() for f in layer_expansion.split(',')]
-                            else:
-                                summary_fields = []
-                            try:
-                                delta_time = round(time.time()-lyr_start,1)
-                                feedback.pushInfo(f"{layer_title}: {delta_time} seconds")
-                                logger.debug(f'{layer_title}: {delta_time} seconds to process')
-                                if result is not None:      
-                                    if layer_table not in self.protected_tables:
-                                        interest = report_obj.add_interest(result,key,layer_subgroup,summary_fields,secure=False)
-                                        logger.debug(f'{layer_title}: added to report (non-secure)')
-                                        if result.featureCount()>0:
-                                            if self.add_interests is True:
-                                                logger.debug(f'{layer_title}: adding to map')
-                                                with open(interest['geojson_path']) as f:
-                                                    geojson_lyr = QgsVectorLayer(interest['geojson_path'],layer_title,"ogr")
-                                                QgsProject.instance().addMapLayer(geojson_lyr)
-                                                self.tool_map_layers.append(result.id())
-                                                logger.debug(f'{layer_title}: added to map')
-                                    else:
-                                        interest = report_obj.add_interest(result,key,layer_subgroup,summary_fields,secure=True)
-                                        logger.debug(f'{layer_title}: added to report (secure)')
-                                ## TODO progress bar
-                                # p = progress.value()
-                                # progress.setValue(p+i)
-                            except Exception as e:
-                                feedback.pushInfo(f"Failed to add {layer_title} to map/report")
-                                logger.error(f'{layer_title}: failed to add to map/report - {str(e)}')
-                                self.failed_layers.append(layer_title)
-                                report_obj.add_failed(layer_title, key, comment=str(e))
-                            finally:
-                                result = None
-                                interest = None
-
-            # write report
-            result = report_obj.report(output)
+
+            # MIRROR rows (and BCGW rows with use_mirror) read local snapshots
+            self.resolve_mirror(layer_tasks,aoi,use_mirror,feedback)
+            # rows reading subsets of the same table share one fetch
+            self.plan_shared_sources(layer_tasks,feedback)
+
+            # resolve metadata for every BCGW table before the main loop
+            bcgw_tables = [t['table'] for t in layer_tasks if t['location'] == 'BCGW' and t['mirror'] is None and t['table'] is not None]
+            if len(bcgw_tables)>0:
+                probe_start = time.time()
+                with self.stage(self.run_record,'probe'):
+                    oq_helper = oracle_pyqgis(**self.db_params,feedback=None)
+                    probed = oq_helper.probe_tables(bcgw_tables)
+                self.db_params['metadata'] = oq_helper.metadata
+                feedback.pushInfo(f"Probed {len(probed)} BCGW tables in {round(time.time()-probe_start,1)} seconds")
+            else:
+                logger.debug('No BCGW layers configured, skipping database connection')
+            if workers > 1:
+                feedback.pushInfo(f"Running with {workers} concurrent workers")
+                if oq_helper is not None:
+                    # workers check out their own sessions from the pool
+                    oq_helper.close_db_connection()
+                    if workers > connection_pool.instance().max_sessions:
+                        feedback.pushInfo(f"Database sessions limited to {connection_pool.instance().max_sessions} (max_sessions setting)")
+            # progress is weighted by the time each layer took in earlier runs (see timing_history)
+            self.history = timing_history()
+            expected = self.history.expected_seconds([self.timing_source(t) for t in layer_tasks],self.run_record['aoi_hectares'])
+            progress = run_progress(feedback,{t['index']:expected[self.timing_source(t)] for t in layer_tasks})
+            feedback.pushInfo(f"Expected layer time about {progress.format_seconds(progress.total)} (without concurrency)")
+            if self.memory_profile:
+                self.start_memory_profile(feedback)
+            # cancels layers past their time budget, or all of them when the run is cancelled
+            self.watchdog = layer_watchdog(feedback)
+            recorded = set()
+            try:
+                with self.stage(self.run_record,'layers'):
+                    for task, outcome in self.iter_layer_outcomes(layer_tasks, aoi, oq_helper, workers, feedback):
+                        self.record_outcome(report_obj, batch, task, outcome, feedback)
+                        recorded.add(task['index'])
+                        progress.layer_done(task['index'])
+                        # the interest is in the report, its features are no longer needed
+                        self.release_layers([outcome['result']])
+                        outcome = None
+                        if self.memory_profile:
+                            self.sample_memory(task['title'],feedback)
+            finally:
+                self.watchdog.stop()
+            if feedback.isCanceled():
+                # the report is still written with the layers that finished
+                feedback.pushInfo('Process cancelled by user, writing the report with the layers that finished')
+                for task in layer_tasks:
+                    if task['index'] not in recorded:
+                        self.record_outcome(report_obj, batch, task, self.new_outcome(['Cancelled']), feedback)
+
+            if len(self.cache_hits)>0:
+                feedback.pushInfo(f"{len(self.cache_hits)} layers restored from the result cache: {self.cache_hits}")
+
+            # write report(s)
+            if report_obj is not None:
+                reports = {output:report_obj}
+            else:
+                reports = {batch['outputs'][aoi_id]:r for aoi_id, r in batch['reports'].items()}
+            with self.stage(self.run_record,'report'):
+                for report_path, batch_report in reports.items():
+                    if self.diagnostics_enabled:
+                        batch_report.diagnostics = self.run_record
+                    batch_report.report(report_path)
+            feedback.setProgress(100)
             logger.debug('Report produced')
+            if batch is not None and report_obj is None:
+                feedback.pushInfo(f"{len(reports)} reports written to {os.path.dirname(os.path.abspath(output))}")
+            elif report_obj.display_zoom > 0 or report_obj.precision < report.GEOJSON_PRECISION:
+                feedback.pushInfo(report_obj.display_summary())
             feedback.pushInfo(f"Failed layers: {self.failed_layers}")
             logger.debug(f"Failed layers: {self.failed_layers}")
             # clean up
-            QgsProject.instance().removeMapLayer(aoi.id())
+            aoi = None
             report_obj = None
+            reports = None
+            batch = None
             del oq_helper
             logger.debug('Clean up complete')
             runtime = round(time.time()-self.startTime,1)
             logger.debug(f'Runtime: {runtime} seconds')
+            self.run_record['runtime_seconds'] = runtime
+            self.run_record['failed_layers'] = self.failed_layers
+            self.run_record['cache_hits'] = self.cache_hits
+            if self.memory_profile:
+                self.stop_memory_profile(feedback)
+            record_path = self.write_run_record()
+            feedback.pushInfo(f'Run record written to {record_path}')
+            feedback.pushInfo(f'Import times (seconds): {self.import_summary()}')
+            logger.debug(f'Import times (seconds): {self.import_summary()}')
             # logger = None
             # try:
             #     logger = None
@@ -769,277 +880,2083 @@ class DissectAlg(QgsProcessingAlgorithm):
             #     feedback.pushInfo('Could not remove logger during clean up')
             result_msg = {}
             result_msg[self.OUTPUT] = output
+            if self.run_record.get('batch') is not None and self.run_record['batch']['mode'] == 'per id':
+                result_msg['REPORTS'] = self.run_record['batch']['reports']
             return result_msg
 
         except Exception as e:
             # clean up
-            QgsProject.instance().removeMapLayer(aoi.id())
             for lyr_id in self.tool_map_layers:
                 QgsProject.instance().removeMapLayer(lyr_id)
+            if self.memory_profile:
+                self.stop_memory_profile(feedback)
+            aoi = None
             report_obj = None
             del oq_helper
             raise QgsProcessingException(sys.exc_info())
             logger.error(f'Exception occured: {str(e)}')
-            
 
+    def build_layer_tasks(self,parsed_input):
+        ''' flattens parse_config output into a list of layer task dictionaries
+            (one per config row with a Layer Name) in config order
         '''
-        TODO remove
-        
-        stuff below here in processingAlgorithm class is from template and likely
-        must be deleted
-        '''
-       
-        # # Compute the number of steps to display within the progress bar and
-        # # get features from source
-        # total = 100.0 / aoi.featureCount() if aoi.featureCount() else 0
-        # features = aoi.getFeatures()
-
-        #     # Update the progress bar
-        #     feedback.setProgress(int(current * total))
-   
-class report:
-    ''' Class report includes parameters to track attributes of interests and
-        methods to generate a report
-        initialized with QgsVectorLayer descibing report area of interest
-        self.interests dictionary
-        {
-            name:'',
-            field_summary: {},
-            geom_type:''
-            area/length:0.0,
-            count:0,
-            geojson:'filepath'
-        }
-    '''
+        layer_tasks = []
+        for tab_dict in parsed_input:
+            for key in tab_dict:
+                for dic in tab_dict[key]:
+                    layer_title = dic['Layer Name']
+                    if layer_title is None:
+                        continue
+                    layer_table = dic['Feature Class Name']
+                    if layer_table is not None:
+                        layer_table = layer_table.strip()
+                    location = dic['Layer Source']
+                    if location is not None:
+                        location = location.strip()
+                    layer_sql = dic['Display Query']
+                    if layer_sql is None or type(layer_sql) is not str:
+                        layer_sql = ''
+                    layer_expansion = dic['Attribute ID']
+                    if (layer_expansion is None):
+                        layer_expansion = ''
+                    if len(layer_expansion)>0:
+                        summary_fields = [f.strip() for f in layer_expansion.split(',')]
+                    else:
+                        summary_fields = []
+                    layer_tasks.append({'index':len(layer_tasks),
+                        'group':key,
+                        'title':layer_title.strip(),
+                        'subgroup':dic['Layer Group Heading'],
+                        'table':layer_table,
+                        'location':location,
+                        'sql':layer_sql,
+                        'summary_fields':summary_fields,
+                        'server_clip':self.config_flag(dic.get('Server Clip')),
+                        'time_budget':self.config_number(dic.get('Time Budget'))})
+        return layer_tasks
 
-    TEMPLATE_RELATIVE_PATH = 'templates'
+    def auth_credentials(self,auth_method_id):
+        ''' returns (user, password) of a QGIS authentication configuration (blank if not set) '''
+        logger.debug('Getting auth config')
+        # get the application's authenticaion manager
+        auth_mgr = QgsApplication.authManager()
+        # create an empty authmethodconfig object
+        auth_cfg = QgsAuthMethodConfig()
+        # load config from manager to the new config instance and decrypt sensitive data
+        auth_mgr.loadAuthenticationConfig(auth_method_id, auth_cfg, True)
+        # get the configuration information (including username and password)
+        auth_info = auth_cfg.configMap()
+        try:
+            user = auth_info['username']
+            password = auth_info['password']
+            logger.debug('Auth config loaded')
+        except:
+            user = ''
+            password = ''
+            logger.debug('Blank user and password loaded')
+        return user, password
 
-    def __init__(self,aoi,template_path,feedback):
-        self.uuid = str(uuid.uuid4())
-        logger.debug(f'Report uuid set: {self.uuid}')
-        self.fb = feedback
-        assert os.path.exists(os.path.join(template_path,self.TEMPLATE_RELATIVE_PATH))
-        self.template_path = template_path
-        self.interests = []
-        self.aoi = self.aoi_info(aoi)
-        self.failedLyrs = []
-        
-    def aoi_info(self,aoi):
-        '''prepars key:value dict with keys name,area,geojson
-        aoi: QgsVectorLayer'''
-        a = 0.0
-        if isinstance(aoi, QgsVectorLayer) is False:
-            return None
-        features = aoi.getFeatures()
-        for f in features:
-            geom = f.geometry()
-            geom_type = QgsWkbTypes.displayString(geom.wkbType())
-            assert geom_type in ['Polygon','PolygonZ','MultiPolygon','Polygon25D','MultiPolygonZ'], "Area of interest must be polygonal"
-            a += geom.area()
-        logger.debug(f'AOI area: {round(a/10000,1)} ha')
-        file_name = aoi.name().replace(' ','_').replace('.','_') + ".geojson"
-        file_name = file_name.replace('/','_')
-        file_name = file_name.replace('\\','_')
-        logger.debug('V2GEOJSON: geojson name built')
-        temp_path = os.environ['TEMP']
-        geojson_path = os.path.join(temp_path,self.uuid,file_name)
-        logger.debug('V2GEOJSON: geojson path built')
-        geojson_dir = os.path.dirname(geojson_path)
-        os.makedirs(geojson_dir)
-        geojson = self.vectorlayer_to_geojson(aoi, geojson_path)
-        bb = self.get_bb(aoi,4326)
-        name = aoi.name()
-        d = {'name':name,'area':a,'bounds':bb, 'geojson':geojson}
-        return d
+    def resolve_mirror(self,layer_tasks,aoi,use_mirror,feedback):
+        ''' sets task['mirror'] to the bcgw_mirror snapshot record used for MIRROR rows (and for
+            BCGW rows when use_mirror is set), None when the table is read from the database
+            snapshots of part of a table are only used if their region contains the aoi
+        '''
+        aoi_geom = None
+        mirrored = 0
+        for task in layer_tasks:
+            task['mirror'] = None
+            if task['table'] is None:
+                continue
+            if task['location'] != 'MIRROR' and not (use_mirror and task['location'] == 'BCGW'):
+                continue
+            snapshot = self.mirror.lookup(task['table'])
+            if snapshot is not None and snapshot['region'] is not None:
+                if aoi_geom is None:
+                    aoi_geom = QgsGeometry.unaryUnion([f.geometry() for f in aoi.getFeatures()])
+                if not QgsGeometry.fromWkt(snapshot['region']).contains(aoi_geom):
+                    logger.debug(f"{task['title']}: mirror snapshot region does not cover the aoi")
+                    snapshot = None
+            if snapshot is None and task['location'] == 'BCGW':
+                feedback.pushInfo(f"{task['title']}: no local mirror snapshot covers the area of interest, reading BCGW")
+            task['mirror'] = snapshot
+            if snapshot is not None:
+                mirrored += 1
+        if mirrored > 0:
+            feedback.pushInfo(f"{mirrored} layers read from the local mirror ({self.mirror.path})")
 
-    def get_bb(self,layer,to_epsg_cd):
-        """ returns Lat,Long string"""
-        r_layer = processing.run('native:reprojectlayer', {'INPUT': layer, 'TARGET_CRS': 'EPSG:{}'.format(to_epsg_cd), 'OUTPUT': 'memory:{}'.format(layer.name())})['OUTPUT']
-        # center = r_layer.extent().center()
-        bb = r_layer.extent()
-        corner1=[round(bb.yMinimum(),7), round(bb.xMinimum(),7)]
-        corner2=[round(bb.yMaximum(),7), round(bb.xMaximum(),7)]
-        return [corner1, corner2]
+    def shared_source_key(self,task):
+        ''' returns the key of the source table read by a task (rows with the same key can share
+            one fetch) or None if the task reads a raster or can not be shared
+        '''
+        if task['mirror'] is not None:
+            return (task['mirror']['path'],task['mirror']['layer'],None)
+        location = task['location']
+        if location == 'BCGW':
+            if task['table'] is None:
+                return None
+            server_clip = task['server_clip'] if task['server_clip'] is not None else self.server_clip
+            return ('BCGW',task['table'].upper(),server_clip)
+        if location is None or location == 'MIRROR':
+            return None
+        if os.path.splitext(location)[1] in ['.shp','.kml','.kmz','.geojson','.gdb','.gpkg']:
+            return (os.path.abspath(location),task['table'],None)
+        return None
 
-    def add_interest(self,intersected_layer,group, subgroup,summary_fields, secure):
-        ''' add an interest to the report
-            parameters: interested_layer
+    def plan_shared_sources(self,layer_tasks,feedback):
+        ''' sets task['shared'] for rows reading the same source table with different Display Queries
+            the table is fetched and clipped once with the union of their filters (see evaluate_shared)
+            rows whose Display Query is not a plain column/literal comparison (see shared_filter)
+            are fetched on their own
         '''
-        
-        interest = {'name':intersected_layer.name(),
-            'group':group,
-            'subgroup':subgroup,
-            'secure': secure}
-        logger.debug(f'Building report: adding interest {interest}')
-        fieldNames = [field.name() for field in intersected_layer.fields()]
-        summary_dict = {}
-        d = {'count':0,'length':0.0,'area':0.0}
-        for f in intersected_layer.getFeatures():
-            geom = f.geometry()
-            geom_type = QgsWkbTypes.displayString(geom.wkbType())
-            interest['geometry_type'] = geom_type
-            
-            if (geom_type in ['Point','MultiPoint']):
-                d['count'] += 1
-            elif (geom_type in ['Polygon','PolygonZ','MultiPolygon','MultiPolygonZ']):             
-                d['count'] += 1
-                a = geom.area()
-                d['area'] += a
-
-            elif (geom_type in ['LineString','MultiLineString','MultiLineStringZ']):
-                d['count'] += 1
-                l = geom.length()
-                d['length'] += l
+        groups = {}
+        for task in layer_tasks:
+            task['shared'] = None
+            key = self.shared_source_key(task)
+            if key is None:
+                continue
+            task['shared_filter'] = self.shared_filter(task['sql']) if len(task['sql'])>0 else []
+            if task['shared_filter'] is None:
+                logger.debug(f"{task['title']}: Display Query may not evaluate the same locally, fetched on its own")
+                continue
+            groups.setdefault(key,[]).append(task)
+        shared_rows = 0
+        shared_sources = 0
+        for key, tasks in groups.items():
+            if len(tasks) < 2:
+                continue
+            filters = []
+            for task in tasks:
+                if len(task['sql']) == 0:
+                    # one row reads the whole table
+                    filters = []
+                    break
+                if task['sql'] not in filters:
+                    filters.append(task['sql'])
+            if len(filters) > 0:
+                # bracketed as a whole, the database query appends "AND <spatial filter>"
+                sql = '(' + ' OR '.join(f'({f})' for f in filters) + ')'
             else:
-                logging.error(f"Unexpected geometry type:{geom_type} during add_interest")
-                raise Exception (f"Unexpected geometry type:{geom_type}")
-            value_merge = []
-            for sf in summary_fields:
-                assert sf in fieldNames, f"summary field ({sf}) does not exist in layer({intersected_layer.name()})"
-                value = f[sf]
-                if isinstance(value, QDateTime): # convert QDateTime to formatted string
-                    value=value.toPyDateTime().date().isoformat()
-                else:
-                    value = str(value)
-                value_merge.append(value)
-            if len(value_merge)>0:
-                value_string =" | ".join(value_merge)
-                field_string =" | ".join(summary_fields)
-
-                # add metrics
-                if value_string not in summary_dict.keys():
-                    summary_dict[value_string] = {'count':0,'value':0,'unit':''}
-                if geom_type in ['Point','MultiPoint']:
-                    summary_dict[value_string]['count'] +=1
-                elif geom_type in ['LineString','MultiLineString']:
-                    summary_dict[value_string]['count'] +=1
-                    summary_dict[value_string]['value']+=geom.length()
-                    summary_dict[value_string]['unit']='m'
-                elif geom_type in ['Polygon','MultiPolygon']:
-                    summary_dict[value_string]['count'] +=1
-                    summary_dict[value_string]['value']+=geom.area()/10000
-                    summary_dict[value_string]['unit']='ha'
-            else:
-                field_string=''
-        
-        if (d['count']>0):
-            interest['value'] = d['count']
-            interest['count'] = d['count']
-        if (d['area']>0):
-            interest['value'] = d['area']/10000
-            interest['unit'] = 'ha'
-        elif (d['length']>0):
-            interest['value'] = d['length']
-            interest['unit'] = 'm'
-        else:
-            interest['count']=0
-        if intersected_layer.featureCount() > 0:
-            summary = []
-            if len(summary_dict)>0:
-                try:
-                    import operator
-                    sorted_tuples = sorted(summary_dict.items(),reverse=True) # sort by key name
-                    summary_dict = {k: v for k, v in sorted_tuples}
-                except:
-                    pass
-            interest['field_summary'] = summary_dict
-            interest['field_names_summary'] = field_string
-            if secure is True:
-                interest['geojson'] = None   
-                interest['geojson_path'] = None   
-            else: 
-                logger.debug(f'Exporting {intersected_layer} to geojson')
-                file_name = intersected_layer.name().replace(' ','_').replace('.','_') + ".geojson"
-                file_name = file_name.replace('/','_')
-                file_name = file_name.replace('\\','_')
-                logger.debug('V2GEOJSON: geojson name built')
-                temp_path = os.environ['TEMP']
-                geojson_path = os.path.join(temp_path,self.uuid,file_name)
-                interest['geojson_path'] = geojson_path
-                logger.debug('V2GEOJSON: geojson path built')
-                interest['geojson'] = self.vectorlayer_to_geojson(intersected_layer,geojson_path)
-                logger.debug('Exported to geojson, geojson returned')
+                sql = ''
+            source = tasks[0]['table'] or os.path.basename(tasks[0]['location'])
+            shared = {'title':f'{source} ({len(tasks)} rows)','sql':sql,'pending':len(tasks),
+                'fetch':None,'lock':threading.Lock()}
+            for task in tasks:
+                task['shared'] = shared
+            shared_rows += len(tasks)
+            shared_sources += 1
+        if shared_sources > 0:
+            feedback.pushInfo(f"{shared_rows} rows read {shared_sources} shared source tables, each fetched once")
+
+    def evaluate_shared(self,task,aoi,oq_helper,feedback,outcome,lyr_start):
+        ''' evaluates a row that shares its source table with other rows
+            the first row to run fetches and clips the table with the union of the row filters into
+            plain data (see layer_data), the others wait for that fetch (shared['fetch'], a Future)
+            within their own budget. Every row then builds its own layer of the features matching
+            its Display Query
+        '''
+        shared = task['shared']
+        with shared['lock']:
+            fetch = shared['fetch']
+            fetching = fetch is None
+            if fetching:
+                fetch = shared['fetch'] = Future()
+        if fetching:
+            source_task = dict(task,title=shared['title'],sql=shared['sql'],shared=None,union=True)
+            try:
+                source = self.evaluate_layer(source_task,aoi,oq_helper,feedback)
+                if source['result'] is not None:
+                    layer = source['result']
+                    source['result'] = self.layer_data(layer)
+                    self.release_layers([layer])
+            except Exception as e:
+                fetch.set_exception(e)
+                self.release_shared(shared)
+                raise
+            fetch.set_result(source)
+            # the fetch is reported on the row that ran it
+            for name in ['rows_fetched','vertices_fetched','bytes_fetched']:
+                outcome[name] = source[name]
+            outcome['stages'].update(source['stages'])
         else:
-            interest['geojson'] = None
-            interest['geojson_path'] = None   
-            interest['field_summary'] = []
-        self.interests.append(interest)
-        logger.debug('Interest appended to interests')
-        return interest
-    def vectorlayer_to_geojson(self,layer,geojson_path):
-        '''Export QgsVectorlayer to temp geojson'''       
-        # logger.debug('V2GEOJSON: checking if same filename exists')
-        # if os.path.exists(geojson_path):
-        #     logger.debug('V2GEOJSON: removing existing file')
-        #     os.remove(geojson_path)
-        destcrs = QgsCoordinateReferenceSystem("EPSG:4326")
-        options = QgsVectorFileWriter.SaveVectorOptions()
-        options.driverName = "GeoJSON"
-        options.fileEncoding = "utf-8"
-        # options.ActionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteFile
-        context = QgsProject.instance().transformContext()
-        options.ct = QgsCoordinateTransform(layer.sourceCrs() ,destcrs,context)
-        logger.debug('V2GEOJSON: about to write')
-        error = QgsVectorFileWriter.writeAsVectorFormatV3(layer=layer,fileName=geojson_path, transformContext=context,options=options)
-        logger.debug('V2GEOJSON: json written')
-        assert error[0] == 0, f'error not equal to 0, error: {error}'
-        assert error[0] == QgsVectorFileWriter.NoError, 'error not equal to NoError'
-        logger.debug('V2GEOJSON: assert passed, about to load json')
-        geojson = self.load_geojson(geojson_path)
-        logger.debug('V2GEOJSON: json loaded')
-        return geojson
-
-    def load_geojson(self,file):
-        ''' loads a json file to string '''
-        with open(file) as f:
-            data = json.load(f)
-        return json.dumps(data)
+            with self.stage(outcome,'shared wait'):
+                while True:
+                    if outcome['budget'].isCanceled():
+                        self.release_shared(shared)
+                        raise layer_cancelled(task['title'])
+                    try:
+                        source = fetch.result(timeout=0.25)
+                        break
+                    except FutureTimeoutError:
+                        pass
+                    except Exception:
+                        self.release_shared(shared)
+                        raise
+        data = source['result']
+        standalone = data is not None and not self.shared_filter_types_match(task['shared_filter'],data['fields'])
+        if not standalone:
+            outcome['failed'].extend(source['failed'])
+        if data is not None and not standalone:
+            with self.stage(outcome,'split'):
+                result = self.data_layer(dict(data,name=task['title']),task['sql'] if len(task['sql'])>0 else None)
+            fc = result.featureCount()
+            feedback.pushInfo(f"{task['title']}: ({fc}) overlapping features found (from {shared['title']})")
+            logger.debug(f"{task['title']}: ({fc}) overlapping features found (from {shared['title']})")
+            outcome['result'] = result
+        data = None
+        self.release_shared(shared)
+        if standalone:
+            feedback.pushInfo(f"{task['title']}: Display Query compares fields with values of another type, fetched on its own")
+            return self.evaluate_source(dict(task,shared=None),aoi,oq_helper,feedback,outcome)
+        outcome['seconds'] = round(time.time()-lyr_start,1)
+        return outcome
 
-    def add_failed(self, layer_title, group, comment=None):
-        ''' add a failed interest to the report'''
-        logger.debug(f"REPORT add failed layer: {layer_title}")
-        failedLyr = {'name':layer_title,
-            'group':group,
-            'comment':comment}   
+    def shared_filter(self,sql):
+        ''' returns the [(field, literal)] comparisons of a Display Query if it only combines
+            field/literal comparisons (=, <>, <, <=, >, >=, IN, IS [NOT] NULL) with AND, OR and NOT,
+            None otherwise - the database and QgsExpression evaluate those the same (given matching
+            types, see shared_filter_types_match), while LIKE case rules, functions, arithmetic and
+            implicit conversions can differ
+        '''
+        expression = QgsExpression(sql)
+        if expression.hasParserError() or expression.rootNode() is None:
+            return None
+        comparisons = []
+        if not self.collect_comparisons(expression.rootNode(),comparisons):
+            return None
+        return comparisons
 
-        self.failedLyrs.append(failedLyr)
-        logger.debug('Interest appended to failed layers')
+    def collect_comparisons(self,node,comparisons):
+        ''' adds the (field, literal) comparisons of an expression node to comparisons,
+            returns False if the node is not a plain comparison (see shared_filter)
+        '''
+        binary = QgsExpressionNodeBinaryOperator
+        node_type = node.nodeType()
+        if node_type == QgsExpressionNode.ntBinaryOperator:
+            op = node.op()
+            left, right = node.opLeft(), node.opRight()
+            if op in (binary.boAnd,binary.boOr):
+                return self.collect_comparisons(left,comparisons) and self.collect_comparisons(right,comparisons)
+            if op in (binary.boIs,binary.boIsNot):
+                return (left.nodeType() == QgsExpressionNode.ntColumnRef and right.nodeType() == QgsExpressionNode.ntLiteral
+                    and right.value() is None)
+            if op in (binary.boEQ,binary.boNE,binary.boLT,binary.boLE,binary.boGT,binary.boGE):
+                if left.nodeType() == QgsExpressionNode.ntLiteral:
+                    left, right = right, left
+                if left.nodeType() != QgsExpressionNode.ntColumnRef or right.nodeType() != QgsExpressionNode.ntLiteral or right.value() is None:
+                    return False
+                comparisons.append((left.name(),right.value()))
+                return True
+            return False
+        if node_type == QgsExpressionNode.ntUnaryOperator:
+            return node.op() == QgsExpressionNodeUnaryOperator.uoNot and self.collect_comparisons(node.operand(),comparisons)
+        if node_type == QgsExpressionNode.ntInOperator:
+            if node.node().nodeType() != QgsExpressionNode.ntColumnRef:
+                return False
+            for item in node.list().list():
+                if item.nodeType() != QgsExpressionNode.ntLiteral or item.value() is None:
+                    return False
+                comparisons.append((node.node().name(),item.value()))
+            return True
+        return False
 
-    def report(self,outfile):
-        """ Build html report based on self.interests --> html file
-        """
-        #build summary
-        reportDate = datetime.datetime.utcnow().strftime('%B %d %Y - %H:%M:%S') + ' UTC'
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(
-            searchpath=os.path.join(self.template_path,self.TEMPLATE_RELATIVE_PATH))
-            )
-        template = env.get_template('home.html', parent='layout.html')
-        intersecting_layers = []
-        non_intersecting_layers=[]
-        for i in self.interests:
-            if ('value' in i.keys()):
-                intersecting_layers.append(i)
+    def shared_filter_types_match(self,comparisons,fields):
+        ''' returns True if every (field, literal) comparison of a shared row compares a numeric
+            field with a number or a text field with a string (no implicit conversions)
+        '''
+        for name, value in comparisons:
+            idx = fields.lookupField(name)
+            if idx == -1:
+                return False
+            field = fields.at(idx)
+            if isinstance(value,bool):
+                return False
+            if isinstance(value,(int,float)):
+                if not field.isNumeric():
+                    return False
+            elif isinstance(value,str):
+                if field.type() != QVariant.String:
+                    return False
             else:
-                non_intersecting_layers.append(i)
-        layers = [i for i in self.interests]
-        layer_sort = sorted(intersecting_layers, key=lambda k: k['value'],reverse=True) 
-        layers = layer_sort + non_intersecting_layers
-        ahtml = template.render(aoi = self.aoi,interests=layers, reportDate=reportDate, failedLyrs = self.failedLyrs)
-        #ahtml = template.render(species=aoi.species, shape=aoi.poly,aoi=aoi)
-        outpath = os.path.dirname(outfile)
-        # Check whether the specified path exists or not
-        pathExist = os.path.exists(outpath)
-        logger.debug(f'Output path {outpath} exists: {pathExist}')
-        if not pathExist:      
-            # Create a new directory because it does not exist 
-            os.makedirs(outpath)
-            logger.debug('Outpath created')
-        with open(outfile, 'w') as f:
-            f.write(ahtml)    
-        logger.debug(f'Report written to file ({(os.path.getsize(outfile)/1000):.0f} KB)')
+                return False
+        return True
+
+    def release_shared(self,shared):
+        ''' drops the shared fetch once every row using it has run '''
+        with shared['lock']:
+            shared['pending'] -= 1
+            fetch = shared['fetch']
+            if shared['pending'] <= 0 and fetch is not None and fetch.done() and fetch.exception() is None:
+                fetch.result()['result'] = None
+
+    def config_flag(self,value):
+        ''' returns True/False for optional yes/no config columns, None if blank '''
+        if value is None:
+            return None
+        if isinstance(value,str):
+            value = value.strip().lower()
+            if value == '':
+                return None
+            return value in ['y','yes','true','1']
+        return bool(value)
+
+    def config_number(self,value):
+        ''' returns a float for optional numeric config columns, None if blank '''
+        if value is None or (isinstance(value,str) and value.strip() == ''):
+            return None
+        number = float(value)
+        if math.isnan(number):
+            return None
+        return number
+
+    def iter_layer_outcomes(self,layer_tasks,aoi,oq_helper,workers,feedback):
+        ''' yields (task, outcome) pairs in config order
+            workers <= 1 evaluates rows one after another on the calling thread, otherwise rows are
+            evaluated by worker threads (see layer_worker) - each row gets its own oracle_pyqgis
+            connection and a private copy of the aoi
+            database calls run on pooled session threads and are abandoned when a row's budget is
+            spent (see db_session), so a timed out row is yielded without waiting for the database
+            on a cancelled run the workers are not waited for, they stop at their next feature or
+            database poll while the report is written from the rows already yielded
+        '''
+        if workers <= 1:
+            for task in layer_tasks:
+                if feedback.isCanceled():
+                    return
+                yield task, self.evaluate_layer(task,aoi,oq_helper,feedback)
+            return
+
+        # layers belong to the thread that made them, so the aoi goes to the workers and their
+        # results come back as plain data (see layer_data)
+        aoi_data = self.layer_data(aoi)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = queue.Queue()
+        futures = []
+        for task in layer_tasks:
+            future = Future()
+            futures.append(future)
+            pending.put((task,future))
+        try:
+            for n in range(workers):
+                executor.submit(self.layer_worker,pending,aoi_data,feedback)
+            for task, future in zip(layer_tasks,futures):
+                while True:
+                    if feedback.isCanceled():
+                        return
+                    try:
+                        outcome = future.result(timeout=0.5)
+                        break
+                    except FutureTimeoutError:
+                        pass
+                if outcome is None:
+                    return
+                # messages and the result layer are made on this thread, in config order
+                for message in outcome.pop('messages'):
+                    feedback.pushInfo(message)
+                if outcome['result'] is not None:
+                    outcome['result'] = self.data_layer(outcome['result'])
+                yield task, outcome
+        finally:
+            # rows not started are dropped, running rows stop at their next feature (the watchdog
+            # cancels them)
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=not feedback.isCanceled())
+            logger.debug('Layer workers shut down')
+
+    def layer_worker(self,pending,aoi_data,feedback):
+        ''' worker thread loop, evaluates queued (task, Future) rows with its own copy of the aoi
+            until none are left
+        '''
+        aoi = self.data_layer(aoi_data)
+        while True:
+            try:
+                task, future = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.evaluate_layer_task(task,aoi,feedback))
+            except Exception as e:
+                future.set_exception(e)
+
+    def evaluate_layer_task(self,task,aoi,feedback):
+        ''' worker thread wrapper for evaluate_layer, returns the outcome with the result as plain
+            data (see layer_data) and the row's messages (see deferred_feedback) for the algorithm thread
+            returns None if the run was cancelled before the row started
+        '''
+        if feedback.isCanceled():
+            return None
+        messages = deferred_feedback(feedback)
+        oq_helper = None
+        try:
+            if task['location'] == 'BCGW':
+                oq_helper = oracle_pyqgis(**self.db_params,feedback=None)
+            outcome = self.evaluate_layer(task,aoi,oq_helper,messages)
+        finally:
+            if oq_helper is not None:
+                oq_helper.close_db_connection()
+                oq_helper = None
+        if outcome['result'] is not None:
+            result = outcome['result']
+            outcome['result'] = self.layer_data(result)
+            self.release_layers([result])
+            result = None
+        outcome['messages'] = messages.messages
+        return outcome
+
+    def layer_data(self,layer):
+        ''' returns the features of a vector layer as plain data for another thread
+            {'name','fields': QgsFields,'wkb_type','crs': WKT,'features': [(attributes, wkb)]}
+        '''
+        features = [(f.attributes(),bytes(f.geometry().asWkb()) if f.hasGeometry() else None) for f in layer.getFeatures()]
+        return {'name':layer.name(),'fields':layer.fields(),'wkb_type':layer.wkbType(),
+            'crs':layer.crs().toWkt(),'features':features}
+
+    def data_layer(self,data,sql=None):
+        ''' returns a memory layer made on the calling thread from layer_data
+            sql: expression (optional), only matching features are added
+        '''
+        layer = QgsMemoryProviderUtils.createMemoryLayer(data['name'],data['fields'],data['wkb_type'],
+            QgsCoordinateReferenceSystem.fromWkt(data['crs']))
+        expression = None
+        if sql is not None:
+            expression = QgsExpression(sql)
+            context = QgsExpressionContext()
+            context.setFields(data['fields'])
+            expression.prepare(context)
+        features = []
+        for attributes, wkb in data['features']:
+            feature = QgsFeature(data['fields'])
+            feature.setAttributes(attributes)
+            if expression is not None:
+                context.setFeature(feature)
+                if not expression.evaluate(context):
+                    continue
+            if wkb is not None:
+                geom = QgsGeometry()
+                geom.fromWkb(wkb)
+                feature.setGeometry(geom)
+            features.append(feature)
+        layer.dataProvider().addFeatures(features)
+        return layer
+
+    def layer_context(self,feedback):
+        ''' returns a QgsProcessingContext for the processing.run calls of one row, made like
+            processing.run would on the thread evaluating the row (a context and the temporary
+            layers it holds belong to the thread that made it)
+        '''
+        return deferred_import('processing.tools.dataobjects').createContext(feedback)
+
+    def new_outcome(self,failed=None):
+        ''' returns an empty layer outcome (see evaluate_layer) '''
+        return {'result':None, 'failed':failed or [], 'seconds':0.0, 'stages':{}, 'rows_fetched':None,
+            'vertices_fetched':None, 'bytes_fetched':None}
+
+    def time_budget(self,task):
+        ''' returns the seconds a row may run (Time Budget column, else the global default), 0 for no limit '''
+        if task.get('time_budget') is not None:
+            return task['time_budget']
+        return self.default_time_budget
+
+    def evaluate_layer(self,task,aoi,oq_helper,feedback):
+        ''' finds features of a single config row overlapping the aoi
+            returns {'result': QgsVectorLayer or None,
+                    'failed': [comment, ...],
+                    'seconds': float}
+            does not touch the report so it can run on a worker thread
+            the fetch and clip are cancelled once the row's time budget is spent (or the run is
+            cancelled), the outcome is then only a timed out/cancelled failure
+        '''
+        lyr_start = time.time()
+        budget = self.time_budget(task)
+        outcome = self.new_outcome()
+        outcome['budget'] = self.watchdog.start(budget)
+        outcome['context'] = self.layer_context(outcome['budget'])
+        if oq_helper is not None:
+            # the row's catalog queries are abandoned with it too
+            run_feedback, oq_helper.fb = oq_helper.fb, outcome['budget']
+        try:
+            outcome = self.evaluate_source(task,aoi,oq_helper,feedback,outcome)
+        except Exception:
+            if not outcome['budget'].isCanceled():
+                raise
+        finally:
+            self.watchdog.finish(outcome['budget'])
+            if oq_helper is not None:
+                oq_helper.fb = run_feedback
+        if outcome['budget'].isCanceled():
+            if feedback.isCanceled():
+                comment = 'Cancelled'
+            else:
+                comment = f'Timed out after {budget:g} seconds'
+            feedback.pushInfo(f"{task['title']}: {comment.lower()}")
+            logger.debug(f"{task['title']}: {comment.lower()}")
+            outcome = dict(self.new_outcome([comment]),stages=outcome['stages'])
+        outcome.pop('budget',None)
+        outcome.pop('context',None)
+        outcome['seconds'] = round(time.time()-lyr_start,1)
+        return outcome
+
+    def evaluate_source(self,task,aoi,oq_helper,feedback,outcome):
+        ''' evaluate_layer, reading the source of a row into outcome
+            outcome['budget'] is the QgsFeedback cancelled by the watchdog
+        '''
+        lyr_start = time.time()
+        layer_title = task['title']
+        layer_table = task['table']
+        location = task['location']
+        layer_sql = task['sql']
+        result = None
+        feature_layer_lst = [] # build empty layer list for each obj to be merged at end of unique feature cycle
+        # memory layers made on the way to the result, released once it is made (see release_layers)
+        intermediates = []
+        logger.debug(f'Processing layer: {layer_title}')
+        feedback.pushInfo('--- ' + str(layer_title) + ' ---')
+        logger.debug(f'{layer_title} location: {location}')
+        if task['mirror'] is not None:
+            # local GeoPackage snapshot, read through the file source path below
+            location = task['mirror']['path']
+            layer_table = task['mirror']['layer']
+            outcome['as_of'] = task['mirror']['snapshot_at']
+            logger.debug(f"{layer_title} reading local mirror {location} (as of {outcome['as_of']})")
+        elif location == 'MIRROR':
+            feedback.pushInfo(f"{layer_title}: not in the local mirror, or the snapshot does not cover the area of interest")
+            outcome['failed'].append('Not in the local mirror - run Snapshot BCGW tables to local mirror')
+            return outcome
+        outcome['cache_key'] = self.result_cache_key(task)
+        if outcome['cache_key'] is not None:
+            with self.stage(outcome,'cache'):
+                cached = self.layer_cache.get(outcome['cache_key'])
+            if cached is not None:
+                created = datetime.datetime.fromtimestamp(cached['created_at']).strftime('%Y-%m-%d %H:%M')
+                feedback.pushInfo(f"{layer_title}: cache hit (result from {created})")
+                logger.debug(f'{layer_title}: cache hit ({outcome["cache_key"]})')
+                cached['interest']['cached'] = created
+                outcome['cached'] = cached
+                outcome['seconds'] = round(time.time()-lyr_start,1)
+                if task.get('shared') is not None:
+                    self.release_shared(task['shared'])
+                return outcome
+        if task.get('shared') is not None:
+            return self.evaluate_shared(task,aoi,oq_helper,feedback,outcome,lyr_start)
+        if (location == 'BCGW'):
+            logger.debug(f'{layer_title} - is in BCGW')
+            assert layer_table is not None
+            # get overlapping features
+            with self.stage(outcome,'metadata'):
+                has_table = oq_helper.has_table(layer_table)
+                if has_table == True:
+                    has_spatial_rows = oq_helper.has_spatial_rows(layer_table)
+                else:
+                    has_spatial_rows = False
+            if has_table == True and has_spatial_rows == True:
+                logger.debug(f'{layer_title} - table and rows confirmed')
+                server_clip = task['server_clip'] if task['server_clip'] is not None else self.server_clip
+                clip_note = ''
+                if server_clip:
+                    result = self.server_clip_layer(task,aoi,oq_helper,feedback,outcome)
+                    clip_note = ' (clipped on server)'
+                if result is None and len(self.aoi_tiles) > 1:
+                    result = self.tiled_layer(task,oq_helper,feedback,outcome)
+                    clip_note = f' ({len(self.aoi_tiles)} tiles)'
+                if result is not None:
+                    fc = result.featureCount()
+                    feedback.pushInfo(f"{layer_title}: ({fc}) overlapping features found{clip_note}")
+                    logger.debug(f"{layer_title}: ({fc}) overlapping features found{clip_note}")
+                    fc = None
+                    feature_layer_lst.append(result)
+                else:
+                    # get features intersecting the aoi polygon(s)
+                    # fetched into memory so the clip (and a fix geometries retry) reads from memory
+                    with self.stage(outcome,'fetch'):
+                        selected_features = oq_helper.create_layer_anyinteract(overlay_layer=aoi,layer_name=layer_title,db_table=layer_table,sql=layer_sql,simplify_tolerance=self.filter_simplify,feedback=outcome['budget'])
+                    self.count_fetched(outcome,selected_features)
+                    intermediates.append(selected_features)
+                    try:
+                        if selected_features.featureCount()>0:
+                            # clip them
+                            with self.stage(outcome,'clip'):
+                                result = processing.run("native:clip", {'INPUT':selected_features, 'OVERLAY': aoi, 'OUTPUT':f'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                            fc = result.featureCount()
+                            feedback.pushInfo(f"{layer_title}: ({fc}) overlapping features found")
+                            logger.debug(f"{layer_title}: ({fc}) overlapping features found")
+                            fc = None
+                        else:
+                            # return layer with no features
+                            result = selected_features
+                            feedback.pushInfo(f"{layer_title}: (0) overlapping features found")
+                            logger.debug(f"{layer_title} returned no overlapping features")
+                    except:
+                        try:
+                            logger.debug(f"{layer_title} fixing geometry")
+                            with self.stage(outcome,'fix geometries'):
+                                f_layer = processing.run("native:fixgeometries", {'INPUT':selected_features,'OUTPUT':'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                                intermediates.append(f_layer)
+                                result = processing.run("native:clip", {'INPUT':f_layer, 'OVERLAY': aoi, 'OUTPUT':f'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                            logger.debug(f"{layer_title} geometry fixed and clipped")
+                        except:
+                            outcome['failed'].append('BCGW - data/geometry issue')
+                            feedback.pushInfo(f"Error in accessing {layer_title}")
+                    if result is not None:
+                        feature_layer_lst.append(result)
+                        logger.debug(f"{layer_title} appended to feature_layer_lst")
+            else:
+                if has_table:
+                    feedback.pushInfo(f"No data in table: BCGW {layer_table}")
+                    outcome['failed'].append('No data in table: BCGW')
+                    logger.debug(f"{layer_title} contains no rows")
+                else:
+                    feedback.pushInfo(f"Can not access: BCGW {layer_table}")
+                    if layer_table not in self.protected_tables:
+                        outcome['failed'].append('Could not access on BCGW - invalid schema/table or insufficient access')
+                    else:
+                        outcome['failed'].append('🔒 Could not access on BCGW (protected table, likely insufficient access)')
+                    logger.debug(f"{layer_title} could not be accessed")
+        elif (location is not None): # non-db file path
+            if os.path.exists(location):
+                logger.debug(f'{layer_title} exists, starting processing')
+                rlayer = None
+                vlayer = None
+                filename, file_extension = os.path.splitext(location)
+                if len(layer_sql)>0:
+                    location_sql = f"|subset={layer_sql}"
+                else:
+                    location_sql = ""
+                coverage = False
+                if os.path.isdir(location):
+                    dir_files = os.listdir(location)
+                    for f in dir_files:
+                        if ".adf" in f:
+                            coverage = True
+                            break
+                open_start = time.perf_counter()
+                if coverage is True:
+                    # load coverage
+                    for f in os.listdir(location):
+                        if f in ['arc.adf','pal.adf','lab.adf','cnt.adf']:
+                            vlayer = QgsVectorLayer(os.path.join(location,f), layer_title, "ogr")
+                        if f == 'hdr.adf':
+                            rlayer = QgsRasterLayer(os.path.join(location,f),layer_title)
+                elif file_extension in ['.shp','.kml','.kmz','.geojson']:
+                    file_location = location + location_sql
+                    vlayer = QgsVectorLayer(file_location, layer_title, "ogr")
+                    if vlayer.isValid() == False:
+                        feedback.pushInfo(f"Failed to add {layer_title}:{filename}")
+                        outcome['failed'].append('Not a valid input')
+                elif file_extension in ['.tif']:
+                    rlayer = QgsRasterLayer(location,layer_title)
+                    if rlayer.isValid() == False:
+                        feedback.pushInfo(f"Failed to add {layer_title}:{filename}")
+                        outcome['failed'].append('Not a valid raster input')
+                elif file_extension in ['.gdb','.gpkg']:
+                    ogr_string = f"{location}|layername={layer_table}{location_sql}"
+                    vlayer = QgsVectorLayer(ogr_string, layer_title, "ogr")
+                else:
+                    feedback.pushInfo(f"No loading function for {layer_title}: {location}")
+                    outcome['failed'].append('Not a valid file path or input type')
+                if vlayer is not None:
+                    logger.debug(f'{layer_title} is vector layer, starting processing')
+                    selected_features = None
+                    try:
+                        if vlayer.isValid():
+                            vlayer.setSubsetString(layer_sql)
+                            outcome['stages']['open'] = time.perf_counter()-open_start
+                            if self.build_indexes:
+                                with self.stage(outcome,'index'):
+                                    self.index_file_source(vlayer,location,layer_table,layer_sql)
+                            # only features within the aoi extent are read (and clipped)
+                            selected_features = self.aoi_filtered(vlayer,aoi,outcome)
+                            intermediates.append(selected_features)
+                            if selected_features.featureCount()>0:
+                                logger.debug(f'{layer_title} has valid geometry')
+                                with self.stage(outcome,'clip'):
+                                    result = processing.run("native:clip", {'INPUT':selected_features, 'OVERLAY': aoi, 'OUTPUT':f'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                                logger.debug(f'{layer_title} clipped')
+                            else:
+                                feedback.pushInfo(f"Definintion Query for {layer_title}: {location} | {layer_sql}")
+                            
+                        else:
+                            feedback.pushInfo(f"Vector layer invalid {layer_title}: {location} | {layer_table}({location_sql})")
+                    except:
+                        if selected_features is None:
+                            vlayer.setSubsetString(layer_sql)
+                            selected_features = vlayer
+                        if selected_features.featureCount()>0:
+                            logger.debug(f'{layer_title} has invalid geometry, fixing...')
+                            with self.stage(outcome,'fix geometries'):
+                                f_layer = processing.run("native:fixgeometries", {'INPUT':selected_features,'OUTPUT':'memory:{layer_title}fix'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                                intermediates.append(f_layer)
+                                logger.debug(f'{layer_title} geo fixed')
+                                result = processing.run("native:clip", {'INPUT':f_layer, 'OVERLAY': aoi, 'OUTPUT':f'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                            logger.debug(f'{layer_title} clipped')
+                        else:
+                            feedback.pushInfo(f"Definintion Query for {layer_title}: {location} | {layer_sql}")
+                    
+                    if result is not None:
+                        if result.crs().authid() != 'EPSG:3005':
+                            try:
+                                intermediates.append(result)
+                                with self.stage(outcome,'reproject'):
+                                    result = processing.run('native:reprojectlayer', {'INPUT': result, 'TARGET_CRS': 'EPSG:3005', 'OUTPUT': f'memory:{layer_title}_BCAlbers'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                                logger.debug(f'{layer_title} reprojected to 3005')
+                            except:
+                                logger.error(f'{layer_title} could not reproject to 3005')
+                                outcome['failed'].append('Could not reproject result to BC Albers (try reprojecting input)')
+                                self.release_layers(intermediates)
+                                outcome['seconds'] = round(time.time()-lyr_start,1)
+                                return outcome
+                        feature_layer_lst.append(result)
+                        logger.debug(f'{layer_title} added to feature_layer_lst')
+                        fc = result.featureCount()
+                        feedback.pushInfo(f"{layer_title}: ({fc}) overlapping features found")
+                        logger.debug(f"{layer_title}: ({fc}) overlapping features found")
+                elif rlayer is not None and rlayer.isValid():
+                    # per class pixel counts within the aoi, the raster is never polygonized
+                    try:
+                        with self.stage(outcome,'zonal stats'):
+                            outcome['raster'] = self.raster_zonal_summary(rlayer.source(),task,outcome['budget'])
+                        pixels = sum(c['count'] for zone in outcome['raster']['zones'].values() for c in zone.values())
+                        feedback.pushInfo(f"{layer_title}: ({pixels}) overlapping pixels found")
+                        logger.debug(f"{layer_title}: ({pixels}) overlapping pixels found")
+                    except Exception as e:
+                        logger.error(f'{layer_title}: raster summary failed - {str(e)}')
+                        feedback.pushInfo(f"Could not summarize raster {layer_title}: {str(e)}")
+                        outcome['failed'].append(f'Raster summary failed - {str(e)}')
+            else:
+                # os.path.exists(location) == False
+                feedback.pushInfo(f"Can not make valid: {location}")
+                outcome['failed'].append('Not a valid file path')
+
+        if len(feature_layer_lst) > 0:
+            try:
+                for feat in feature_layer_lst:
+                    assert feat.crs().authid() == 'EPSG:3005', 'Feat in feature_layer_lst not 3005'
+                    assert feat is not None, 'Feature is none'
+                if len(feature_layer_lst)>1:
+                    logger.debug(f'{layer_title} Merging results from multiple AOI features, length: {len(feature_layer_lst)}')
+                    with self.stage(outcome,'merge'):
+                        result = processing.run("native:mergevectorlayers", {'LAYERS':feature_layer_lst, 'OUTPUT':f'memory:{layer_title}_m'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                    logger.debug(f'{layer_title} Merged results')
+                else:
+                    result = feature_layer_lst[0]
+                if result.crs().authid() != 'EPSG:3005':
+                    logger.debug(f'{layer_title} reprojecting results')
+                    intermediates.append(result)
+                    with self.stage(outcome,'reproject'):
+                        result = processing.run('native:reprojectlayer', {'INPUT': result, 'TARGET_CRS': 'EPSG:3005', 'OUTPUT': f'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                idx = result.fields().indexFromName( 'SE_ANNO_CAD_DATA' )
+                if idx != (-1):
+                    res = result.dataProvider().deleteAttributes([idx])
+                    result.updateFields()
+            except Exception as e:
+                logger.critical(f"Could not merge: {str(e)}")
+                feedback.pushInfo(f"Could not merge results for {layer_title}")
+        self.release_layers(intermediates+feature_layer_lst,keep=result)
+        intermediates = None
+        feature_layer_lst = None
+        outcome['result'] = result
+        outcome['seconds'] = round(time.time()-lyr_start,1)
+        return outcome
+
+    def geometry_hash(self,layer):
+        ''' returns a hash of the geometries of layer (order independent) '''
+        wkbs = sorted(bytes(f.geometry().asWkb()) for f in layer.getFeatures())
+        digest = hashlib.sha256(layer.crs().authid().encode('utf-8'))
+        for wkb in wkbs:
+            digest.update(wkb)
+        return digest.hexdigest()
+
+    def result_cache_key(self,task):
+        ''' returns the result_cache key for a task or None if it can not be cached
+            (protected tables are never written to the cache)
+        '''
+        if not self.layer_cache.enabled or task['table'] in self.protected_tables:
+            return None
+        if task.get('union'):
+            # shared fetches are cached by the rows using them
+            return None
+        location = task['location']
+        if task['mirror'] is not None:
+            location = task['mirror']['path']
+        if location == 'BCGW':
+            source = f"BCGW:{self.db_params['database']}:{self.db_params['user']}:{task['table']}"
+        elif location is not None and os.path.exists(location):
+            source = result_cache.source_signature(location,task['table'])
+        else:
+            return None
+        return result_cache.key(self.aoi_hash,source,task['sql'],task['summary_fields'],
+            display=[self.report_precision,self.display_zoom])
+
+    def plan_tiles(self,aoi,tile_hectares):
+        ''' returns the aoi split into tiles (QgsGeometry, aoi crs) for tiled_layer, [] if the aoi
+            is within tile_hectares (or tiling is disabled)
+            a grid of tile_hectares squares is laid over the aoi, with TILE_VERTICES set (> 0) aois
+            with more vertices are tiled too and squares whose part of the aoi has more are split in four
+        '''
+        if tile_hectares <= 0:
+            return []
+        aoi_geom = QgsGeometry.unaryUnion([f.geometry() for f in aoi.getFeatures()])
+        if aoi_geom.area() <= tile_hectares*10000 and not self.too_detailed(aoi_geom):
+            return []
+        side = math.sqrt(tile_hectares*10000)
+        extent = aoi_geom.boundingBox()
+        pending = []
+        for column in range(math.ceil(extent.width()/side) or 1):
+            for row in range(math.ceil(extent.height()/side) or 1):
+                x = extent.xMinimum()+column*side
+                y = extent.yMinimum()+row*side
+                pending.append(QgsRectangle(x,y,x+side,y+side))
+        engine = QgsGeometry.createGeometryEngine(aoi_geom.constGet())
+        engine.prepareGeometry()
+        tiles = []
+        while len(pending) > 0:
+            rect = pending.pop(0)
+            rect_geom = QgsGeometry.fromRect(rect)
+            if not engine.intersects(rect_geom.constGet()):
+                continue
+            piece = aoi_geom.intersection(rect_geom)
+            if piece.isEmpty() or piece.area() == 0:
+                continue
+            if self.too_detailed(piece) and rect.width() > side*self.TILE_MIN_FRACTION:
+                center = rect.center()
+                pending.extend([QgsRectangle(rect.xMinimum(),rect.yMinimum(),center.x(),center.y()),
+                    QgsRectangle(center.x(),rect.yMinimum(),rect.xMaximum(),center.y()),
+                    QgsRectangle(rect.xMinimum(),center.y(),center.x(),rect.yMaximum()),
+                    QgsRectangle(center.x(),center.y(),rect.xMaximum(),rect.yMaximum())])
+                continue
+            tiles.append(piece)
+        logger.debug(f'Area of interest split into {len(tiles)} tiles')
+        return tiles
+
+    def too_detailed(self,geom):
+        ''' returns True if geom has more than TILE_VERTICES vertices (never when TILE_VERTICES is 0) '''
+        return self.TILE_VERTICES > 0 and geom.constGet().nCoordinates() > self.TILE_VERTICES
+
+    def tile_layer(self,tile_geom,n):
+        ''' returns a memory layer of one aoi tile (each call makes a new layer, for use on one thread) '''
+        tile = QgsMemoryProviderUtils.createMemoryLayer(f'tile_{n}',QgsFields(),QgsWkbTypes.MultiPolygon,self.tile_crs)
+        geom = QgsGeometry(tile_geom)
+        geom.convertToMultiType()
+        feature = QgsFeature()
+        feature.setGeometry(geom)
+        tile.dataProvider().addFeatures([feature])
+        return tile
+
+    def tiled_layer(self,task,oq_helper,feedback,outcome):
+        ''' queries and clips a BCGW table one aoi tile (self.aoi_tiles) at a time, so only one tile
+            of unclipped features is held in memory, clipped features are streamed to a temporary
+            GeoPackage and features crossing tile borders are stitched back together by the table's
+            unique key (see oracle_pyqgis.unique_key)
+            returns the clipped (file backed) layer, None if the table has no verified unique key
+            (the caller queries the whole aoi - features sharing a non unique key would be merged into one)
+        '''
+        layer_title = task['title']
+        key = oq_helper.unique_key(task['table'])
+        if key is None:
+            logger.debug(f'{layer_title}: no unique key to join tiles on, querying the whole aoi')
+            feedback.pushInfo(f"{layer_title}: table has no unique key (OBJECTID or primary key), not tiled")
+            return None
+        path = QgsProcessingUtils.generateTempFilename(f'tiles_{uuid.uuid4().hex}.gpkg')
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.layerName = 'tiles'
+        writer = None
+        # key values written so far, and the parts of features found in later tiles
+        # (only features crossing tile borders are held in memory)
+        written = set()
+        parts = {}
+        rows = 0
+        vertices = 0
+        size = 0
+        try:
+            for n, tile_geom in enumerate(self.aoi_tiles):
+                if outcome['budget'].isCanceled():
+                    raise layer_cancelled(layer_title)
+                tile = self.tile_layer(tile_geom,n)
+                with self.stage(outcome,'fetch'):
+                    selected = oq_helper.create_layer_anyinteract(overlay_layer=tile,layer_name=f'{layer_title}_{n}',db_table=task['table'],sql=task['sql'],simplify_tolerance=self.filter_simplify,feedback=outcome['budget'])
+                rows += selected.featureCount()
+                if self.diagnostics_enabled:
+                    tile_vertices, tile_size = self.layer_volume(selected)
+                    vertices += tile_vertices
+                    size += tile_size
+                if writer is None:
+                    writer = QgsVectorFileWriter.create(path,selected.fields(),QgsWkbTypes.multiType(selected.wkbType()),
+                        selected.crs(),QgsProject.instance().transformContext(),options)
+                    if writer.hasError() != QgsVectorFileWriter.NoError:
+                        raise Exception(f"{layer_title}: could not write tiles - {writer.errorMessage()}")
+                fc = selected.featureCount()
+                if fc > 0:
+                    with self.stage(outcome,'clip'):
+                        try:
+                            clipped = processing.run("native:clip", {'INPUT':selected, 'OVERLAY': tile, 'OUTPUT':f'memory:{layer_title}_{n}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                        except:
+                            logger.debug(f"{layer_title} tile {n+1} fixing geometry")
+                            fixed = processing.run("native:fixgeometries", {'INPUT':selected,'OUTPUT':f'memory:{layer_title}_{n}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                            clipped = processing.run("native:clip", {'INPUT':fixed, 'OVERLAY': tile, 'OUTPUT':f'memory:{layer_title}_{n}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+                            self.release_layers([fixed])
+                            fixed = None
+                    fc = clipped.featureCount()
+                    for f in clipped.getFeatures():
+                        value = f[key]
+                        if value in written:
+                            parts.setdefault(value,[]).append(f.geometry())
+                            continue
+                        geom = f.geometry()
+                        geom.convertToMultiType()
+                        f.setGeometry(geom)
+                        if not writer.addFeature(f):
+                            raise Exception(f"{layer_title}: could not write tiles - {writer.errorMessage()}")
+                        written.add(value)
+                    self.release_layers([clipped])
+                    clipped = None
+                self.release_layers([selected,tile])
+                selected = None
+                tile = None
+                feedback.pushInfo(f"{layer_title}: tile {n+1}/{len(self.aoi_tiles)} ({fc} features)")
+        finally:
+            # closes the GeoPackage
+            writer = None
+        outcome['rows_fetched'] = rows
+        if self.diagnostics_enabled:
+            outcome['vertices_fetched'], outcome['bytes_fetched'] = vertices, size
+        written = None
+        result = QgsVectorLayer(f'{path}|layername=tiles',layer_title,'ogr')
+        with self.stage(outcome,'stitch'):
+            if len(parts) > 0:
+                request = QgsFeatureRequest().setFilterExpression(
+                    f'{QgsExpression.quotedColumnRef(key)} IN ({",".join(QgsExpression.quotedValue(v) for v in parts)})')
+                stitched = {}
+                for f in result.getFeatures(request):
+                    geom = QgsGeometry.unaryUnion([f.geometry()]+parts[f[key]])
+                    geom.convertToMultiType()
+                    stitched[f.id()] = geom
+                result.dataProvider().changeGeometryValues(stitched)
+                stitched = None
+        logger.debug(f'{layer_title}: {len(parts)} features stitched across tile borders')
+        parts = None
+        return result
+
+    def server_clip_layer(self,task,aoi,oq_helper,feedback,outcome):
+        ''' fetches BCGW features already clipped to the aoi by the database into a memory layer
+            returns None if the database rejects the query, in which case the caller clips locally
+        '''
+        layer_title = task['title']
+        try:
+            with self.stage(outcome,'fetch'):
+                result = oq_helper.create_layer_intersection(overlay_layer=aoi,layer_name=layer_title,db_table=task['table'],sql=task['sql'],feedback=outcome['budget'])
+            self.count_fetched(outcome,result)
+        except layer_cancelled:
+            raise
+        except Exception as e:
+            logger.debug(f'{layer_title}: server side clip failed - {str(e)}')
+            feedback.pushInfo(f"{layer_title}: server side clip rejected by database, clipping locally")
+            return None
+        # collection results were returned unclipped, only those are clipped locally
+        flag = result.fields().indexFromName(oracle_pyqgis.CLIP_FLAG)
+        unclipped = QgsFeatureRequest(QgsExpression(f'"{oracle_pyqgis.CLIP_FLAG}" = 0'))
+        unclipped.setNoAttributes()
+        unclipped.setFlags(QgsFeatureRequest.NoGeometry)
+        unclipped_ids = [f.id() for f in result.getFeatures(unclipped)]
+        if len(unclipped_ids) > 0:
+            logger.debug(f'{layer_title}: clipping {len(unclipped_ids)} collection results locally')
+            collections = result.materialize(QgsFeatureRequest().setFilterFids(unclipped_ids))
+            with self.stage(outcome,'clip'):
+                clipped = processing.run("native:clip", {'INPUT':collections, 'OVERLAY': aoi, 'OUTPUT':f'memory:{layer_title}'},feedback=outcome['budget'],context=outcome['context'])['OUTPUT']
+            result.dataProvider().deleteFeatures(unclipped_ids)
+            result.dataProvider().addFeatures(list(clipped.getFeatures()))
+            self.release_layers([collections,clipped])
+            collections = None
+            clipped = None
+        if flag != (-1):
+            result.dataProvider().deleteAttributes([flag])
+            result.updateFields()
+        return result
+
+    def record_outcome(self,report_obj,batch,task,outcome,feedback):
+        ''' adds a layer outcome to the report, or to the batch reports (see record_batch_layer) '''
+        if batch is None:
+            self.record_layer(report_obj, task, outcome, feedback)
+        elif batch['mode'] == 'per id':
+            self.record_batch_layer(batch, task, outcome, feedback)
+        else:
+            # combined batch report, layer summaries are broken down by ID
+            join_field = None
+            if outcome['result'] is not None:
+                fetched = outcome['result']
+                with self.stage(outcome,'spatial join'):
+                    outcome['result'], join_field = self.join_batch_ids(fetched,batch,task['title'])
+                self.release_layers([fetched])
+                fetched = None
+            summary_fields = task['summary_fields'] if join_field is None else [join_field]+task['summary_fields']
+            self.record_layer(report_obj, dict(task,summary_fields=summary_fields), outcome, feedback)
+
+    def record_layer(self,report_obj,task,outcome,feedback):
+        ''' adds the outcome of evaluate_layer to the report (and map if requested)
+            always called on the algorithm thread, in config order
+        '''
+        layer_title = task['title']
+        key = task['group']
+        layer_table = task['table']
+        result = outcome['result']
+        export_start = report_obj.export_seconds
+        for comment in outcome['failed']:
+            self.failed_layers.append(layer_title)
+            report_obj.add_failed(layer_title, key, comment=comment)
+        try:
+            delta_time = outcome['seconds']
+            feedback.pushInfo(f"{layer_title}: {delta_time} seconds")
+            logger.debug(f'{layer_title}: {delta_time} seconds to process')
+            if outcome.get('cached') is not None:
+                interest = report_obj.add_cached_interest(outcome['cached']['interest'])
+                self.cache_hits.append(layer_title)
+                logger.debug(f'{layer_title}: added to report (cached)')
+                features_path = outcome['cached']['features_path']
+                if self.add_interests is True and features_path is not None:
+                    cached_lyr = QgsVectorLayer(features_path,layer_title,"ogr")
+                    QgsProject.instance().addMapLayer(cached_lyr)
+                    self.tool_map_layers.append(cached_lyr.id())
+                    logger.debug(f'{layer_title}: added to map (cached)')
+            elif outcome.get('raster') is not None:
+                field_names, summary = self.flatten_raster_zones(outcome['raster'])
+                with self.stage(outcome,'add interest'):
+                    interest = report_obj.add_raster_interest(layer_title,key,task['subgroup'],field_names,summary)
+                logger.debug(f'{layer_title}: added to report (raster)')
+            elif result is not None:      
+                if layer_table not in self.protected_tables:
+                    with self.stage(outcome,'add interest'):
+                        interest = report_obj.add_interest(result,key,task['subgroup'],task['summary_fields'],secure=False)
+                    interest['as_of'] = outcome.get('as_of')
+                    logger.debug(f'{layer_title}: added to report (non-secure)')
+                    if outcome.get('cache_key') is not None:
+                        with self.stage(outcome,'cache'):
+                            self.layer_cache.put(outcome['cache_key'],result,interest,from_database=task['location'] == 'BCGW')
+                    if result.featureCount()>0:
+                        if self.add_interests is True:
+                            logger.debug(f'{layer_title}: adding to map')
+                            geojson_lyr = QgsVectorLayer(interest['geojson_path'],layer_title,"ogr")
+                            QgsProject.instance().addMapLayer(geojson_lyr)
+                            # result (a memory layer never added to the project) is freed by release_layers
+                            self.tool_map_layers.append(geojson_lyr.id())
+                            logger.debug(f'{layer_title}: added to map')
+                else:
+                    with self.stage(outcome,'add interest'):
+                        interest = report_obj.add_interest(result,key,task['subgroup'],task['summary_fields'],secure=True)
+                    interest['as_of'] = outcome.get('as_of')
+                    logger.debug(f'{layer_title}: added to report (secure)')
+        except Exception as e:
+            feedback.pushInfo(f"Failed to add {layer_title} to map/report")
+            logger.error(f'{layer_title}: failed to add to map/report - {str(e)}')
+            self.failed_layers.append(layer_title)
+            report_obj.add_failed(layer_title, key, comment=str(e))
+        finally:
+            # geojson export happens inside add_interest, report it separately
+            export = report_obj.export_seconds-export_start
+            if export > 0:
+                outcome['stages']['geojson'] = export
+                outcome['stages']['add interest'] = outcome['stages'].get('add interest',export)-export
+            self.record_diagnostics(task,outcome,result)
+            result = None
+            interest = None
+
+    @contextlib.contextmanager
+    def stage(self,record,name):
+        ''' times the enclosed block, adding the seconds to record['stages'][name]
+            (record is a layer outcome or self.run_record)
+        '''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['stages'][name] = record['stages'].get(name,0.0)+time.perf_counter()-started
+
+    def start_batch_reports(self,batch,output,geometry_mode,feedback):
+        ''' creates a report (batch['reports'][id]) for the aoi features of each ID of the batch field,
+            written next to output as batch['outputs'][id] (<output name>_<id>.html)
+        '''
+        aoi = batch['aoi']
+        field = batch['field']
+        idx = aoi.fields().indexFromName(field)
+        assert idx != -1, f"Batch field ({field}) is not in the area of interest"
+        stem, extension = os.path.splitext(output)
+        for aoi_id in sorted(aoi.uniqueValues(idx),key=str):
+            request = QgsFeatureRequest(QgsExpression(QgsExpression.createFieldEqualityExpression(field,aoi_id)))
+            aoi_part = aoi.materialize(request)
+            aoi_part.setName(f'{aoi.name()} {field} {aoi_id}')
+            report_obj = report(aoi_part,template_path=self.CONFIG_PATH,feedback=None,geojson_files=False,
+                precision=self.report_precision,display_zoom=self.display_zoom,geometry_mode=geometry_mode)
+            safe_id = re.sub(r'[^\w\-]+','_',str(aoi_id))
+            batch['reports'][aoi_id] = report_obj
+            batch['outputs'][aoi_id] = f"{stem}_{safe_id}{extension or '.html'}"
+        self.run_record['batch']['reports'] = list(batch['outputs'].values())
+        feedback.pushInfo(f"Batch of {len(batch['reports'])} areas of interest by {field}, each layer is queried once for all of them")
+        if self.add_interests:
+            feedback.pushInfo('Interests are not added to the map in per ID batches')
+
+    def join_batch_ids(self,result,batch,layer_title):
+        ''' returns (result split by the batch aoi features with their ID attached, ID field name)
+            features crossing several areas of interest are split between them
+        '''
+        field = batch['field']
+        join_field = field
+        prefix = ''
+        if result.fields().indexFromName(field) != -1:
+            join_field = self.BATCH_JOIN_PREFIX + field
+            prefix = self.BATCH_JOIN_PREFIX
+        joined = processing.run("native:intersection", {'INPUT':result, 'OVERLAY':batch['aoi'],
+            'INPUT_FIELDS':[], 'OVERLAY_FIELDS':[field], 'OVERLAY_FIELDS_PREFIX':prefix,
+            'OUTPUT':f'memory:{layer_title}'})['OUTPUT']
+        return joined, join_field
+
+    def record_batch_layer(self,batch,task,outcome,feedback):
+        ''' adds the outcome of evaluate_layer (fetched once for every aoi of the batch) to the
+            report of each ID, always called on the algorithm thread, in config order
+        '''
+        layer_title = task['title']
+        key = task['group']
+        result = outcome['result']
+        for comment in outcome['failed']:
+            self.failed_layers.append(layer_title)
+            for report_obj in batch['reports'].values():
+                report_obj.add_failed(layer_title, key, comment=comment)
+        feedback.pushInfo(f"{layer_title}: {outcome['seconds']} seconds")
+        try:
+            if outcome.get('raster') is not None:
+                with self.stage(outcome,'add interest'):
+                    for aoi_id, report_obj in batch['reports'].items():
+                        report_obj.add_raster_interest(layer_title,key,task['subgroup'],outcome['raster']['field_names'],
+                            outcome['raster']['zones'].get(aoi_id,{}))
+            elif result is not None:
+                with self.stage(outcome,'spatial join'):
+                    joined, join_field = self.join_batch_ids(result,batch,layer_title)
+                    # one pass over the joined features, then each ID reads only its own
+                    fids = {aoi_id:[] for aoi_id in batch['reports']}
+                    request = QgsFeatureRequest()
+                    request.setFlags(QgsFeatureRequest.NoGeometry)
+                    request.setSubsetOfAttributes([join_field],joined.fields())
+                    for f in joined.getFeatures(request):
+                        fids.setdefault(f[join_field],[]).append(f.id())
+                secure = task['table'] in self.protected_tables
+                with self.stage(outcome,'add interest'):
+                    for aoi_id, report_obj in batch['reports'].items():
+                        aoi_result = joined.materialize(QgsFeatureRequest().setFilterFids(fids[aoi_id]))
+                        aoi_result.setName(layer_title)
+                        interest = report_obj.add_interest(aoi_result,key,task['subgroup'],task['summary_fields'],secure=secure)
+                        interest['as_of'] = outcome.get('as_of')
+                        self.release_layers([aoi_result])
+                        aoi_result = None
+                self.release_layers([joined])
+                joined = None
+                logger.debug(f'{layer_title}: added to {len(batch["reports"])} batch reports')
+        except Exception as e:
+            feedback.pushInfo(f"Failed to add {layer_title} to the batch reports")
+            logger.error(f'{layer_title}: failed to add to batch reports - {str(e)}')
+            self.failed_layers.append(layer_title)
+            for report_obj in batch['reports'].values():
+                report_obj.add_failed(layer_title, key, comment=str(e))
+        finally:
+            self.record_diagnostics(task,outcome,result)
+            result = None
+
+    def aoi_zones(self,aoi,batch_field=None):
+        ''' returns the zones raster layers are summarized by {'crs','field','zones':[(zone id, QgsGeometry)]}
+            one zone (id None) covering the aoi, or one per ID of batch_field
+        '''
+        parts = {}
+        idx = aoi.fields().indexFromName(batch_field) if batch_field else -1
+        for f in aoi.getFeatures():
+            zone_id = f.attributes()[idx] if idx != -1 else None
+            parts.setdefault(zone_id,[]).append(f.geometry())
+        zones = [(zone_id,QgsGeometry.unaryUnion(geometries)) for zone_id, geometries in parts.items()]
+        return {'crs':aoi.crs(),'field':batch_field if idx != -1 else None,'zones':zones}
+
+    def raster_classes(self,raster_path):
+        ''' returns the attribute table of a classified raster {value: {column: text}}
+            from the GDAL raster attribute table (eg ESRI grid vat.adf) or <raster>.vat.dbf, {} if neither
+        '''
+        gdal = deferred_import('osgeo.gdal')
+        classes = {}
+        dataset = gdal.Open(raster_path)
+        rat = dataset.GetRasterBand(1).GetDefaultRAT()
+        if rat is not None and rat.GetRowCount() > 0:
+            names = [rat.GetNameOfCol(c) for c in range(rat.GetColumnCount())]
+            upper = [n.upper() for n in names]
+            value_col = upper.index('VALUE') if 'VALUE' in upper else rat.GetColOfUsage(gdal.GFU_MinMax)
+            if value_col != -1:
+                for r in range(rat.GetRowCount()):
+                    classes[rat.GetValueAsDouble(r,value_col)] = {name:rat.GetValueAsString(r,c) for c, name in enumerate(names)}
+                return classes
+        dbf = raster_path + '.vat.dbf'
+        if os.path.exists(dbf):
+            ogr = deferred_import('osgeo.ogr')
+            datasource = ogr.Open(dbf,0)
+            layer = datasource.GetLayer()
+            layer_def = layer.GetLayerDefn()
+            names = [layer_def.GetFieldDefn(i).GetName() for i in range(layer_def.GetFieldCount())]
+            value_name = [n for n in names if n.upper() == 'VALUE']
+            assert len(value_name) > 0, f'No VALUE column in {dbf}'
+            for f in layer:
+                classes[f.GetField(value_name[0])] = {name:str(f.GetField(name)) for name in names}
+            datasource = None
+        return classes
+
+    def raster_zonal_summary(self,raster_path,task,budget=None):
+        ''' returns per class pixel counts and hectares of band 1 within each zone of self.raster_zones
+            {'field_names': text, 'zones': {zone id: {class label: {'count','value','unit'}}}}
+            only the raster blocks under each zone are read (in strips of RASTER_STRIP_PIXELS),
+            the zone is rasterized to a mask and classes counted with numpy
+            classes are labelled by the Attribute ID columns of the raster attribute table and
+            filtered by the Display Query (a QGIS expression on VALUE and the table columns)
+            budget: QgsFeedback checked between strips (see layer_watchdog)
+        '''
+        gdal = deferred_import('osgeo.gdal')
+        ogr = deferred_import('osgeo.ogr')
+        np = deferred_import('numpy')
+        dataset = gdal.Open(raster_path)
+        assert dataset is not None, f'Could not open {raster_path}'
+        band = dataset.GetRasterBand(1)
+        gt = dataset.GetGeoTransform()
+        assert gt[2] == 0 and gt[4] == 0 and gt[5] < 0, 'Rotated or south up rasters are not supported'
+        nodata = band.GetNoDataValue()
+        raster_crs = QgsCoordinateReferenceSystem.fromWkt(dataset.GetProjection())
+        transform = QgsCoordinateTransform(self.raster_zones['crs'],raster_crs,QgsProject.instance().transformContext())
+        if raster_crs.isGeographic():
+            # cell area shrinks towards the poles, computed per row
+            cell_area = None
+        else:
+            to_metres = QgsUnitTypes.fromUnitToUnitFactor(raster_crs.mapUnits(),QgsUnitTypes.DistanceMeters)
+            cell_area = abs(gt[1]*gt[5])*to_metres**2
+        block_rows = band.GetBlockSize()[1]
+        zone_counts = {}
+        for zone_id, zone_geom in self.raster_zones['zones']:
+            counts = {}
+            zone_counts[zone_id] = counts
+            geom = QgsGeometry(zone_geom)
+            geom.transform(transform)
+            bbox = geom.boundingBox()
+            x0 = max(int(math.floor((bbox.xMinimum()-gt[0])/gt[1])),0)
+            x1 = min(int(math.ceil((bbox.xMaximum()-gt[0])/gt[1])),dataset.RasterXSize)
+            y0 = max(int(math.floor((bbox.yMaximum()-gt[3])/gt[5])),0)
+            y1 = min(int(math.ceil((bbox.yMinimum()-gt[3])/gt[5])),dataset.RasterYSize)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            mask_source = ogr.GetDriverByName('Memory').CreateDataSource('zone')
+            mask_layer = mask_source.CreateLayer('zone')
+            feature = ogr.Feature(mask_layer.GetLayerDefn())
+            feature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geom.asWkb())))
+            mask_layer.CreateFeature(feature)
+            # whole blocks per strip
+            strip_rows = max(block_rows,(self.RASTER_STRIP_PIXELS//(x1-x0))//block_rows*block_rows)
+            for y in range(y0,y1,strip_rows):
+                if budget is not None and budget.isCanceled():
+                    raise layer_cancelled(task['title'])
+                rows = min(strip_rows,y1-y)
+                data = band.ReadAsArray(x0,y,x1-x0,rows)
+                mask = gdal.GetDriverByName('MEM').Create('',x1-x0,rows,1,gdal.GDT_Byte)
+                mask.SetGeoTransform((gt[0]+x0*gt[1],gt[1],0,gt[3]+y*gt[5],0,gt[5]))
+                gdal.RasterizeLayer(mask,[1],mask_layer,burn_values=[1])
+                inside = mask.GetRasterBand(1).ReadAsArray().astype(bool)
+                mask = None
+                if nodata is not None and not math.isnan(nodata):
+                    inside &= data != nodata
+                if np.issubdtype(data.dtype,np.floating):
+                    # NaN pixels (NaN nodata never compares equal) are not a class
+                    inside &= ~np.isnan(data)
+                values = data[inside]
+                if values.size == 0:
+                    continue
+                classes, inverse, pixels = np.unique(values,return_inverse=True,return_counts=True)
+                if cell_area is None:
+                    top = np.radians(gt[3]+(y+np.arange(rows))*gt[5])
+                    row_areas = self.EARTH_RADIUS**2*math.radians(abs(gt[1]))*np.abs(np.sin(top)-np.sin(top+math.radians(gt[5])))
+                    areas = np.bincount(inverse.ravel(),weights=np.broadcast_to(row_areas[:,None],data.shape)[inside])
+                else:
+                    areas = pixels*cell_area
+                for value, n, area in zip(classes.tolist(),pixels.tolist(),areas.tolist()):
+                    count = counts.setdefault(value,[0,0.0])
+                    count[0] += n
+                    count[1] += area
+                data = None
+            mask_source = None
+        dataset = None
+
+        # label (and filter) classes with the raster attribute table
+        table = self.raster_classes(raster_path)
+        summary_fields = task['summary_fields']
+        if len(summary_fields) > 0:
+            assert len(table) > 0, 'Attribute ID needs a raster attribute table (.vat.dbf)'
+            columns = {name.upper():name for name in next(iter(table.values()))}
+            for sf in summary_fields:
+                assert sf.upper() in columns, f"summary field ({sf}) is not in the raster attribute table"
+            label_columns = [columns[sf.upper()] for sf in summary_fields]
+        else:
+            label_columns = []
+        expression = None
+        if len(task['sql']) > 0:
+            expression = QgsExpression(task['sql'])
+            assert not expression.hasParserError(), f"Display Query is not a valid expression ({expression.parserErrorString()})"
+        field_names = ' | '.join(summary_fields) if len(summary_fields) > 0 else 'VALUE'
+        if self.raster_zones['field'] is not None:
+            field_names = f"{self.raster_zones['field']} | {field_names}"
+        zones = {}
+        for zone_id, counts in zone_counts.items():
+            summary = {}
+            for value, (pixels, area) in counts.items():
+                row = table.get(value,{})
+                if expression is not None and not self.raster_class_selected(expression,value,row):
+                    continue
+                if len(label_columns) > 0:
+                    label = ' | '.join(row.get(c,str(value)) for c in label_columns)
+                else:
+                    label = str(value)
+                entry = summary.setdefault(label,{'count':0,'value':0.0,'unit':'ha'})
+                entry['count'] += pixels
+                entry['value'] += area/10000
+            zones[zone_id] = summary
+        return {'field_names':field_names,'zones':zones}
+
+    def raster_class_selected(self,expression,value,row):
+        ''' returns True if a raster class (VALUE and its attribute table row) matches the Display Query '''
+        fields = QgsFields()
+        fields.append(QgsField('VALUE',QVariant.Double))
+        attributes = [value]
+        for name, text in row.items():
+            if name.upper() != 'VALUE':
+                fields.append(QgsField(name,QVariant.String))
+                attributes.append(text)
+        feature = QgsFeature(fields)
+        feature.setAttributes(attributes)
+        context = QgsExpressionContext()
+        context.setFields(fields)
+        context.setFeature(feature)
+        return bool(expression.evaluate(context))
+
+    def flatten_raster_zones(self,raster):
+        ''' returns (field names, field summary) of a raster outcome for a single report,
+            batch zones are prefixed with their ID
+        '''
+        if self.raster_zones['field'] is None:
+            return raster['field_names'], raster['zones'].get(None,{})
+        summary = {}
+        for zone_id, zone in raster['zones'].items():
+            for label, entry in zone.items():
+                summary[f'{zone_id} | {label}'] = entry
+        return raster['field_names'], summary
+
+    def aoi_filtered(self,vlayer,aoi,outcome):
+        ''' returns the features of a file layer within the aoi extent as a memory layer
+            the extent filter is passed to OGR, which uses the .qix / GeoPackage rtree when present
+        '''
+        try:
+            transform = QgsCoordinateTransform(aoi.crs(),vlayer.crs(),QgsProject.instance().transformContext())
+            extent = transform.transformBoundingBox(aoi.extent())
+        except Exception as e:
+            logger.debug(f'{vlayer.name()}: aoi extent not transformed, reading every feature - {str(e)}')
+            extent = None
+        request = QgsFeatureRequest()
+        if extent is not None and vlayer.crs().isValid():
+            request.setFilterRect(extent)
+        with self.stage(outcome,'fetch'):
+            selected_features = vlayer.materialize(request,outcome['budget'])
+        self.count_fetched(outcome,selected_features)
+        return selected_features
+
+    def index_file_source(self,vlayer,location,layer_table,layer_sql):
+        ''' builds a missing spatial index (.qix for shapefiles) and attribute indexes on the
+            Display Query fields of a file layer, once per session, kept next to the data
+        '''
+        key = (os.path.abspath(location),layer_table)
+        with DissectAlg._indexed_lock:
+            if key in DissectAlg._indexed_sources:
+                return
+            DissectAlg._indexed_sources.add(key)
+        provider = vlayer.dataProvider()
+        capabilities = provider.capabilities()
+        if capabilities & QgsVectorDataProvider.CreateSpatialIndex and provider.hasSpatialIndex() != QgsFeatureSource.SpatialIndexPresent:
+            if provider.createSpatialIndex():
+                logger.debug(f'Spatial index built for {location}')
+            else:
+                logger.debug(f'Could not build a spatial index for {location}')
+        if len(layer_sql) == 0 or not capabilities & QgsVectorDataProvider.CreateAttributeIndex:
+            return
+        filename, file_extension = os.path.splitext(location)
+        if file_extension == '.shp' and os.path.exists(filename + '.idm'):
+            # shapefile attribute indexes are rebuilt by every CREATE INDEX
+            return
+        fields = provider.fields()
+        for field in fields:
+            if re.search(rf'\b{re.escape(field.name())}\b',layer_sql,re.IGNORECASE):
+                if provider.createAttributeIndex(fields.indexOf(field.name())):
+                    logger.debug(f'Attribute index built on {field.name()} for {location}')
+
+    def count_fetched(self,outcome,layer):
+        ''' records rows (and with diagnostics enabled vertices and geometry bytes) read from a source '''
+        outcome['rows_fetched'] = layer.featureCount()
+        if self.diagnostics_enabled:
+            outcome['vertices_fetched'], outcome['bytes_fetched'] = self.layer_volume(layer)
+
+    def layer_volume(self,layer):
+        ''' returns (vertices, bytes) of the layer geometries (WKB size) '''
+        vertices = 0
+        size = 0
+        request = QgsFeatureRequest()
+        request.setNoAttributes()
+        for f in layer.getFeatures(request):
+            geom = f.geometry()
+            if not geom.isNull():
+                vertices += geom.constGet().nCoordinates()
+                size += geom.wkbSize()
+        return vertices, size
+
+    def record_diagnostics(self,task,outcome,result):
+        ''' adds the stage timings and counts of one layer to the run record '''
+        stages = {name:round(seconds,3) for name, seconds in outcome['stages'].items()}
+        layer = {'title':task['title'],
+            'group':task['group'],
+            'source':task['location'],
+            'table':task['table'],
+            'seconds':round(outcome['seconds']+sum([v for k, v in outcome['stages'].items() if k in ['add interest','geojson']]),3),
+            'stages':stages,
+            'cached':outcome.get('cached') is not None,
+            'failed':list(outcome['failed']),
+            'rows_fetched':outcome['rows_fetched'],
+            'rows':result.featureCount() if result is not None else None,
+            'vertices_fetched':outcome['vertices_fetched'],
+            'bytes_fetched':outcome['bytes_fetched'],
+            'vertices':None}
+        if self.diagnostics_enabled and result is not None:
+            layer['vertices'] = self.layer_volume(result)[0]
+        self.run_record['layers'].append(layer)
+        if not layer['cached'] and 'Cancelled' not in layer['failed']:
+            # timed out layers are kept, their budget is a lower bound of the layer's time
+            try:
+                self.history.put(self.timing_source(task),task['title'],self.run_record['aoi_hectares'],
+                    layer['seconds'],layer['rows_fetched'],layer['rows'])
+            except sqlite3.Error as e:
+                logger.debug(f"{task['title']}: timing not recorded - {str(e)}")
+
+    def release_layers(self,layers,keep=None):
+        ''' frees the features of intermediate memory layers now rather than whenever they are
+            garbage collected, layers of other providers and keep are left alone
+            (callers drop their references afterwards)
+        '''
+        for layer in layers:
+            if layer is None or layer is keep or not isinstance(layer,QgsVectorLayer):
+                continue
+            if layer.isValid() and layer.providerType() == 'memory':
+                layer.dataProvider().truncate()
+
+    def start_memory_profile(self,feedback):
+        ''' starts tracing Python allocations (tracemalloc) for sample_memory '''
+        self.memory_tracing = not tracemalloc.is_tracing()
+        if self.memory_tracing:
+            tracemalloc.start()
+        rss = process_rss_mb()
+        if rss is None:
+            feedback.pushInfo('Process memory can not be read (install psutil), logging Python memory only')
+        else:
+            rss = round(rss,1)
+        self.run_record['memory'] = {'start_rss_mb':rss,'peak_rss_mb':rss,'last_rss_mb':rss,'python_peak_mb':0.0,'layers':0}
+
+    def sample_memory(self,layer_title,feedback):
+        ''' logs process and Python memory after a layer is recorded and released, adding it to
+            the layer's run record (python peak is the peak since the previous layer)
+        '''
+        rss = process_rss_mb()
+        current, peak = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc,'reset_peak'):
+            tracemalloc.reset_peak()
+        sample = {'rss_mb':round(rss,1) if rss is not None else None,
+            'python_mb':round(current/2**20,1),
+            'python_peak_mb':round(peak/2**20,1)}
+        # record_diagnostics appended this layer last
+        self.run_record['layers'][-1]['memory'] = sample
+        memory = self.run_record['memory']
+        memory['layers'] += 1
+        memory['python_peak_mb'] = max(memory['python_peak_mb'],sample['python_peak_mb'])
+        if rss is not None:
+            memory['last_rss_mb'] = sample['rss_mb']
+            memory['peak_rss_mb'] = max(memory['peak_rss_mb'] or 0,sample['rss_mb'])
+        rss_text = f"{sample['rss_mb']} MB process, " if rss is not None else ''
+        feedback.pushInfo(f"{layer_title}: memory {rss_text}{sample['python_mb']} MB Python (peak {sample['python_peak_mb']} MB)")
+
+    def stop_memory_profile(self,feedback):
+        ''' logs the memory summary of the run, stopping tracemalloc if start_memory_profile started it '''
+        if self.memory_tracing:
+            tracemalloc.stop()
+            self.memory_tracing = False
+        memory = getattr(self,'run_record',{}).get('memory')
+        if memory is None or memory['layers'] == 0:
+            return
+        if memory['start_rss_mb'] is not None:
+            feedback.pushInfo(f"Memory over {memory['layers']} layers: process {memory['start_rss_mb']} MB at the start, "
+                f"{memory['last_rss_mb']} MB after the last layer (peak {memory['peak_rss_mb']} MB), Python peak {memory['python_peak_mb']} MB")
+        else:
+            feedback.pushInfo(f"Memory over {memory['layers']} layers: Python peak {memory['python_peak_mb']} MB")
+
+    def timing_source(self,task):
+        ''' returns the timing_history key of a task (source, table and Display Query) '''
+        location = 'MIRROR' if task.get('mirror') is not None else (task['location'] or '')
+        return '|'.join([location,(task['table'] or '').upper(),task['sql']])
+
+    def write_run_record(self):
+        ''' writes the run record json to <profile>/dissect/runs (RUN_HISTORY newest are kept),
+            returns the path
+        '''
+        runs_path = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect','runs')
+        os.makedirs(runs_path,exist_ok=True)
+        record = self.run_record
+        record['stages'] = {name:round(seconds,3) for name, seconds in record['stages'].items()}
+        record['import_times'] = {module:round(seconds,3) for module, seconds in IMPORT_TIMES.items()}
+        file_name = datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + f"_{uuid.uuid4().hex[:8]}.json"
+        record_path = os.path.join(runs_path,file_name)
+        with open(record_path,'w',encoding='utf-8') as f:
+            json.dump(record,f,indent=1,default=str)
+        for old in sorted(os.listdir(runs_path),reverse=True)[self.RUN_HISTORY:]:
+            os.remove(os.path.join(runs_path,old))
+        return record_path
+
+class deferred_feedback:
+    ''' stands in for the run feedback on a worker thread: messages are kept for the algorithm
+        thread to push in config order (the run feedback is a QObject of that thread),
+        cancellation is read from the run feedback
+    '''
+
+    def __init__(self,run_feedback):
+        self.run_feedback = run_feedback
+        self.messages = []
+
+    def pushInfo(self,info):
+        self.messages.append(info)
+
+    def isCanceled(self):
+        return self.run_feedback.isCanceled()
+
+class layer_cancelled(Exception):
+    ''' raised when a layer's time budget is spent or the run is cancelled (see layer_watchdog) '''
+
+class layer_watchdog:
+    ''' cancels the feedback of each running layer once its time budget is spent, or as soon as
+        the run is cancelled, from its own thread (the layer may be waiting on a database session)
+        materialize and processing.run given the layer feedback stop at the next feature, database
+        calls given it are abandoned (see db_session.call)
+        usage:
+        watchdog = layer_watchdog(feedback)
+        layer_feedback = watchdog.start(300)
+        layer = source.materialize(QgsFeatureRequest(),layer_feedback)
+        watchdog.finish(layer_feedback)
+        watchdog.stop()
+    '''
+
+    # seconds between deadline checks
+    INTERVAL = 0.5
+
+    def __init__(self,run_feedback):
+        self.run_feedback = run_feedback
+        # layer feedback: deadline (time.monotonic) or None
+        self.running = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.watch,name='dissect watchdog',daemon=True)
+        self.thread.start()
+
+    def start(self,seconds):
+        ''' returns a QgsProcessingFeedback for one layer, cancelled after seconds (0 for no limit) '''
+        layer_feedback = QgsProcessingFeedback()
+        deadline = time.monotonic()+seconds if seconds > 0 else None
+        with self.lock:
+            self.running[layer_feedback] = deadline
+        if self.run_feedback.isCanceled():
+            layer_feedback.cancel()
+        return layer_feedback
+
+    def finish(self,layer_feedback):
+        with self.lock:
+            self.running.pop(layer_feedback,None)
+
+    def watch(self):
+        while not self.stopped.wait(self.INTERVAL):
+            cancelled = self.run_feedback.isCanceled()
+            now = time.monotonic()
+            with self.lock:
+                for layer_feedback, deadline in self.running.items():
+                    if cancelled or (deadline is not None and now > deadline):
+                        layer_feedback.cancel()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+class report:
+    ''' Class report includes parameters to track attributes of interests and
+        methods to generate a report
+        initialized with QgsVectorLayer descibing report area of interest
+        self.interests dictionary
+        {
+            name:'',
+            field_summary: {},
+            geom_type:''
+            area/length:0.0,
+            count:0,
+            geojson:'filepath'
+        }
+    '''
+
+    TEMPLATE_RELATIVE_PATH = 'templates'
+    # decimal places of exported GeoJSON coordinates
+    GEOJSON_PRECISION = 15
+    # web mercator ground resolution (m/pixel) at zoom level 0 on the equator
+    ZOOM_0_RESOLUTION = 156543.03392
+    # how interest geometry is written to the html (see report)
+    GEOMETRY_MODES = ['inline','packed','sidecar']
+    SIDECAR_SUFFIX = '_geodata'
+    # template chunks buffered per write when streaming the report to file
+    RENDER_BUFFER = 64
+    # characters of a GeoJSON file handed to the template (or packed) at a time
+    GEOJSON_CHUNK = 2**16
+    # report map GeoJSON files (see vectorlayer_to_geojson), removed once the report is written
+    DISPLAY_FOLDER = 'display'
+    # {template folder: jinja2.Environment} compiled templates shared for the QGIS session
+    _environments = {}
+    _environments_lock = threading.Lock()
+
+    def __init__(self,aoi,template_path,feedback,geojson_files=False,precision=GEOJSON_PRECISION,display_zoom=0,geometry_mode='inline'):
+        ''' geojson_files: also write each interest's GeoJSON to a temp file (geojson_path),
+            eg for adding interests to the map
+            precision: decimal places of the report map coordinates
+            display_zoom: simplify report map geometry to half a pixel at this zoom level (0 disables)
+            report map geometry only, areas/lengths and geojson_path files use the exact geometry
+            geometry_mode: inline (GeoJSON in the page script), packed (gzip/base64 blocks in the page)
+                or sidecar (gzip/base64 script per interest in a folder next to the html),
+                packed and sidecar geometry is only decoded when the interest is drawn on the map
+        '''
+        assert geometry_mode in self.GEOMETRY_MODES, f"Unknown report geometry mode ({geometry_mode})"
+        self.uuid = str(uuid.uuid4())
+        logger.debug(f'Report uuid set: {self.uuid}')
+        self.fb = feedback
+        self.geojson_files = geojson_files
+        self.precision = int(precision)
+        self.display_zoom = int(display_zoom)
+        self.geometry_mode = geometry_mode
+        # seconds spent in vectorlayer_to_geojson
+        self.export_seconds = 0.0
+        # run record (DissectAlg.run_record) shown as run diagnostics, None to leave it out
+        self.diagnostics = None
+        self.latitude = 0.0
+        self.display_stats = {'vertices':0,'display_vertices':0,'bytes':0}
+        assert os.path.exists(os.path.join(template_path,self.TEMPLATE_RELATIVE_PATH))
+        self.template_path = template_path
+        self.interests = []
+        # report map GeoJSON files written so far (unique file names)
+        self.display_files = 0
+        self.aoi = self.aoi_info(aoi)
+        self.failedLyrs = []
+        
+    def aoi_info(self,aoi):
+        '''prepars key:value dict with keys name,area,geojson (display GeoJSON file path)
+        aoi: QgsVectorLayer'''
+        a = 0.0
+        if isinstance(aoi, QgsVectorLayer) is False:
+            return None
+        features = aoi.getFeatures()
+        for f in features:
+            geom = f.geometry()
+            geom_type = QgsWkbTypes.displayString(geom.wkbType())
+            assert geom_type in ['Polygon','PolygonZ','MultiPolygon','Polygon25D','MultiPolygonZ'], "Area of interest must be polygonal"
+            a += geom.area()
+        logger.debug(f'AOI area: {round(a/10000,1)} ha')
+        bb = self.get_bb(aoi,4326)
+        # display tolerance is scaled to the ground resolution at the aoi
+        self.latitude = (bb[0][0]+bb[1][0])/2
+        geojson = self.vectorlayer_to_geojson(aoi)
+        name = aoi.name()
+        d = {'name':name,'area':a,'bounds':bb, 'geojson':geojson}
+        return d
+
+    def get_bb(self,layer,to_epsg_cd):
+        """ returns Lat,Long string"""
+        r_layer = processing.run('native:reprojectlayer', {'INPUT': layer, 'TARGET_CRS': 'EPSG:{}'.format(to_epsg_cd), 'OUTPUT': 'memory:{}'.format(layer.name())})['OUTPUT']
+        # center = r_layer.extent().center()
+        bb = r_layer.extent()
+        corner1=[round(bb.yMinimum(),7), round(bb.xMinimum(),7)]
+        corner2=[round(bb.yMaximum(),7), round(bb.xMaximum(),7)]
+        return [corner1, corner2]
+
+    def add_interest(self,intersected_layer,group, subgroup,summary_fields, secure):
+        ''' add an interest to the report
+            parameters: interested_layer
+        '''
+        
+        interest = {'name':intersected_layer.name(),
+            'group':group,
+            'subgroup':subgroup,
+            'secure': secure}
+        logger.debug(f'Building report: adding interest {interest}')
+        # resolve summary fields once, then pull measures and summary values as columns
+        fields = intersected_layer.fields()
+        field_idx = [fields.indexFromName(sf) for sf in summary_fields]
+        if intersected_layer.featureCount() > 0:
+            for sf, idx in zip(summary_fields,field_idx):
+                assert idx != -1, f"summary field ({sf}) does not exist in layer({intersected_layer.name()})"
+        category = intersected_layer.geometryType()
+        if category == QgsWkbTypes.PolygonGeometry:
+            measure, scale, unit = 'area($geometry)', 1/10000, 'ha'
+        elif category == QgsWkbTypes.LineGeometry:
+            measure, scale, unit = 'length($geometry)', 1, 'm'
+        elif category == QgsWkbTypes.PointGeometry:
+            measure, scale, unit = None, 0, ''
+        else:
+            geom_type = QgsWkbTypes.displayString(intersected_layer.wkbType())
+            logger.error(f"Unexpected geometry type:{geom_type} during add_interest")
+            raise Exception (f"Unexpected geometry type:{geom_type}")
+        if intersected_layer.featureCount() > 0:
+            interest['geometry_type'] = QgsWkbTypes.displayString(intersected_layer.wkbType())
+        pd = deferred_import('pandas')
+        if measure is None:
+            metrics = pd.DataFrame({'measure':[0.0]*intersected_layer.featureCount()})
+        else:
+            measures, ok = QgsVectorLayerUtils.getValues(intersected_layer,measure)
+            assert ok, f"Could not measure {intersected_layer.name()} ({measure})"
+            metrics = pd.DataFrame({'measure':pd.to_numeric(pd.Series(measures,dtype=object),errors='coerce').fillna(0.0)})
+        metrics['value'] = metrics['measure']*scale
+        total = float(metrics['measure'].sum())
+        d = {'count':len(metrics),
+            'length':total if category == QgsWkbTypes.LineGeometry else 0.0,
+            'area':total if category == QgsWkbTypes.PolygonGeometry else 0.0}
+
+        # group by the joined summary field values
+        summary_dict = {}
+        field_string = " | ".join(summary_fields)
+        if len(summary_fields)>0 and len(metrics)>0:
+            key_columns = [f'key{n}' for n in range(len(summary_fields))]
+            for key_column, sf in zip(key_columns,summary_fields):
+                column, ok = QgsVectorLayerUtils.getValues(intersected_layer,sf)
+                assert ok, f"Could not read summary field ({sf}) from layer({intersected_layer.name()})"
+                metrics[key_column] = pd.Series(column,dtype=object).map(self.summary_value)
+            grouped = metrics.groupby(key_columns,sort=False).agg(count=('value','size'),value=('value','sum'))
+            for key_values, row in grouped.iterrows():
+                if not isinstance(key_values,tuple):
+                    key_values = (key_values,)
+                summary_dict[" | ".join(key_values)] = {'count':int(row['count']),'value':float(row['value']),'unit':unit}
+        metrics = None
+        
+        if (d['count']>0):
+            interest['value'] = d['count']
+            interest['count'] = d['count']
+        if (d['area']>0):
+            interest['value'] = d['area']/10000
+            interest['unit'] = 'ha'
+        elif (d['length']>0):
+            interest['value'] = d['length']
+            interest['unit'] = 'm'
+        else:
+            interest['count']=0
+        if intersected_layer.featureCount() > 0:
+            summary = []
+            if len(summary_dict)>0:
+                try:
+                    sorted_tuples = sorted(summary_dict.items(),reverse=True) # sort by key name
+                    summary_dict = {k: v for k, v in sorted_tuples}
+                except:
+                    pass
+            interest['field_summary'] = summary_dict
+            interest['field_names_summary'] = field_string
+            if secure is True:
+                interest['geojson'] = None   
+                interest['geojson_path'] = None   
+            else: 
+                logger.debug(f'Exporting {intersected_layer} to geojson')
+                if self.geojson_files:
+                    geojson_path = self.temp_geojson_path(intersected_layer.name())
+                else:
+                    geojson_path = None
+                interest['geojson_path'] = geojson_path
+                interest['geojson'] = self.vectorlayer_to_geojson(intersected_layer,geojson_path)
+                logger.debug('Exported to geojson, geojson returned')
+        else:
+            interest['geojson'] = None
+            interest['geojson_path'] = None   
+            interest['field_summary'] = []
+        self.interests.append(interest)
+        logger.debug('Interest appended to interests')
+        return interest
+    def summary_value(self,value):
+        ''' returns the string a summary field value is grouped by '''
+        if isinstance(value, QDateTime): # convert QDateTime to formatted string
+            return value.toPyDateTime().date().isoformat()
+        return str(value)
+
+    def vectorlayer_to_geojson(self,layer,geojson_path=None):
+        '''Serialize QgsVectorlayer to an EPSG:4326 GeoJSON file in a single pass over the features,
+           each feature is written as it is exported so memory does not grow with the layer,
+           returns the file path (the report map (display) geometry: quantized to self.precision
+           and simplified for self.display_zoom), also written to geojson_path if given with the
+           exact geometry'''
+        export_start = time.perf_counter()
+        exporter = QgsJsonExporter(layer,self.precision)
+        # geometries are transformed from the layer crs to EPSG:4326
+        exporter.setTransformGeometries(True)
+        exporter.setSourceCrs(layer.crs())
+        exact_exporter = None
+        exact_file = None
+        if geojson_path is not None:
+            exact_exporter = QgsJsonExporter(layer,self.GEOJSON_PRECISION)
+            exact_exporter.setTransformGeometries(True)
+            exact_exporter.setSourceCrs(layer.crs())
+            exact_file = open(geojson_path,'w',encoding='utf-8')
+            exact_file.write('{"type":"FeatureCollection","features":[')
+        tolerance = self.display_tolerance(layer)
+        vertices = 0
+        display_vertices = 0
+        display_path = self.display_path()
+        logger.debug('V2GEOJSON: about to serialize')
+        separator = ''
+        try:
+            with open(display_path,'w',encoding='utf-8') as out:
+                out.write('{"type":"FeatureCollection","features":[')
+                for f in layer.getFeatures():
+                    if exact_file is not None:
+                        exact_file.write(separator)
+                        exact_file.write(exact_exporter.exportFeature(f))
+                    geom = f.geometry()
+                    if not geom.isNull():
+                        n = geom.constGet().nCoordinates()
+                        vertices += n
+                        if tolerance > 0 and geom.type() != QgsWkbTypes.PointGeometry:
+                            # topology preserving (GEOS) simplification, rings are not collapsed
+                            simplified = geom.simplify(tolerance)
+                            if not simplified.isNull() and not simplified.isEmpty():
+                                f.setGeometry(simplified)
+                                n = simplified.constGet().nCoordinates()
+                        display_vertices += n
+                    out.write(separator)
+                    out.write(exporter.exportFeature(f))
+                    separator = ','
+                out.write(']}')
+        finally:
+            if exact_file is not None:
+                exact_file.write(']}')
+                exact_file.close()
+        size = os.path.getsize(display_path)
+        self.display_stats['vertices'] += vertices
+        self.display_stats['display_vertices'] += display_vertices
+        self.display_stats['bytes'] += size
+        logger.debug(f'V2GEOJSON: json serialized ({display_vertices} of {vertices} vertices, {size/1000:.0f} KB)')
+        self.export_seconds += time.perf_counter()-export_start
+        return display_path
+
+    def display_path(self,extension='.geojson'):
+        ''' returns a new file path for report map geometry (in a folder unique to this report) '''
+        display_dir = os.path.join(os.environ['TEMP'],self.uuid,self.DISPLAY_FOLDER)
+        os.makedirs(display_dir,exist_ok=True)
+        self.display_files += 1
+        return os.path.join(display_dir,f'{self.display_files}{extension}')
+
+    def file_chunks(self,path):
+        ''' yields the text of a report map file GEOJSON_CHUNK characters at a time,
+            the template writes GeoJSON and packed geometry with it instead of holding whole files
+        '''
+        with open(path,encoding='utf-8') as f:
+            for chunk in iter(lambda: f.read(self.GEOJSON_CHUNK),''):
+                yield chunk
+
+    def pack_file(self,geojson_path,out,prefix='',suffix=''):
+        ''' writes base64 of the gzipped GeoJSON file to the open text file out (between prefix and
+            suffix) a chunk at a time, returns the packed size
+        '''
+        # wbits 31: gzip container, inflated by the page with DecompressionStream("gzip")
+        compressor = zlib.compressobj(wbits=31)
+        pending = b''
+        packed = 0
+        out.write(prefix)
+        with open(geojson_path,'rb') as src:
+            for block in iter(lambda: src.read(self.GEOJSON_CHUNK),b''):
+                pending += compressor.compress(block)
+                # base64 is written in whole 3 byte groups until the end
+                cut = len(pending)//3*3
+                text = base64.b64encode(pending[:cut]).decode('ascii')
+                out.write(text)
+                packed += len(text)
+                pending = pending[cut:]
+        pending += compressor.flush()
+        text = base64.b64encode(pending).decode('ascii')
+        out.write(text)
+        out.write(suffix)
+        return packed+len(text)
+
+    @classmethod
+    def template_environment(cls,template_dir):
+        ''' returns the session jinja2 environment for template_dir, templates are compiled
+            once per session (recompiled if the file changes) and the compiled bytecode is kept in
+            <profile>/dissect/templates so a new session skips the compile as well
+        '''
+        with cls._environments_lock:
+            env = cls._environments.get(template_dir)
+            if env is None:
+                jinja2 = deferred_import('jinja2')
+                cache_dir = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect','templates')
+                os.makedirs(cache_dir,exist_ok=True)
+                env = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=template_dir),
+                    bytecode_cache=jinja2.FileSystemBytecodeCache(cache_dir),
+                    auto_reload=True)
+                cls._environments[template_dir] = env
+                logger.debug(f'Template environment created ({template_dir})')
+        return env
+
+    def pack_geodata(self,interests,outfile):
+        ''' returns {interest name: packed geometry} for the packed and sidecar geometry modes
+            packed: path of a file of base64 of the gzipped GeoJSON, streamed into the page
+            sidecar: relative path of a script (in <report>_geodata) that hands the packed
+                GeoJSON to the page, loaded when the interest is drawn (works from file://)
+        '''
+        geodata = {}
+        if self.geometry_mode == 'inline':
+            return geodata
+        raw_bytes = 0
+        packed_bytes = 0
+        if self.geometry_mode == 'sidecar':
+            sidecar_name = os.path.splitext(os.path.basename(outfile))[0] + self.SIDECAR_SUFFIX
+            sidecar_dir = os.path.join(os.path.dirname(outfile),sidecar_name)
+            if os.path.isdir(sidecar_dir):
+                shutil.rmtree(sidecar_dir)
+            os.makedirs(sidecar_dir)
+        for n, i in enumerate(interests):
+            if i.get('geojson') is None:
+                continue
+            name = i['name'].replace(' ','_')
+            raw_bytes += os.path.getsize(i['geojson'])
+            if self.geometry_mode == 'packed':
+                packed_path = self.display_path('.b64')
+                with open(packed_path,'w',encoding='ascii') as f:
+                    packed_bytes += self.pack_file(i['geojson'],f)
+                geodata[name] = packed_path
+            else:
+                file_name = f'{n}.js'
+                with open(os.path.join(sidecar_dir,file_name),'w',encoding='utf-8') as f:
+                    packed_bytes += self.pack_file(i['geojson'],f,prefix=f'dissectGeodata({json.dumps(name)},"',suffix='");')
+                geodata[name] = f'{sidecar_name}/{file_name}'
+        logger.debug(f'Report geometry {self.geometry_mode}: {raw_bytes/1000:.0f} KB GeoJSON packed to {packed_bytes/1000:.0f} KB')
+        return geodata
+
+    def display_tolerance(self,layer):
+        ''' returns the report map simplification tolerance in layer units (half a web map pixel
+            at self.display_zoom), 0 when display simplification is disabled '''
+        if self.display_zoom <= 0:
+            return 0
+        resolution = self.ZOOM_0_RESOLUTION*math.cos(math.radians(self.latitude))/(2**self.display_zoom)
+        to_layer_units = QgsUnitTypes.fromUnitToUnitFactor(QgsUnitTypes.DistanceMeters,layer.crs().mapUnits())
+        return resolution/2*to_layer_units
+
+    def display_summary(self):
+        ''' returns a message describing the report map geometry reduction '''
+        stats = self.display_stats
+        if stats['vertices'] == 0:
+            return 'Report map geometry: no vertices exported'
+        reduction = 100*(1-stats['display_vertices']/stats['vertices'])
+        return (f"Report map geometry: {stats['display_vertices']} of {stats['vertices']} vertices "
+            f"({reduction:.0f}% fewer) at {self.precision} decimal places, "
+            f"{stats['bytes']/1000:.0f} KB embedded")
+
+    def temp_geojson_path(self,name):
+        ''' returns a temp file path for a layer name (in a folder unique to this report) '''
+        file_name = name.replace(' ','_').replace('.','_') + ".geojson"
+        file_name = file_name.replace('/','_')
+        file_name = file_name.replace('\\','_')
+        geojson_dir = os.path.join(os.environ['TEMP'],self.uuid)
+        os.makedirs(geojson_dir,exist_ok=True)
+        return os.path.join(geojson_dir,file_name)
+
+    def add_raster_interest(self,name,group,subgroup,field_names,summary):
+        ''' add a raster interest summarized by class (see DissectAlg.raster_zonal_summary)
+            summary: {class label: {'count':pixels,'value':hectares,'unit':'ha'}}
+        '''
+        interest = {'name':name,
+            'group':group,
+            'subgroup':subgroup,
+            'secure':False,
+            'geometry_type':'Raster',
+            'geojson':None,
+            'geojson_path':None}
+        pixels = sum(s['count'] for s in summary.values())
+        if pixels > 0:
+            interest['count'] = pixels
+            interest['value'] = sum(s['value'] for s in summary.values())
+            interest['unit'] = 'ha'
+            interest['field_summary'] = dict(sorted(summary.items(),reverse=True))
+            interest['field_names_summary'] = field_names
+        else:
+            interest['count'] = 0
+            interest['field_summary'] = []
+        self.interests.append(interest)
+        logger.debug('Raster interest appended to interests')
+        return interest
+
+    def add_cached_interest(self,interest):
+        ''' add an interest restored from result_cache (geojson already serialized, copied to this
+            report's display folder so cache eviction can not remove it before the report is written)
+        '''
+        interest = dict(interest)
+        if interest.get('geojson') is not None:
+            display_path = self.display_path()
+            shutil.copyfile(interest['geojson'],display_path)
+            interest['geojson'] = display_path
+        interest['geojson_path'] = None
+        self.interests.append(interest)
+        logger.debug('Cached interest appended to interests')
+        return interest
+
+    def add_failed(self, layer_title, group, comment=None):
+        ''' add a failed interest to the report'''
+        logger.debug(f"REPORT add failed layer: {layer_title}")
+        failedLyr = {'name':layer_title,
+            'group':group,
+            'comment':comment}   
+
+        self.failedLyrs.append(failedLyr)
+        logger.debug('Interest appended to failed layers')
+
+    def report(self,outfile):
+        """ Build html report based on self.interests --> html file
+        """
+        #build summary
+        reportDate = datetime.datetime.utcnow().strftime('%B %d %Y - %H:%M:%S') + ' UTC'
+        env = self.template_environment(os.path.join(self.template_path,self.TEMPLATE_RELATIVE_PATH))
+        template = env.get_template('home.html', parent='layout.html')
+        intersecting_layers = []
+        non_intersecting_layers=[]
+        for i in self.interests:
+            if ('value' in i.keys()):
+                intersecting_layers.append(i)
+            else:
+                non_intersecting_layers.append(i)
+        layers = [i for i in self.interests]
+        layer_sort = sorted(intersecting_layers, key=lambda k: k['value'],reverse=True) 
+        layers = layer_sort + non_intersecting_layers
+        geodata = self.pack_geodata(layers,outfile)
+        #ahtml = template.render(species=aoi.species, shape=aoi.poly,aoi=aoi)
+        outpath = os.path.dirname(outfile)
+        # Check whether the specified path exists or not
+        pathExist = os.path.exists(outpath)
+        logger.debug(f'Output path {outpath} exists: {pathExist}')
+        if not pathExist:      
+            # Create a new directory because it does not exist 
+            os.makedirs(outpath)
+            logger.debug('Outpath created')
+        # stream the rendered chunks to the file rather than building the whole html in memory
+        # geometry files are streamed into the page a chunk at a time (see file_chunks)
+        stream = template.stream(aoi = self.aoi,interests=layers, reportDate=reportDate, failedLyrs = self.failedLyrs,
+            geometry_mode=self.geometry_mode, geodata=geodata, diagnostics=self.diagnostics,
+            geojson_chunks=self.file_chunks)
+        stream.enable_buffering(self.RENDER_BUFFER)
+        with open(outfile, 'w', encoding='utf-8') as f:
+            stream.dump(f)
+        stream = None
+        shutil.rmtree(os.path.join(os.environ['TEMP'],self.uuid,self.DISPLAY_FOLDER),ignore_errors=True)
+        logger.debug(f'Report written to file ({(os.path.getsize(outfile)/1000):.0f} KB)')
+        logger.debug(self.display_summary())
         #the last hurah!
         # arcpy.SetParameterAsText(1, outfile)
-        env = None
         template = None
         return outfile
 
@@ -1049,105 +2966,350 @@ class oracle_pyqgis:
             host: str,
             user: str,
             port: int,
-            password: str)
+            password: str,
+            cache: metadata_cache (optional),
+            metadata: dict of table_metadata results, eg from probe_tables (optional))
     '''
     # import ptvsd
     # ptvsd.debug_this_thread()
 
-    def __init__(self,database,host,port,user,password,feedback):
+    # type lookup dictionary {oracle_type_number:QgsWkbTypes}
+    GTYPE_LOOKUP = {1:QgsWkbTypes.Point,
+                    2:QgsWkbTypes.LineString,
+                    3:QgsWkbTypes.Polygon,
+                    5:QgsWkbTypes.MultiPoint,
+                    6:QgsWkbTypes.MultiLineString,
+                    7:QgsWkbTypes.MultiPolygon}
+
+    # number of tables resolved per catalog probe statement
+    PROBE_CHUNK = 50
+    # characters of overlay WKT per string bind (see geometry_binds)
+    BIND_CHUNK = 4000
+    # rows handed over per batch by iter_rows
+    FETCH_BATCH = 500
+    # batches read ahead of the consumer by iter_rows
+    FETCH_QUEUE = 4
+    # tolerance (m) for SDO_GEOM operations
+    SDO_TOLERANCE = 0.005
+    # columns added by create_layer_intersection
+    CLIP_GEOMETRY = 'DISSECT_GEOM'
+    CLIP_FLAG = 'DISSECT_CLIPPED'
+
+    def __init__(self,database,host,port,user,password,feedback,cache=None,metadata=None):
         
         self.fb = feedback
+        self.cache = cache
+        # table_metadata results shared between connections of the same run
+        self.metadata = metadata if metadata is not None else {}
+        # filter_geometry results by (overlay layer id, tolerance)
+        self.filter_windows = {}
         self.user_name = user
         self.user_pass = password
         self.host = host
         self.database = database
         self.port = port
-        self.db = None
+        self.session = None
+        self.pool = connection_pool.instance()
         self.open_db_connection()
     def __del__(self):
-        # close db before destruction
+        # return the session to the pool before destruction
         self.close_db_connection()
-        self.db = None
-        qdb = None
 
     def open_db_connection(self):
-        ''' open_db_connection creates and opens a db connection to the oracle database
+        ''' open_db_connection checks out a health checked db_session for the oracle database
+            from the process wide connection_pool (a new logon only if no idle session exists)
         '''
         logger.debug('Attempting db connection')
-        driver ="QOCISPATIAL"
-        conn_name = "bcgw_conn"
-        qdb = QSqlDatabase()
-        self.db = qdb.addDatabase(driver,conn_name)
-        self.db.setDatabaseName(self.host + "/" + self.database)
-        self.db.setUserName(self.user_name) 
-        self.db.setPassword(self.user_pass) 
-        db_open = self.db.open()
-        logger.debug(f'db connection status: {db_open}')
-        return db_open
+        self.session = self.pool.acquire(self.host,self.database,self.user_name,self.user_pass)
+        logger.debug(f'db connection checked out: {self.session.name}')
+        return True
     
     def close_db_connection(self):
-        ''' close_db_connection closes db connection to the oracle database
+        ''' close_db_connection returns the db session to the connection_pool
         '''
-        if self.db.isOpen():
-            self.db.close()
-            logger.debug(f'db connection closed')
+        if self.session is None:
+            return
+        session = self.session
+        self.session = None
+        self.pool.release(session)
+        logger.debug(f'db connection returned to pool')
     
     def check_connection(self):
-        if not self.db.isOpen():
-            try:
-                if self.db.open() is False:
-                    self.open_db_connection()
-                assert self.db.isOpen()
-            except:
-                logging.error(f"Failed to connect to database: {self.database}/{self.host} - Check user/pass")
-                raise Exception(f"Failed to connect to database: {self.database}/{self.host} - check username/password")
+        if self.session is None:
+            self.open_db_connection()
+
+    def execute(self,fn,feedback=None):
+        ''' returns fn(session) run on the session thread (see db_session.call)
+            a cancelled call is abandoned: its session goes back to the pool (taken again once the
+            call ends) and the next call checks out another one
+        '''
+        self.check_connection()
+        try:
+            return self.session.call(fn,feedback)
+        except layer_cancelled:
+            self.close_db_connection()
+            raise
+
+    def connection_uri(self):
+        ''' returns a QgsDataSourceUri with this connection's settings - identical connection
+            info lets the QGIS oracle provider reuse its pooled sessions across layers and runs
+        '''
+        uri = QgsDataSourceUri()
+        uri.setConnection(self.host, str(self.port), self.database, self.user_name, self.user_pass)
+        return uri
 
                 
                 
-    def create_layer_anyinteract(self,overlay_layer,layer_name,db_table,sql):
-        ''' creates a qgsvectorlayer using an anyinteract query
+    def create_layer_anyinteract(self,overlay_layer,layer_name,db_table,sql,simplify_tolerance=0,feedback=None):
+        ''' returns a memory layer of the rows of db_table interacting with the overlay polygon(s)
+            (sdo_ANYINTERACT against the bound overlay geometry, see geometry_binds)
+            overlay_layer: qgsvectorlayer, QgsFeature
+            layer_name: str,
+            db_table: str,
+            simplify_tolerance: float (m) - see filter_geometry
+            feedback: QgsFeedback (optional), the fetch stops between rows once it is cancelled
+            usage = oracle_pyqgis.create_layer_anyinteract(overlay_layer=myQgsVectorLayer, layer_name="My Layer", db_table="myschema.mytable", sql=None)
+        '''
+        window, binds = self.geometry_binds(self.filter_geometry(overlay_layer,simplify_tolerance))
+        if sql is not None and len(sql.strip())>0:
+            sql = sql + " AND "
+        else:
+            sql = ''
+        metadata = self.table_metadata(db_table)
+        geom_c = metadata['geom_column']
+        geom_type = self.get_bcgw_table_geomtype(db_table=db_table,geom_column_name=geom_c)
+        query = f"select t.* from {db_table} t where {sql} sdo_ANYINTERACT (t.{geom_c}, {window}) = 'TRUE'"
+        return self.fetch_layer(query,binds,geom_c,layer_name,geom_type,feedback)
+
+    def create_layer_intersection(self,overlay_layer,layer_name,db_table,sql,feedback=None):
+        ''' returns a memory layer of features already clipped to the overlay by the database
+            (SDO_GEOM.SDO_INTERSECTION against the bound overlay geometry, not its bounding box)
+            rows where the intersection is a heterogeneous collection keep their original
+            geometry and have CLIP_FLAG = 0 so they can be clipped locally
             overlay_layer: qgsvectorlayer, QgsFeature
             layer_name: str,
             db_table: str
-            usage = oracle_pyqgis.create_oracle_layer(self,overlay_layer=myQgsVectorLayer layer_name="My Layer", db_table="myschema.mytable")
+            feedback: QgsFeedback (optional), the fetch stops between rows once it is cancelled
+        '''
+        aoi_sdo, binds = self.geometry_binds(self.overlay_geometry(overlay_layer))
+        if sql is not None and len(sql.strip())>0:
+            sql = sql + " AND "
+        else:
+            sql = ''
+        metadata = self.table_metadata(db_table)
+        geom_c = metadata['geom_column']
+        geom_type = self.get_bcgw_table_geomtype(db_table=db_table,geom_column_name=geom_c)
+        # the original geometry is only returned for collection results
+        columns = ''.join(f'i."{c}", ' for c in self.table_columns(db_table) if c != geom_c)
+        clip = f"SDO_GEOM.SDO_INTERSECTION(t.{geom_c}, {aoi_sdo}, {self.SDO_TOLERANCE})"
+        query = f"select {columns} \
+            CASE WHEN MOD(i.DISSECT_CLIP.SDO_GTYPE,100) = 4 THEN i.{geom_c} ELSE i.DISSECT_CLIP END {self.CLIP_GEOMETRY}, \
+            CASE WHEN MOD(i.DISSECT_CLIP.SDO_GTYPE,100) = 4 THEN 0 ELSE 1 END {self.CLIP_FLAG} \
+            from (select t.*, {clip} DISSECT_CLIP from {db_table} t where {sql} sdo_ANYINTERACT (t.{geom_c}, {aoi_sdo}) = 'TRUE') i \
+            where i.DISSECT_CLIP IS NOT NULL"
+        # a clipped polygon or line may come back in several parts
+        return self.fetch_layer(query,binds,self.CLIP_GEOMETRY,layer_name,QgsWkbTypes.multiType(geom_type),feedback)
 
+    def fetch_layer(self,query,binds,geom_c,layer_name,geom_type,feedback=None):
+        ''' returns a memory layer (EPSG:3005) of the rows of a query (see iter_rows),
+            geometries are converted to geom_type's multi type if it is one, rows whose geometry
+            has another dimension (eg an intersection that only touches the overlay) are left out
+        '''
+        rows = self.iter_rows(query,binds,geom_c,feedback)
+        fields = next(rows)
+        layer = QgsMemoryProviderUtils.createMemoryLayer(layer_name,fields,geom_type,QgsCoordinateReferenceSystem('EPSG:3005'))
+        multi = QgsWkbTypes.isMultiType(geom_type)
+        category = QgsWkbTypes.geometryType(geom_type)
+        provider = layer.dataProvider()
+        for batch in rows:
+            features = [self.row_feature(fields,attributes,wkb,multi) for attributes, wkb in batch]
+            provider.addFeatures([f for f in features if not f.hasGeometry() or f.geometry().type() == category])
+        return layer
+
+    def row_feature(self,fields,attributes,wkb,multi=False):
+        ''' returns a QgsFeature of a fetched (attributes, wkb) row '''
+        feature = QgsFeature(fields)
+        feature.setAttributes(attributes)
+        if wkb is not None:
+            geom = QgsGeometry()
+            geom.fromWkb(wkb)
+            if multi:
+                geom.convertToMultiType()
+            feature.setGeometry(geom)
+        return feature
+
+    def iter_rows(self,query,binds,geom_c,feedback=None):
+        ''' runs a query with named binds ({placeholder: value}), yields the QgsFields of its
+            attribute columns first, then lists of up to FETCH_BATCH (attributes, wkb) rows
+            (geom_c comes back from QOCISPATIAL as WKB, None for null geometries)
+            rows are read on the session thread and handed over through a queue of FETCH_QUEUE
+            batches. Cancelled feedback (raising layer_cancelled) or closing the generator abandons
+            the read, which stops at its next row (see db_session)
+        '''
+        self.check_connection()
+        batches = queue.Queue(maxsize=self.FETCH_QUEUE)
+        stop = threading.Event()
+
+        def hand_over(item):
+            # False once the reader has gone
+            while not stop.is_set():
+                try:
+                    batches.put(item,timeout=db_session.POLL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read(session):
+            q = QSqlQuery(session.db)
+            q.setForwardOnly(True)
+            if not q.prepare(query):
+                raise Exception(f'Could not prepare query: {q.lastError().text()}')
+            for placeholder, value in binds.items():
+                q.bindValue(placeholder,value)
+            if not q.exec():
+                raise Exception(f'Query failed: {q.lastError().text()}')
+            try:
+                record = q.record()
+                geom_idx = record.indexOf(geom_c)
+                columns = [i for i in range(record.count()) if i != geom_idx]
+                fields = QgsFields()
+                for i in columns:
+                    fields.append(QgsField(record.fieldName(i),record.field(i).type()))
+                if not hand_over(fields):
+                    return
+                batch = []
+                while not stop.is_set() and q.next():
+                    attributes = [None if q.isNull(i) else q.value(i) for i in columns]
+                    wkb = None if geom_idx == -1 or q.isNull(geom_idx) else bytes(q.value(geom_idx))
+                    batch.append((attributes,wkb))
+                    if len(batch) >= self.FETCH_BATCH:
+                        if not hand_over(batch):
+                            return
+                        batch = []
+                if stop.is_set():
+                    return
+                if q.lastError().isValid():
+                    raise Exception(f'Fetch failed: {q.lastError().text()}')
+                if len(batch) > 0:
+                    hand_over(batch)
+            finally:
+                q.finish()
+
+        done = self.session.submit(read)
+        finished = False
+        try:
+            while True:
+                if feedback is not None and feedback.isCanceled():
+                    raise layer_cancelled(query)
+                try:
+                    item = batches.get(timeout=db_session.POLL)
+                except queue.Empty:
+                    if done.done() and batches.empty():
+                        # raises the read error
+                        done.result()
+                        finished = True
+                        return
+                    continue
+                yield item
+        finally:
+            if not finished:
+                stop.set()
+                # the session rejoins the pool once the read has stopped
+                self.close_db_connection()
+
+    def table_columns(self,db_table):
+        ''' returns the column names of db_table in table order '''
+        metadata = self.table_metadata(db_table)
+        if 'columns' not in metadata:
+            def read(session):
+                q = QSqlQuery(session.db)
+                q.setForwardOnly(True)
+                if not q.exec(f"SELECT * FROM {db_table} WHERE 1 = 0"):
+                    raise Exception(f'Could not read the columns of {db_table}: {q.lastError().text()}')
+                record = q.record()
+                columns = [record.fieldName(i) for i in range(record.count())]
+                q.finish()
+                return columns
+            # kept with the run's metadata (not in the metadata cache)
+            metadata['columns'] = self.execute(read,self.fb)
+        return metadata['columns']
+
+    def filter_geometry(self,overlay_layer,simplify_tolerance=0):
+        ''' returns the geometry (EPSG:3005) to spatially filter by the overlay, all parts in one
+            multipolygon window rather than the bounding box. With a simplify_tolerance (m) the
+            window is buffered by twice the tolerance and simplified so it still contains the overlay
+            (fewer vertices for the database to test against)
+            overlay_layer: qgsvectorlayer, QgsFeature
+        '''
+        memo_key = (overlay_layer.id(),simplify_tolerance) if isinstance(overlay_layer,QgsVectorLayer) else None
+        if memo_key in self.filter_windows:
+            return self.filter_windows[memo_key]
+        geom = self.overlay_geometry(overlay_layer)
+        if simplify_tolerance > 0:
+            geom = geom.buffer(2*simplify_tolerance,2).simplify(simplify_tolerance)
+            logger.debug(f'Filter window built with {simplify_tolerance} m simplification')
+        if memo_key is not None:
+            self.filter_windows[memo_key] = geom
+        return geom
+
+    def overlay_geometry(self,overlay_layer):
+        ''' returns the (dissolved) geometry of overlay_layer in EPSG:3005
+            overlay_layer: qgsvectorlayer, QgsFeature (assumed EPSG:3005)
         '''
-        start_time = time.time()
-        
         if isinstance(overlay_layer,QgsVectorLayer):
-            rectangle = overlay_layer.extent()
+            geom = QgsGeometry.unaryUnion([f.geometry() for f in overlay_layer.getFeatures()])
+            if overlay_layer.crs().authid() != 'EPSG:3005':
+                geom.transform(QgsCoordinateTransform(overlay_layer.crs(),QgsCoordinateReferenceSystem('EPSG:3005'),QgsProject.instance().transformContext()))
         elif isinstance(overlay_layer,QgsFeature):
-            rectangle = overlay_layer.geometry().boundingBox()
+            geom = QgsGeometry(overlay_layer.geometry())
         else:
-            # print ("unexpected overlay_layer type")
             raise TypeError('unexpected overlay_layer type')
-        rect = [rectangle.xMinimum(), rectangle.yMinimum(), rectangle.xMaximum(), rectangle.yMaximum()]
-        exnt_str = "{},{},{},{}".format(rect[0], rect[1], rect[2], rect[3])
-        if sql is not None:
-            if len(sql.strip())>0:
-                sql = sql + " AND "
+        return geom
+
+    def geometry_binds(self,geom):
+        ''' returns (sql, binds) - an SDO_GEOMETRY (srid 3005) expression for a polygonal QgsGeometry
+            and its {placeholder: value} binds
+            the geometry is bound as WKT rather than written into the statement, so its size is not
+            limited by the sql constructor argument limit (ORA-00939). A string bind is limited to
+            4000 bytes in sql, so the WKT is bound in BIND_CHUNK character pieces joined as a CLOB
+        '''
+        wkt = self.polygon_wkt(geom)
+        if wkt is None:
+            raise ValueError('Overlay has no polygon to filter by')
+        pieces = [wkt[n:n+self.BIND_CHUNK] for n in range(0,len(wkt),self.BIND_CHUNK)]
+        binds = {f':dissect_g{n}':piece for n, piece in enumerate(pieces)}
+        clob = '||'.join(f'TO_CLOB({placeholder})' for placeholder in binds)
+        return f"SDO_GEOMETRY({clob}, 3005)", binds
+
+    def polygon_wkt(self,geom):
+        ''' returns the WKT of a polygonal QgsGeometry with ordinates rounded to the millimetre,
+            None if it is empty - exterior rings are written counterclockwise and interior rings
+            clockwise (the orientation SDO_GEOMETRY expects)
+        '''
+        if geom is None or geom.isEmpty():
+            return None
+        if geom.isMultipart():
+            polygons = geom.asMultiPolygon()
         else:
-            sql = ''
-        # print("start--- %s seconds ---" % (time.time() - start_time))
-        geom_c = self.get_bcgw_geomcolumn(db_table=db_table)
-        # print("query geom column--- %s seconds ---" % (time.time() - start_time))
-        geom_type = self.get_bcgw_table_geomtype(db_table=db_table,geom_column_name=geom_c)
-        # print("query geom type--- %s seconds ---" % (time.time() - start_time))
-        key = self.get_bcgw_column_key(db_table=db_table)
-        # print("query column key--- %s seconds ---" % (time.time() - start_time))
-        query = f"(select * from {db_table} where {sql} sdo_ANYINTERACT ({geom_c}, SDO_GEOMETRY(2003, 3005, NULL,SDO_ELEM_INFO_ARRAY(1,1003,3),SDO_ORDINATE_ARRAY({exnt_str}))) = 'TRUE')"
-        #con_str=f"dbname=\'{self.database}\' host={self.host} port={self.port} estimatedmetadata=true srid=3005 type={geom_type} table={query}"
-        uri = QgsDataSourceUri()
-        uri.setConnection(self.host, self.port, self.database, self.user_name, self.user_pass)
-        uri.setDriver('oracle')
-        uri.setSrid('3005')
-        uri.setUseEstimatedMetadata(True)
-        uri.setWkbType(geom_type)
-        uri.setDataSource( "", query, geom_c, "", key)
-        lyr = QgsVectorLayer(uri.uri(),layer_name,'oracle')
-        if not lyr.isValid():
-            print ('yikes')
-        return lyr
+            polygons = [geom.asPolygon()]
+        polygon_wkts = []
+        for polygon in polygons:
+            ring_wkts = []
+            for r, ring in enumerate(polygon):
+                # shoelace - positive is counterclockwise
+                signed_area = sum(ring[n].x()*ring[n+1].y()-ring[n+1].x()*ring[n].y() for n in range(len(ring)-1))
+                if (r == 0) != (signed_area > 0):
+                    ring = ring[::-1]
+                ring_wkts.append('(' + ','.join(f'{round(point.x(),3)} {round(point.y(),3)}' for point in ring) + ')')
+            if len(ring_wkts) > 0:
+                polygon_wkts.append('(' + ','.join(ring_wkts) + ')')
+        if len(polygon_wkts) == 0:
+            return None
+        if len(polygon_wkts) == 1:
+            return 'POLYGON ' + polygon_wkts[0]
+        return 'MULTIPOLYGON (' + ','.join(polygon_wkts) + ')'
+
     def create_oracle_layer(self,layer_name,db_table,sql=None):
         ''' create_oracle_layer creates and returns qgsVectorLayer
             layer_name: str,
@@ -1155,14 +3317,13 @@ class oracle_pyqgis:
             usage = oracle_pyqgis.create_oracle_layer(self, layer_name="My Layer", db_table="myschema.mytable")
         '''
         # create an QgsVector from oracle table
-        uri = QgsDataSourceUri()
-        uri.setConnection(self.host, str(self.port),self.database, self.user_name, self.user_pass)
+        uri = self.connection_uri()
         schema, table = db_table.split('.')
-        geom_c = self.get_bcgw_geomcolumn(db_table=db_table)
+        metadata = self.table_metadata(db_table)
+        geom_c = metadata['geom_column']
         geom_type = self.get_bcgw_table_geomtype(db_table=db_table,geom_column_name=geom_c)
-        key = self.get_bcgw_column_key(db_table=db_table)
+        key = metadata['key_column']
         if sql is not None and sql != '':
-            # print (f"SQL: {sql}")
             uri.setDataSource(schema,table,aGeometryColumn=geom_c,aSql=sql,aKeyColumn=key)
         else:
             uri.setDataSource(schema, table, aGeometryColumn=geom_c,aKeyColumn=key)
@@ -1175,95 +3336,970 @@ class oracle_pyqgis:
         tlayer.setCrs(QgsCoordinateReferenceSystem("EPSG:3005"))
         
         return tlayer
+    def table_metadata(self,db_table):
+        ''' returns metadata for db_table, from memory, the metadata cache or the database
+            {'has_table': bool,
+            'geom_column': str,
+            'gtype': int (max SDO_GTYPE of the first rows, None if no spatial rows),
+            'key_column': str}
+        '''
+        if db_table in self.metadata:
+            return self.metadata[db_table]
+        metadata = None
+        if self.cache is not None:
+            metadata = self.cache.get(self.database,db_table,self.user_name)
+            if metadata is not None:
+                logger.debug(f'{db_table} metadata read from cache')
+        if metadata is None:
+            metadata = self.query_table_metadata(db_table)
+            if self.cache is not None:
+                self.cache.put(self.database,db_table,self.user_name,metadata)
+        self.metadata[db_table] = metadata
+        return metadata
+
+    def probe_tables(self,db_tables):
+        ''' resolves table_metadata for all db_tables with a few set-based catalog queries
+            instead of per table lookups - returns {db_table: metadata}
+            usage:
+            probe_tables(['WHSE_BASEMAPPING.BCGS_20K_GRID','WHSE_FOREST_TENURE.FTEN_CUT_BLOCK_POLY_SVW'])
+        '''
+        to_query = []
+        for db_table in dict.fromkeys(db_tables):
+            if db_table in self.metadata:
+                continue
+            metadata = None
+            if self.cache is not None:
+                metadata = self.cache.get(self.database,db_table,self.user_name)
+            if metadata is not None:
+                self.metadata[db_table] = metadata
+            elif db_table.count('.') == 1:
+                to_query.append(db_table)
+        logger.debug(f'Probing {len(to_query)} tables ({len(db_tables)-len(to_query)} already known)')
+        for n in range(0,len(to_query),self.PROBE_CHUNK):
+            chunk = to_query[n:n+self.PROBE_CHUNK]
+            probed = {t:{'has_table':False,'geom_column':None,'gtype':None,'key_column':None} for t in chunk}
+            for owner, table in self.probe_rows('access',chunk):
+                probed[f'{owner}.{table}']['has_table'] = True
+            for owner, table, column in self.probe_rows('geom_column',chunk):
+                md = probed[f'{owner}.{table}']
+                if md['geom_column'] is None:
+                    md['geom_column'] = column
+            for owner, table, column in self.probe_rows('key_column',chunk):
+                md = probed[f'{owner}.{table}']
+                if md['key_column'] is None or column == 'OBJECTID':
+                    md['key_column'] = column
+            spatial = [t for t in chunk if probed[t]['has_table'] and probed[t]['geom_column'] is not None]
+            for db_table, gtype in self.probe_gtypes(spatial,probed).items():
+                probed[db_table]['gtype'] = gtype
+            for db_table, metadata in probed.items():
+                self.metadata[db_table] = metadata
+                if self.cache is not None:
+                    self.cache.put(self.database,db_table,self.user_name,metadata)
+        return {t:self.metadata[t] for t in db_tables if t in self.metadata}
+
+    def probe_rows(self,kind,db_tables):
+        ''' runs a prepared catalog probe for a chunk of tables and returns the result rows
+            kind: 'access' -> (owner, table)
+                  'geom_column' -> (owner, table, column)
+                  'key_column' -> (owner, table, column) for OBJECTID or the first column
+            the chunk is padded to PROBE_CHUNK so one prepared statement per kind is reused
+            (prepared once per pooled session)
+        '''
+        if kind not in ['access','geom_column','key_column']:
+            raise ValueError(f'Unknown probe ({kind})')
+        padded = db_tables + [db_tables[-1]]*(self.PROBE_CHUNK-len(db_tables))
+        return self.execute(lambda session: self.run_probe(session,kind,padded),self.fb)
+
+    def run_probe(self,session,kind,padded):
+        ''' probe_rows on the session thread '''
+        name = f'probe {kind}'
+        if name not in session.prepared:
+            pairs = ','.join([f'(:o{i},:t{i})' for i in range(self.PROBE_CHUNK)])
+            if kind == 'access':
+                sql = f"SELECT OWNER, VIEW_NAME FROM all_views WHERE (OWNER, VIEW_NAME) IN ({pairs}) \
+                    UNION SELECT OWNER, TABLE_NAME FROM all_tables WHERE (OWNER, TABLE_NAME) IN ({pairs})"
+            elif kind == 'geom_column':
+                sql = f"SELECT OWNER, TABLE_NAME, COLUMN_NAME FROM all_tab_columns \
+                    WHERE DATA_TYPE = 'SDO_GEOMETRY' AND (OWNER, TABLE_NAME) IN ({pairs}) ORDER BY COLUMN_ID"
+            else:
+                sql = f"SELECT OWNER, TABLE_NAME, COLUMN_NAME FROM all_tab_cols \
+                    WHERE (COLUMN_NAME = 'OBJECTID' OR COLUMN_ID = 1) AND (OWNER, TABLE_NAME) IN ({pairs})"
+            q = QSqlQuery(session.db)
+            q.setForwardOnly(True)
+            assert q.prepare(sql), f'Could not prepare {kind} probe: {q.lastError().text()}'
+            session.prepared[name] = q
+        q = session.prepared[name]
+        for i, db_table in enumerate(padded):
+            owner, table = db_table.split('.')
+            q.bindValue(f':o{i}',owner)
+            q.bindValue(f':t{i}',table)
+        if not q.exec():
+            raise Exception(f'Catalog probe ({kind}) failed: {q.lastError().text()}')
+        columns = q.record().count()
+        rows = []
+        while q.next():
+            rows.append(tuple(q.value(c) for c in range(columns)))
+        q.finish()
+        return rows
+
+    def probe_gtypes(self,db_tables,probed):
+        ''' returns {db_table: gtype} for all db_tables in one UNION ALL statement
+            table names come from the catalog probe and can not be bound, falls back to
+            one query_gtype per table if the statement is rejected
+        '''
+        gtypes = {}
+        if len(db_tables) == 0:
+            return gtypes
+        selects = []
+        for i, db_table in enumerate(db_tables):
+            geom_c = probed[db_table]['geom_column']
+            selects.append(f"SELECT {i} IDX, (SELECT MAX(t.{geom_c}.GET_GTYPE()) FROM {db_table} t WHERE rownum <10) GTYPE FROM dual")
+        def read(session):
+            q = QSqlQuery(session.db)
+            q.setForwardOnly(True)
+            if not q.exec(' UNION ALL '.join(selects)):
+                return None, q.lastError().text()
+            rows = []
+            while q.next():
+                rows.append((q.value(0),q.value(1)))
+            q.finish()
+            return rows, None
+        rows, error = self.execute(read,self.fb)
+        if rows is not None:
+            for idx, type_num in rows:
+                gtypes[db_tables[int(idx)]] = None if type_num in (None,'') else int(type_num)
+            return gtypes
+        logger.debug(f'gtype probe rejected ({error}), querying tables one at a time')
+        for db_table in db_tables:
+            gtypes[db_table] = self.query_gtype(db_table,probed[db_table]['geom_column'])
+        return gtypes
+
+    def query_table_metadata(self,db_table):
+        ''' queries the database catalog for table_metadata '''
+        metadata = {'has_table':False,'geom_column':None,'gtype':None,'key_column':None}
+        metadata['has_table'] = self.query_has_table(db_table)
+        if metadata['has_table']:
+            metadata['geom_column'] = self.get_bcgw_geomcolumn(db_table=db_table)
+            if metadata['geom_column'] is not None:
+                metadata['gtype'] = self.query_gtype(db_table,metadata['geom_column'])
+            metadata['key_column'] = self.get_bcgw_column_key(db_table=db_table)
+        return metadata
+
     def has_table(self,db_table):
         ''' has_table returns true if db_table exists for current user privilege
         '''
+        return self.table_metadata(db_table)['has_table']
+
+    def query_has_table(self,db_table):
+        ''' queries all_views/all_tables for db_table '''
         owner, table = db_table.split('.')
-        
-        self.check_connection()
-        q = QSqlQuery(self.db) 
         query = f"select VIEW_NAME NAME from all_views where owner = '{owner}' and VIEW_NAME = '{table}' union select TABLE_NAME NAME from all_tables where owner = '{owner}' and TABLE_NAME = '{table}'"
-        q.exec(query)
-        if q.first():
-            return True
-        else:
-            return False
+        return self.execute(lambda session: self.first_value(session,query) is not None,self.fb)
     def has_spatial_rows(self,db_table):
         ''' has_spatial_rows returns True if oracle table has rows with geometry
             usage:
             has_spatial_rows(WHSE_BASEMAPPING.BCGS_20K_GRID)
         '''
+        return self.table_metadata(db_table)['gtype'] is not None
+
+    def query_gtype(self,db_table,geom_column_name):
+        ''' returns the maximum SDO_GTYPE of the first rows of db_table (None if there are
+            no rows with geometry)
+        '''
         owner,table = db_table.split('.') 
-        geom_column_name = self.get_bcgw_geomcolumn(db_table=db_table)
-        self.check_connection()
-        q = QSqlQuery(self.db)
-        # confrm there are rows
-        query = f"SELECT rownum from {owner}.{table} t where rownum=1"
-        q.exec(query)
-        q.first()
-        if q.value(0) is not None:
-            query = f"SELECT MAX(t.{geom_column_name}.GET_GTYPE()) AS geometry_type from {owner}.{table} t where rownum <10"
-            q.exec(query) 
-            q.first()
-        type_num = q.value(0)
-        if type_num is not None:
-            return True
-        else:
-            return False
+        query = f"SELECT MAX(t.{geom_column_name}.GET_GTYPE()) AS geometry_type from {owner}.{table} t where rownum <10"
+        type_num = self.execute(lambda session: self.first_value(session,query),self.fb)
+        if type_num is None or type_num == '':
+            return None
+        return int(type_num)
 
     def get_bcgw_table_geomtype(self,db_table,geom_column_name):
         # get geometry type from oracle table - oracle stores multiple types so
         # this returns the maximum type ie multiline, multipolygon, multipoint if
         # present in geometry
-
-        # type lookup dictionary {oracle_type_number:QgsWkbTypes}
-        
-        type_lookup =  {1:QgsWkbTypes.Point,
-                        2:QgsWkbTypes.LineString,
-                        3:QgsWkbTypes.Polygon,
-                        5:QgsWkbTypes.MultiPoint,
-                        6:QgsWkbTypes.MultiLineString,
-                        7:QgsWkbTypes.MultiPolygon}
-        
-        owner,table = db_table.split('.') 
-        self.check_connection()
-        q = QSqlQuery(self.db) 
-        query = f"SELECT MAX(t.{geom_column_name}.GET_GTYPE()) AS geometry_type from {owner}.{table} t where rownum <10"
-        q.exec(query) 
-        q.first()
-        type_num = q.value(0)
-        if type_num in type_lookup.keys():
-            return type_lookup[type_num]
+        type_num = self.table_metadata(db_table)['gtype']
+        if type_num in self.GTYPE_LOOKUP.keys():
+            return self.GTYPE_LOOKUP[type_num]
         else:
             raise TypeError(f"Unexpected SDO_GEOMETRY TYPE ({type_num}) from Table ({db_table})({geom_column_name})")
 
     def get_bcgw_geomcolumn(self,db_table):
         '''returns the name of the geometry column for oracle table '''
         owner,table = db_table.split('.') 
-        self.check_connection()
-        q = QSqlQuery(self.db) 
         query ="SELECT COLUMN_NAME from all_tab_columns where OWNER = '{}' AND TABLE_NAME = '{}' AND DATA_TYPE = 'SDO_GEOMETRY'".format(owner,table)  
-        q.exec(query) 
-        q.first() 
-        geom_c = q.value(0)
+        geom_c = self.execute(lambda session: self.first_value(session,query),self.fb)
         return geom_c
 
+    def unique_key(self,db_table):
+        ''' returns a column known to be unique in db_table, None if there is none
+            OBJECTID, else the column of a single column primary key or unique constraint
+            (ALL_CONSTRAINTS) - key_column falls back to the first column, which need not be unique
+        '''
+        metadata = self.table_metadata(db_table)
+        if 'unique_key' in metadata:
+            return metadata['unique_key']
+        key_c = None
+        if metadata['key_column'] == 'OBJECTID':
+            key_c = 'OBJECTID'
+        else:
+            owner, table = db_table.split('.')
+            query = "SELECT MIN(cc.COLUMN_NAME) FROM all_constraints c \
+                JOIN all_cons_columns cc ON cc.OWNER = c.OWNER AND cc.CONSTRAINT_NAME = c.CONSTRAINT_NAME \
+                WHERE c.OWNER = :owner AND c.TABLE_NAME = :tab AND c.CONSTRAINT_TYPE IN ('P','U') \
+                GROUP BY c.CONSTRAINT_NAME, c.CONSTRAINT_TYPE HAVING COUNT(*) = 1 ORDER BY c.CONSTRAINT_TYPE"
+            key_c = self.execute(lambda session: self.first_value(session,query,{':owner':owner,':tab':table}),self.fb)
+        # kept with the run's metadata (not in the metadata cache)
+        metadata['unique_key'] = key_c
+        return key_c
+
     def get_bcgw_column_key(self,db_table):
         ''' estimate a unique id column for an oracle table if OBJECTID does not exist '''
         # estimate a unique id column for an oracle table if OBJECTID does not exist
         owner,table = db_table.split('.') 
-        self.check_connection()
-        q = QSqlQuery(self.db)
         sql = f"SELECT cols.column_name \
         FROM all_tab_cols cols where cols.table_name = '{table}' and cols.COLUMN_NAME like \'OBJECTID\'"
-        q.exec(sql)
-        if q.first():
-            key_c = q.value(0)
-        else:
+        key_c = self.execute(lambda session: self.first_value(session,sql),self.fb)
+        if key_c is None:
             sql = f"SELECT COLUMN_NAME FROM all_tab_cols where table_name = '{table}' \
                 order by COLUMN_ID FETCH FIRST 1 ROWS ONLY"
-            q.exec(sql)
-            if q.first():
-                key_c = q.value(0)
+            key_c = self.execute(lambda session: self.first_value(session,sql),self.fb)
 
         return key_c
+
+    def first_value(self,session,query,binds=None):
+        ''' returns the first column of the first row of a query, None if there are no rows
+            (run on the session thread, see execute)
+        '''
+        q = QSqlQuery(session.db)
+        q.setForwardOnly(True)
+        if binds:
+            q.prepare(query)
+            for placeholder, value in binds.items():
+                q.bindValue(placeholder,value)
+            ok = q.exec()
+        else:
+            ok = q.exec(query)
+        value = q.value(0) if ok and q.first() else None
+        q.finish()
+        return value
+
+class db_session:
+    ''' db_session is one pooled QOCISPATIAL connection with its own thread
+        Qt only allows a connection to be used (and closed) by the thread that opened it, so every
+        statement of the session is run on the session thread (see call and submit), any thread can
+        use any session and sessions outlive the runs and workers that use them
+        a caller that stops waiting (cancelled or timed out) abandons its call: the session finishes
+        it (a read stops at its next row, a statement oracle is still executing runs to completion)
+        and only then takes the next call - the pool does not hand it out while it is busy
+        the session thread closes the connection once the pool expires it (idle_timeout) or discards it
+        usage:
+        session = connection_pool.instance().acquire(host,database,user,password)
+        rows = session.call(lambda s: ...s.db...,feedback)
+        connection_pool.instance().release(session)
+    '''
+
+    # seconds between cancel checks while waiting for a call
+    POLL = 0.25
+
+    def __init__(self,pool,key,host,database,user,password):
+        self.pool = pool
+        self.key = key
+        self.db = None
+        # statements prepared on this connection (session thread only)
+        self.prepared = {}
+        # a call is queued or running, guarded by pool.condition
+        self.busy = False
+        self.last_used = time.time()
+        self.calls = queue.Queue()
+        opened = Future()
+        self.thread = threading.Thread(target=self.run,args=(host,database,user,password,opened),
+            name='dissect db session',daemon=True)
+        self.thread.start()
+        # raises the logon error
+        self.name = opened.result()
+
+    def run(self,host,database,user,password,opened):
+        ''' session thread: opens the connection, runs calls until expired or discarded, closes it '''
+        logger.debug('Opening new pooled db connection')
+        conn_name = f"bcgw_conn_{uuid.uuid4().hex}"
+        db = QSqlDatabase.addDatabase("QOCISPATIAL",conn_name)
+        db.setDatabaseName(host + "/" + database)
+        db.setUserName(user) 
+        db.setPassword(password) 
+        if not db.open():
+            logger.error(f"Failed to connect to database: {database}/{host} - Check user/pass")
+            db = None
+            QSqlDatabase.removeDatabase(conn_name)
+            opened.set_exception(Exception(f"Failed to connect to database: {database}/{host} - check username/password"))
+            return
+        self.db = db
+        opened.set_result(conn_name)
+        try:
+            while True:
+                try:
+                    item = self.calls.get(timeout=self.pool.IDLE_CHECK)
+                except queue.Empty:
+                    if self.pool.expire(self):
+                        return
+                    continue
+                if item is None:
+                    return
+                fn, future = item
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(self))
+                    except Exception as e:
+                        future.set_exception(e)
+                future = None
+                self.pool.call_done(self)
+        finally:
+            self.prepared = {}
+            self.db = None
+            db.close()
+            db = None
+            QSqlDatabase.removeDatabase(conn_name)
+            logger.debug(f'db connection {conn_name} closed')
+
+    def submit(self,fn):
+        ''' queues fn(session) on the session thread, returns its Future '''
+        future = Future()
+        with self.pool.condition:
+            self.busy = True
+        self.calls.put((fn,future))
+        return future
+
+    def call(self,fn,feedback=None,timeout=None):
+        ''' returns fn(session) run on the session thread
+            raises layer_cancelled (abandoning the call) once feedback is cancelled or after timeout seconds
+        '''
+        future = self.submit(fn)
+        deadline = time.monotonic()+timeout if timeout is not None else None
+        while True:
+            try:
+                return future.result(timeout=self.POLL)
+            except FutureTimeoutError:
+                if feedback is not None and feedback.isCanceled():
+                    raise layer_cancelled('database call cancelled')
+                if deadline is not None and time.monotonic() > deadline:
+                    raise layer_cancelled(f'database call timed out after {timeout} seconds')
+
+    def close(self):
+        ''' asks the session thread to close the connection once its current call is done '''
+        self.calls.put(None)
+
+    def ping(self):
+        ''' round trip check of the connection (run on the session thread) '''
+        if self.db is None or not self.db.isOpen():
+            return False
+        q = QSqlQuery(self.db)
+        healthy = q.exec('SELECT 1 FROM DUAL') and q.first()
+        q.finish()
+        return healthy
+
+class connection_pool:
+    ''' connection_pool keeps db_sessions open between checkouts so the probe, later rows, later
+        runs and the mirror algorithm skip the oracle logon
+        sessions are keyed by host, database and user (plus a password hash), health checked with a
+        round trip when checked out and closed after idle_timeout seconds unused. Every BCGW read
+        goes through the pool, so max_sessions caps all database sessions of a key: idle, checked
+        out and abandoned ones still finishing a call (see db_session)
+        the pool is process wide, shared by every loaded copy of this script (see instance)
+        usage:
+        session = connection_pool.instance().acquire(host,database,user,password)
+        connection_pool.instance().release(session)
+    '''
+
+    # sys.modules entry holding the pool, shared by every loaded copy of this script
+    HOLDER_MODULE = 'dissect_connection_pool'
+    # seconds an idle session waits between idle_timeout checks
+    IDLE_CHECK = 30
+    # seconds the checkout round trip may take before the session is replaced
+    HEALTH_TIMEOUT = 30
+
+    @classmethod
+    def instance(cls):
+        ''' returns the process wide pool (the Processing toolbox, the mirror algorithm and a
+            reloaded script all load their own copy of this module)
+        '''
+        holder = sys.modules.setdefault(cls.HOLDER_MODULE,types.ModuleType(cls.HOLDER_MODULE))
+        lock = holder.__dict__.setdefault('lock',threading.Lock())
+        with lock:
+            if getattr(holder,'pool',None) is None:
+                holder.pool = cls()
+            return holder.pool
+
+    def __init__(self,max_sessions=4,idle_timeout=600):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.condition = threading.Condition()
+        self.sessions = {} # key: [db_session] open
+        self.idle = {} # key: [db_session] checked in (busy ones are finishing an abandoned call)
+        self.opening = {} # key: count of sessions logging on
+
+    def configure(self,max_sessions=None,idle_timeout=None):
+        ''' updates pool limits, eg from QgsSettings at the start of a run '''
+        with self.condition:
+            if max_sessions:
+                self.max_sessions = int(max_sessions)
+            if idle_timeout is not None:
+                self.idle_timeout = float(idle_timeout)
+            self.condition.notify_all()
+
+    def acquire(self,host,database,user,password,timeout=600):
+        ''' returns a db_session for exclusive use until release
+            reuses the most recently used healthy idle session, else logs on a new one,
+            blocks while max_sessions sessions of the same key are open and none is free
+        '''
+        key = (host,database,user,hashlib.sha256((password or '').encode('utf-8')).hexdigest())
+        deadline = time.monotonic()+timeout
+        while True:
+            with self.condition:
+                while True:
+                    free = [s for s in self.idle.get(key,[]) if not s.busy]
+                    if len(free) > 0:
+                        session = free[-1]
+                        self.idle[key].remove(session)
+                        break
+                    if len(self.sessions.get(key,[]))+self.opening.get(key,0) < self.max_sessions:
+                        session = None
+                        self.opening[key] = self.opening.get(key,0)+1
+                        break
+                    if not self.condition.wait(deadline-time.monotonic()) and time.monotonic() > deadline:
+                        raise Exception(f"Timed out waiting for a database session: {database}/{host}")
+            if session is None:
+                try:
+                    session = db_session(self,key,host,database,user,password)
+                finally:
+                    with self.condition:
+                        self.opening[key] -= 1
+                        if session is not None:
+                            self.sessions.setdefault(key,[]).append(session)
+                        self.condition.notify_all()
+                return session
+            if self.is_healthy(session):
+                logger.debug(f'Reusing pooled db connection {session.name}')
+                return session
+            logger.debug(f'Pooled db connection {session.name} failed health check')
+            self.discard(session)
+
+    def release(self,session,healthy=True):
+        ''' returns a session to the pool (or closes it if unhealthy), a session still running an
+            abandoned call is handed out again once the call ends
+        '''
+        with self.condition:
+            session.last_used = time.time()
+            if healthy and session.thread.is_alive():
+                self.idle.setdefault(session.key,[]).append(session)
+                self.condition.notify_all()
+                return
+        self.discard(session)
+
+    def is_healthy(self,session):
+        ''' round trip check of a pooled session '''
+        try:
+            return session.thread.is_alive() and session.call(db_session.ping,timeout=self.HEALTH_TIMEOUT)
+        except Exception as e:
+            logger.debug(f'db connection {session.name} health check failed - {str(e)}')
+            return False
+
+    def discard(self,session):
+        ''' removes a session from the pool, its thread closes the connection '''
+        with self.condition:
+            self.forget(session)
+            self.condition.notify_all()
+        session.close()
+
+    def forget(self,session):
+        ''' removes a session from the pool lists (call holding condition) '''
+        for sessions in (self.sessions.get(session.key,[]),self.idle.get(session.key,[])):
+            if session in sessions:
+                sessions.remove(session)
+
+    def call_done(self,session):
+        ''' called by the session thread after each call '''
+        with self.condition:
+            session.busy = False
+            session.last_used = time.time()
+            self.condition.notify_all()
+
+    def expire(self,session):
+        ''' returns True (removing it from the pool) if an idle session has been unused for
+            idle_timeout seconds, called by the session thread
+        '''
+        with self.condition:
+            if session.busy or session not in self.idle.get(session.key,[]) or time.time()-session.last_used < self.idle_timeout:
+                return False
+            self.forget(session)
+            self.condition.notify_all()
+        logger.debug(f'Idle db connection {session.name} expired')
+        return True
+
+class metadata_cache:
+    ''' metadata_cache stores oracle_pyqgis.table_metadata results in a sqlite file in the
+        QGIS profile so catalog queries are skipped on later runs
+        entries are keyed by database, table and user and expire after ttl_hours
+        constructor (ttl_hours: float (0 disables the cache),
+                path: str (optional, defaults to <profile>/dissect/dissect_cache.sqlite))
+    '''
+
+    FILE_NAME = 'dissect_cache.sqlite'
+
+    def __init__(self,ttl_hours=24,path=None):
+        if path is None:
+            path = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect',self.FILE_NAME)
+        self.path = path
+        self.ttl = float(ttl_hours)*3600
+        os.makedirs(os.path.dirname(self.path),exist_ok=True)
+        with self.connect() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS table_metadata (
+                database TEXT, db_table TEXT, user TEXT,
+                has_table INTEGER, geom_column TEXT, gtype INTEGER, key_column TEXT,
+                cached_at REAL,
+                PRIMARY KEY (database, db_table, user))""")
+
+    def connect(self):
+        ''' returns a new sqlite connection - one per call keeps the cache usable from worker threads '''
+        return sqlite3.connect(self.path,timeout=30)
+
+    def get(self,database,db_table,user):
+        ''' returns cached metadata dictionary or None if missing/expired '''
+        if self.ttl <= 0:
+            return None
+        with self.connect() as con:
+            row = con.execute("""SELECT has_table, geom_column, gtype, key_column, cached_at
+                FROM table_metadata WHERE database = ? AND db_table = ? AND user = ?""",
+                (database,db_table,user)).fetchone()
+        if row is None or time.time()-row[4] > self.ttl:
+            return None
+        return {'has_table':bool(row[0]),'geom_column':row[1],'gtype':row[2],'key_column':row[3]}
+
+    def put(self,database,db_table,user,metadata):
+        ''' stores a metadata dictionary '''
+        if self.ttl <= 0:
+            return
+        with self.connect() as con:
+            con.execute("""INSERT OR REPLACE INTO table_metadata
+                (database, db_table, user, has_table, geom_column, gtype, key_column, cached_at)
+                VALUES (?,?,?,?,?,?,?,?)""",
+                (database,db_table,user,int(metadata['has_table']),metadata['geom_column'],
+                metadata['gtype'],metadata['key_column'],time.time()))
+
+    def invalidate(self,database=None,db_table=None,user=None):
+        ''' removes cached entries matching all given keys (all entries if none given) '''
+        clauses = []
+        values = []
+        for column, value in (('database',database),('db_table',db_table),('user',user)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                values.append(value)
+        sql = 'DELETE FROM table_metadata'
+        if len(clauses)>0:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        with self.connect() as con:
+            removed = con.execute(sql,values).rowcount
+        logger.debug(f'Metadata cache invalidated ({removed} entries)')
+        return removed
+
+class config_cache:
+    ''' config_cache stores compiled (validated, normalized) configurations as json in the
+        profile sqlite file, keyed by absolute path and invalidated by modification time and size
+        constructor (path: str (optional, defaults to <profile>/dissect/dissect_cache.sqlite))
+    '''
+
+    # bump when DissectAlg.compile_config output changes (eg a new CONFIG_COLUMNS column)
+    # 2: Time Budget column
+    CACHE_VERSION = 2
+
+    def __init__(self,path=None):
+        if path is None:
+            path = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect',metadata_cache.FILE_NAME)
+        self.path = path
+        os.makedirs(os.path.dirname(self.path),exist_ok=True)
+        with self.connect() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS compiled_config (
+                path TEXT PRIMARY KEY, mtime REAL, bytes INTEGER, version INTEGER,
+                data TEXT, compiled_at REAL)""")
+
+    def connect(self):
+        ''' returns a new sqlite connection '''
+        return sqlite3.connect(self.path,timeout=30)
+
+    def get(self,config_file):
+        ''' returns the compiled configuration or None if missing/stale '''
+        stat = os.stat(config_file)
+        with self.connect() as con:
+            row = con.execute("""SELECT data FROM compiled_config
+                WHERE path = ? AND mtime = ? AND bytes = ? AND version = ?""",
+                (os.path.abspath(config_file),stat.st_mtime,stat.st_size,self.CACHE_VERSION)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self,config_file,data):
+        ''' stores a compiled configuration '''
+        stat = os.stat(config_file)
+        with self.connect() as con:
+            con.execute("""INSERT OR REPLACE INTO compiled_config
+                (path, mtime, bytes, version, data, compiled_at) VALUES (?,?,?,?,?,?)""",
+                (os.path.abspath(config_file),stat.st_mtime,stat.st_size,self.CACHE_VERSION,
+                json.dumps(data,default=str),time.time()))
+
+class timing_history:
+    ''' timing_history stores how long each layer took, with the aoi area and feature counts,
+        in the profile sqlite file (the newest KEEP entries of each source are kept)
+        expected_seconds predicts the time of the layers of a new run from them
+        constructor (path: str (optional, defaults to <profile>/dissect/dissect_cache.sqlite))
+    '''
+
+    KEEP = 20
+
+    def __init__(self,path=None):
+        if path is None:
+            path = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect',metadata_cache.FILE_NAME)
+        self.path = path
+        os.makedirs(os.path.dirname(self.path),exist_ok=True)
+        with self.connect() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS layer_timings (
+                source TEXT, title TEXT, aoi_hectares REAL, seconds REAL,
+                rows_fetched INTEGER, rows INTEGER, recorded_at REAL)""")
+            con.execute('CREATE INDEX IF NOT EXISTS layer_timings_source ON layer_timings (source)')
+
+    def connect(self):
+        ''' returns a new sqlite connection '''
+        return sqlite3.connect(self.path,timeout=30)
+
+    def put(self,source,title,aoi_hectares,seconds,rows_fetched=None,rows=None):
+        ''' stores the time of one layer and drops the oldest entries of its source above KEEP '''
+        with self.connect() as con:
+            con.execute("""INSERT INTO layer_timings
+                (source, title, aoi_hectares, seconds, rows_fetched, rows, recorded_at) VALUES (?,?,?,?,?,?,?)""",
+                (source,title,aoi_hectares,seconds,rows_fetched,rows,time.time()))
+            con.execute("""DELETE FROM layer_timings WHERE source = ? AND rowid NOT IN
+                (SELECT rowid FROM layer_timings WHERE source = ? ORDER BY recorded_at DESC LIMIT ?)""",
+                (source,source,self.KEEP))
+
+    def expected_seconds(self,sources,aoi_hectares):
+        ''' returns {source: expected seconds or None (no history)} for an aoi of aoi_hectares
+            each past time is scaled by the square root of the area ratio (part of a layer's time,
+            connecting and querying, does not grow with the area) and the median is used
+        '''
+        wanted = set(sources)
+        scaled = {source:[] for source in wanted}
+        with self.connect() as con:
+            rows = con.execute('SELECT source, aoi_hectares, seconds FROM layer_timings').fetchall()
+        for source, hectares, seconds in rows:
+            if source in wanted and seconds is not None:
+                if hectares is not None and hectares > 0 and aoi_hectares > 0:
+                    seconds = seconds*math.sqrt(aoi_hectares/hectares)
+                scaled[source].append(seconds)
+        return {source:(statistics.median(times) if len(times)>0 else None) for source, times in scaled.items()}
+
+class run_progress:
+    ''' sets the progress bar and estimated time remaining of a run as layers finish,
+        each layer weighted by its expected seconds (see timing_history)
+        constructor (feedback: QgsProcessingFeedback,
+                expected: dict {task index: expected seconds or None})
+    '''
+
+    # progress bar share before (setup) and after (report) the layers
+    START = 5
+    END = 95
+    # expected seconds of layers without history when no layer of the run has any
+    DEFAULT_SECONDS = 10.0
+
+    def __init__(self,feedback,expected):
+        self.feedback = feedback
+        known = [seconds for seconds in expected.values() if seconds is not None]
+        default = statistics.median(known) if len(known)>0 else self.DEFAULT_SECONDS
+        self.expected = {index:(seconds if seconds is not None else default) for index, seconds in expected.items()}
+        self.total = sum(self.expected.values())
+        self.count = len(self.expected)
+        self.done = 0.0
+        self.started = time.time()
+        feedback.setProgress(self.START)
+
+    def layer_done(self,index):
+        ''' advances the progress bar by the expected cost of a finished layer and updates the
+            time remaining (expected seconds left, rescaled by actual/expected seconds so far)
+        '''
+        if index not in self.expected:
+            return
+        self.done += self.expected.pop(index)
+        if self.total > 0:
+            self.feedback.setProgress(self.START+(self.END-self.START)*self.done/self.total)
+        if self.done > 0:
+            remaining = sum(self.expected.values())*(time.time()-self.started)/self.done
+            text = f"{self.count-len(self.expected)}/{self.count} layers, about {self.format_seconds(remaining)} remaining"
+            self.feedback.setProgressText(text)
+            self.feedback.pushInfo(text)
+
+    def format_seconds(self,seconds):
+        ''' returns seconds as a short duration string '''
+        if seconds < 60:
+            return f'{int(round(seconds))} seconds'
+        if seconds < 3600:
+            return f'{int(round(seconds/60))} minutes'
+        return f'{round(seconds/3600,1)} hours'
+
+class result_cache:
+    ''' result_cache stores clipped interest layers (GeoPackage) and their report interest
+        in the QGIS profile, addressed by a hash of the aoi geometry, the source (table or
+        file path plus modification times and sizes), Display Query and Attribute ID
+        least recently used entries are evicted above max_mb and database sources expire
+        after ttl_hours (file sources are invalidated by source_signature)
+        constructor (max_mb: float (0 disables the cache),
+                ttl_hours: float,
+                path: str (optional, defaults to <profile>/dissect/results))
+    '''
+
+    # bump when the cached interest format changes
+    CACHE_VERSION = 1
+    FEATURES_FILE = 'features.gpkg'
+    INTEREST_FILE = 'interest.json'
+    GEOJSON_FILE = 'interest.geojson'
+    # files read alongside a source that invalidate its cached results (see source_signature)
+    SHAPEFILE_SIDECARS = ['.dbf','.shx','.prj','.cpg']
+    SQLITE_SIDECARS = ['-wal']
+
+    def __init__(self,max_mb=500,ttl_hours=24,path=None):
+        profile_path = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect')
+        if path is None:
+            path = os.path.join(profile_path,'results')
+        self.path = path
+        self.index_path = os.path.join(profile_path,metadata_cache.FILE_NAME)
+        self.max_bytes = float(max_mb)*1000000
+        self.ttl = float(ttl_hours)*3600
+        self.enabled = self.max_bytes > 0
+        if not self.enabled:
+            return
+        os.makedirs(self.path,exist_ok=True)
+        with self.connect() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS layer_results (
+                cache_key TEXT PRIMARY KEY, layer_name TEXT, from_database INTEGER,
+                bytes INTEGER, created_at REAL, last_used REAL)""")
+
+    def connect(self):
+        ''' returns a new sqlite connection for the cache index '''
+        return sqlite3.connect(self.index_path,timeout=30)
+
+    @classmethod
+    def key(cls,aoi_hash,source,sql,summary_fields,display=None):
+        ''' returns the content address for a layer result
+            (display: report geometry options the cached GeoJSON was written with)
+        '''
+        content = json.dumps([cls.CACHE_VERSION,aoi_hash,source,sql,summary_fields,display])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def source_signature(cls,location,table):
+        ''' returns the cache source string for a file based source, changing whenever the
+            data changes: modification time and size of location and the files read with it
+            (shapefile sidecars, GeoPackage write-ahead log, file geodatabase contents)
+        '''
+        files = [location]
+        if os.path.isdir(location):
+            files += sorted(os.path.join(location,f) for f in os.listdir(location))
+        else:
+            stem, ext = os.path.splitext(location)
+            if ext.lower() == '.shp':
+                sidecars = cls.SHAPEFILE_SIDECARS
+            elif ext.lower() in ('.gpkg','.sqlite'):
+                sidecars = [ext+suffix for suffix in cls.SQLITE_SIDECARS]
+            else:
+                sidecars = []
+            for sidecar in sidecars:
+                for path in (stem+sidecar, stem+sidecar.upper()):
+                    if os.path.exists(path):
+                        files.append(path)
+                        break
+        stamps = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamps.append(f"{os.path.basename(path)}@{stat.st_mtime}/{stat.st_size}")
+        return f"{os.path.abspath(location)}:{table}:{','.join(stamps)}"
+
+    def get(self,cache_key):
+        ''' returns {'interest': dict, 'features_path': str or None, 'created_at': float}
+            or None on a miss
+        '''
+        if not self.enabled:
+            return None
+        with self.connect() as con:
+            row = con.execute("SELECT from_database, created_at FROM layer_results WHERE cache_key = ?",(cache_key,)).fetchone()
+        if row is None:
+            return None
+        entry_path = os.path.join(self.path,cache_key)
+        if (row[0] and time.time()-row[1] > self.ttl) or not os.path.exists(os.path.join(entry_path,self.INTEREST_FILE)):
+            self.remove(cache_key)
+            return None
+        with open(os.path.join(entry_path,self.INTEREST_FILE),encoding='utf-8') as f:
+            interest = json.load(f)
+        geojson_file = os.path.join(entry_path,self.GEOJSON_FILE)
+        # report.add_cached_interest copies the file before the report is written
+        interest['geojson'] = geojson_file if os.path.exists(geojson_file) else None
+        features_path = os.path.join(entry_path,self.FEATURES_FILE)
+        with self.connect() as con:
+            con.execute("UPDATE layer_results SET last_used = ? WHERE cache_key = ?",(time.time(),cache_key))
+        return {'interest':interest,
+            'features_path':features_path if os.path.exists(features_path) else None,
+            'created_at':row[1]}
+
+    def put(self,cache_key,layer,interest,from_database):
+        ''' stores a clipped layer and its report interest, then evicts down to max_mb '''
+        if not self.enabled:
+            return
+        entry_path = os.path.join(self.path,cache_key)
+        shutil.rmtree(entry_path,ignore_errors=True)
+        os.makedirs(entry_path)
+        if layer is not None and layer.featureCount()>0:
+            options = QgsVectorFileWriter.SaveVectorOptions()
+            options.driverName = "GPKG"
+            options.layerName = layer.name()
+            error = QgsVectorFileWriter.writeAsVectorFormatV3(layer,os.path.join(entry_path,self.FEATURES_FILE),
+                QgsProject.instance().transformContext(),options)
+            if error[0] != QgsVectorFileWriter.NoError:
+                logger.debug(f'Result cache could not store features for {layer.name()}: {error}')
+                shutil.rmtree(entry_path,ignore_errors=True)
+                return
+        stored = {k:v for k,v in interest.items() if k not in ['geojson','geojson_path']}
+        with open(os.path.join(entry_path,self.INTEREST_FILE),'w',encoding='utf-8') as f:
+            json.dump(stored,f,default=str)
+        if interest.get('geojson') is not None:
+            shutil.copyfile(interest['geojson'],os.path.join(entry_path,self.GEOJSON_FILE))
+        size = sum(os.path.getsize(os.path.join(entry_path,f)) for f in os.listdir(entry_path))
+        now = time.time()
+        with self.connect() as con:
+            con.execute("INSERT OR REPLACE INTO layer_results VALUES (?,?,?,?,?,?)",
+                (cache_key,interest.get('name'),int(from_database),size,now,now))
+        self.evict()
+
+    def remove(self,cache_key):
+        ''' removes one entry '''
+        with self.connect() as con:
+            con.execute("DELETE FROM layer_results WHERE cache_key = ?",(cache_key,))
+        shutil.rmtree(os.path.join(self.path,cache_key),ignore_errors=True)
+
+    def evict(self):
+        ''' removes least recently used entries until the cache is under max_mb '''
+        with self.connect() as con:
+            rows = con.execute("SELECT cache_key, bytes FROM layer_results ORDER BY last_used DESC").fetchall()
+        total = 0
+        for cache_key, size in rows:
+            total += size
+            if total > self.max_bytes:
+                logger.debug(f'Result cache evicting {cache_key}')
+                self.remove(cache_key)
+
+class bcgw_mirror:
+    ''' bcgw_mirror keeps local GeoPackage snapshots of BCGW tables (one file per table, written
+        with an R-tree spatial index and an attribute index on the key column) that are read instead
+        of the database for MIRROR Layer Source rows or with 'Read BCGW layers from the local mirror'
+        a dissect_snapshot table in each file records the source table, geometry and key columns,
+        row count, snapshot time (data as of) and the region copied (WKT in EPSG:3005, None for the
+        whole table)
+        constructor (path: str (optional, defaults to <profile>/dissect/mirror))
+        usage:
+        mirror = bcgw_mirror()
+        mirror.snapshot('WHSE_BASEMAPPING.BCGS_20K_GRID',oq_helper)
+        mirror.lookup('WHSE_BASEMAPPING.BCGS_20K_GRID')['snapshot_at']
+    '''
+
+    SNAPSHOT_TABLE = 'dissect_snapshot'
+
+    def __init__(self,path=None):
+        if path is None:
+            path = os.path.join(QgsApplication.qgisSettingsDirPath(),'dissect','mirror')
+        self.path = path
+
+    def file_path(self,db_table):
+        ''' returns the GeoPackage path of a table snapshot '''
+        return os.path.join(self.path,db_table.strip().upper()+'.gpkg')
+
+    def layer_name(self,db_table):
+        ''' returns the GeoPackage layer name of a table snapshot '''
+        return db_table.strip().split('.')[-1].upper()
+
+    def lookup(self,db_table):
+        ''' returns the snapshot record of db_table or None if it is not mirrored
+            {'path','layer','db_table','geom_column','key_column','rows','snapshot_at','region'}
+        '''
+        path = self.file_path(db_table)
+        if not os.path.exists(path):
+            return None
+        try:
+            with contextlib.closing(sqlite3.connect(path)) as con:
+                row = con.execute(f"""SELECT db_table, geom_column, key_column, row_count, snapshot_at, region
+                    FROM {self.SNAPSHOT_TABLE}""").fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f'Mirror snapshot {path} unreadable - {str(e)}')
+            return None
+        if row is None:
+            return None
+        return {'path':path,'layer':self.layer_name(db_table),'db_table':row[0],'geom_column':row[1],
+            'key_column':row[2],'rows':row[3],'snapshot_at':row[4],'region':row[5]}
+
+    def snapshot(self,db_table,oq_helper,region=None,feedback=None):
+        ''' copies db_table to its mirror GeoPackage, replacing an earlier snapshot
+            region: QgsVectorLayer in EPSG:3005 (optional), only rows interacting with it are copied
+            returns the snapshot record
+        '''
+        os.makedirs(self.path,exist_ok=True)
+        layer_name = self.layer_name(db_table)
+        metadata = oq_helper.table_metadata(db_table)
+        assert metadata['has_table'] and metadata['geom_column'] is not None, f"Can not access spatial table {db_table}"
+        # data is as of the start of the copy
+        snapshot_at = datetime.datetime.now().isoformat(timespec='seconds')
+        region_wkt = None
+        geom_c = metadata['geom_column']
+        geom_type = oq_helper.get_bcgw_table_geomtype(db_table=db_table,geom_column_name=geom_c)
+        if region is None:
+            query, binds = f"select t.* from {db_table} t", {}
+        else:
+            region_geom = oq_helper.overlay_geometry(region)
+            window, binds = oq_helper.geometry_binds(region_geom)
+            query = f"select t.* from {db_table} t where sdo_ANYINTERACT (t.{geom_c}, {window}) = 'TRUE'"
+            region_wkt = region_geom.asWkt(3)
+        path = self.file_path(db_table)
+        temp_path = os.path.splitext(path)[0] + '_tmp.gpkg'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.layerName = layer_name
+        options.layerOptions = ['SPATIAL_INDEX=YES']
+        # rows are streamed to the file, the table is never held in memory
+        rows = oq_helper.iter_rows(query,binds,geom_c,feedback)
+        fields = next(rows)
+        writer = QgsVectorFileWriter.create(temp_path,fields,geom_type,QgsCoordinateReferenceSystem('EPSG:3005'),
+            QgsProject.instance().transformContext(),options)
+        try:
+            if writer.hasError() != QgsVectorFileWriter.NoError:
+                raise Exception(f"Could not write mirror of {db_table}: {writer.errorMessage()}")
+            multi = QgsWkbTypes.isMultiType(geom_type)
+            for batch in rows:
+                if not writer.addFeatures([oq_helper.row_feature(fields,attributes,wkb,multi) for attributes, wkb in batch]):
+                    raise Exception(f"Could not write mirror of {db_table}: {writer.errorMessage()}")
+        finally:
+            rows.close()
+            # closes the GeoPackage
+            writer = None
+        key = metadata['key_column']
+        with contextlib.closing(sqlite3.connect(temp_path)) as con:
+            row_count = con.execute(f'SELECT COUNT(*) FROM "{layer_name}"').fetchone()[0]
+            if key is not None:
+                con.execute(f'CREATE INDEX IF NOT EXISTS "{layer_name}_{key}_idx" ON "{layer_name}" ("{key}")')
+            con.execute(f"""CREATE TABLE {self.SNAPSHOT_TABLE} (db_table TEXT, geom_column TEXT,
+                key_column TEXT, row_count INTEGER, snapshot_at TEXT, region TEXT)""")
+            con.execute(f"INSERT INTO {self.SNAPSHOT_TABLE} VALUES (?,?,?,?,?,?)",
+                (db_table,metadata['geom_column'],key,row_count,snapshot_at,region_wkt))
+            con.commit()
+        os.replace(temp_path,path)
+        logger.debug(f'Mirrored {db_table} ({row_count} rows) to {path}')
+        if feedback is not None:
+            feedback.pushInfo(f"{db_table}: {row_count} rows mirrored (as of {snapshot_at})")
+        return self.lookup(db_table)
+
+IMPORT_TIMES['dissect'] = time.perf_counter()-_import_started
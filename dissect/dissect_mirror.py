@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+import os
+import sys
+import types
+import importlib.util
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (QgsProcessing,
+                       QgsProcessingAlgorithm,
+                       QgsProcessingException,
+                       QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterAuthConfig,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterDefinition,
+                       QgsProcessingOutputFolder,
+                       QgsProcessingOutputNumber,
+                       QgsFeatureRequest,
+                       QgsApplication,
+                       QgsSettings)
+from qgis import processing
+
+# dissect.py is loaded from this folder if the toolbox has not loaded it (Processing scripts are not a package)
+DISSECT_MODULE = 'dissect_mirror_core'
+DISSECT_ALGORITHM = 'script:dissect_alg'
+
+def dissect_module():
+    ''' returns the dissect.py module the Processing toolbox loaded, so the mirror shares its
+        classes and database sessions, else the dissect.py next to this script
+    '''
+    alg = QgsApplication.processingRegistry().algorithmById(DISSECT_ALGORITHM)
+    if alg is not None:
+        module = sys.modules.get(type(alg).__module__)
+        if getattr(module,'DissectAlg',None) is type(alg):
+            return module
+        # the toolbox does not always register script modules, their globals are the module namespace
+        return types.SimpleNamespace(**type(alg).processAlgorithm.__globals__)
+    module = sys.modules.get(DISSECT_MODULE)
+    if module is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),'dissect.py')
+        spec = importlib.util.spec_from_file_location(DISSECT_MODULE,path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[DISSECT_MODULE] = module
+    return module
+
+class DissectMirrorAlg(QgsProcessingAlgorithm):
+    """
+    Copies the BCGW tables of a dissect configuration to the local mirror (see bcgw_mirror in dissect.py)
+    """
+
+    XLS_CONFIG_IN = 'XLS_CONFIG_IN'
+    AOI = 'AOI'
+    BUFFER = 'BUFFER'
+    DATABASE = 'DATABASE'
+    HOST = 'HOST'
+    PORT = 'PORT'
+    AUTH_CONFIG = 'AUTH_CONFIG'
+    MIRROR_PATH = 'MIRROR_PATH'
+    MIRRORED = 'MIRRORED'
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return DissectMirrorAlg()
+
+    def name(self):
+        return 'dissect_mirror'
+
+    def displayName(self):
+        return self.tr('dissect - snapshot BCGW tables to local mirror')
+
+    def shortHelpString(self):
+        return self.tr("""
+        Copies the BCGW tables (Layer Source BCGW or MIRROR) of a dissect configuration into local GeoPackages with spatial indexes.
+        dissect reads MIRROR rows, and BCGW rows when 'Read BCGW layers from the local mirror' is checked, from these snapshots and shows the data as of date in the report.
+        Optionally give an area to copy only the rows within the buffer distance of it (the snapshot is only used for areas of interest inside that region).
+        Protected tables are not copied.
+        """)
+
+    def initAlgorithm(self, config=None):
+        s = QgsSettings()
+        s.beginGroup('dissect')
+        self.addParameter(
+            QgsProcessingParameterFile(
+                    name = self.XLS_CONFIG_IN,
+                    description = self.tr('Configuration file (.xlsx, .yml or .csv)'),
+                    fileFilter = 'Configuration files (*.xlsx *.yml *.yaml *.csv)',
+                    defaultValue = s.value('xls_config')
+                    )
+        )
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.AOI,
+                self.tr('Only copy rows near this area (whole tables if blank)'),
+                types=[QgsProcessing.TypeVectorPolygon],
+                optional = True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                    self.BUFFER,
+                    self.tr('Distance around the area to copy (m)'),
+                    type = QgsProcessingParameterNumber.Double,
+                    minValue = 0,
+                    defaultValue = 5000
+                    )
+        )
+        for name, description, key in [(self.DATABASE,'Database','db'),(self.HOST,'Host','host'),(self.PORT,'Port','port')]:
+            param = QgsProcessingParameterString(name,self.tr(description),defaultValue = s.value(key),optional = True)
+            param.setFlags(param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(param)
+        self.addParameter(
+            QgsProcessingParameterAuthConfig(
+                self.AUTH_CONFIG,
+                self.tr('Database authentication'),
+                optional = True
+            )
+        )
+        s.endGroup()
+        self.addOutput(QgsProcessingOutputFolder(self.MIRROR_PATH,self.tr('Mirror folder')))
+        self.addOutput(QgsProcessingOutputNumber(self.MIRRORED,self.tr('Tables mirrored')))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        dissect = dissect_module()
+        alg = dissect.DissectAlg()
+        alg.config()
+        logger = dissect.logger
+        config_file = self.parameterAsFile(parameters, self.XLS_CONFIG_IN, context)
+        buffer_distance = self.parameterAsDouble(parameters, self.BUFFER, context)
+        database = self.parameterAsString(parameters, self.DATABASE, context)
+        host = self.parameterAsString(parameters, self.HOST, context)
+        port = self.parameterAsString(parameters, self.PORT, context)
+        user, password = alg.auth_credentials(self.parameterAsString(parameters, self.AUTH_CONFIG, context))
+
+        layer_tasks = alg.build_layer_tasks(alg.parse_config(config_file))
+        tables = []
+        for task in layer_tasks:
+            if task['location'] in ['BCGW','MIRROR'] and task['table'] is not None:
+                if task['table'] in alg.protected_tables:
+                    feedback.pushInfo(f"{task['table']}: protected table, not mirrored")
+                elif task['table'] not in tables:
+                    tables.append(task['table'])
+        feedback.pushInfo(f"Mirroring {len(tables)} tables to {alg.mirror.path}")
+
+        region = None
+        aoi_source = self.parameterAsSource(parameters, self.AOI, context)
+        if aoi_source is not None:
+            region = aoi_source.materialize(QgsFeatureRequest())
+            if region.crs().authid() != 'EPSG:3005':
+                region = processing.run('native:reprojectlayer', {'INPUT': region, 'TARGET_CRS': 'EPSG:3005', 'OUTPUT': 'memory:region'})['OUTPUT']
+            region = processing.run('native:buffer', {'INPUT': region, 'DISTANCE': buffer_distance, 'SEGMENTS': 8,
+                'DISSOLVE': True, 'OUTPUT': 'memory:region'})['OUTPUT']
+
+        oq_helper = dissect.oracle_pyqgis(database=database,host=host,port=port,user=user,password=password,
+            feedback=None,cache=dissect.metadata_cache(ttl_hours=alg.METADATA_TTL))
+        mirrored = 0
+        try:
+            oq_helper.probe_tables(tables)
+            for n, db_table in enumerate(tables):
+                if feedback.isCanceled():
+                    break
+                feedback.setProgress(100*n/max(len(tables),1))
+                try:
+                    alg.mirror.snapshot(db_table,oq_helper,region=region,feedback=feedback)
+                    mirrored += 1
+                except Exception as e:
+                    logger.error(f'{db_table}: mirror failed - {str(e)}')
+                    feedback.pushInfo(f"{db_table}: could not be mirrored - {str(e)}")
+        finally:
+            oq_helper.close_db_connection()
+        if mirrored == 0 and len(tables) > 0:
+            raise QgsProcessingException('No tables could be mirrored')
+        return {self.MIRROR_PATH: alg.mirror.path, self.MIRRORED: mirrored}
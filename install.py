@@ -76,6 +76,25 @@ s.setValue('host', defaults['host'])
 s.setValue('port', defaults['port'])
 s.setValue('xls_config', defaults['xls_config']) 
 s.setValue('outpath', defaults['outpath'])
+s.setValue('workers', defaults.get('workers'))
+s.setValue('metadata_ttl', defaults.get('metadata_ttl'))
+s.setValue('server_clip', defaults.get('server_clip'))
+s.setValue('filter_simplify', defaults.get('filter_simplify'))
+s.setValue('max_sessions', defaults.get('max_sessions'))
+s.setValue('idle_timeout', defaults.get('idle_timeout'))
+s.setValue('result_cache_mb', defaults.get('result_cache_mb'))
+s.setValue('result_cache_ttl', defaults.get('result_cache_ttl'))
+s.setValue('report_precision', defaults.get('report_precision'))
+s.setValue('display_zoom', defaults.get('display_zoom'))
+s.setValue('report_geometry', defaults.get('report_geometry'))
+s.setValue('diagnostics', defaults.get('diagnostics'))
+s.setValue('use_mirror', defaults.get('use_mirror'))
+s.setValue('mirror_path', defaults.get('mirror_path'))
+s.setValue('build_indexes', defaults.get('build_indexes'))
+s.setValue('tile_hectares', defaults.get('tile_hectares'))
+s.setValue('tile_vertices', defaults.get('tile_vertices'))
+s.setValue('time_budget', defaults.get('time_budget'))
+s.setValue('memory_profile', defaults.get('memory_profile'))
 s.endArray()
 
 # add to QGIS scripts folder list
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+''' shared fixtures: a headless QgsApplication and the dissect script loaded as a module
+    (the script lives in the Processing scripts folder, not an installed package)
+    run from the repository root with: python -m pytest tests
+'''
+import os
+import sys
+import importlib.util
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'dissect','dissect.py')
+
+@pytest.fixture(scope='session')
+def qgis_app():
+    ''' a QgsApplication for the test session (reuses a running one, eg inside QGIS),
+        tests are skipped where QGIS is not installed
+    '''
+    QgsApplication = pytest.importorskip('qgis.core').QgsApplication
+    app = QgsApplication.instance()
+    if app is None:
+        app = QgsApplication([],False)
+        app.initQgis()
+    return app
+
+@pytest.fixture(scope='session')
+def dissect(qgis_app):
+    ''' the dissect script module '''
+    module = sys.modules.get('dissect_under_test')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('dissect_under_test',SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['dissect_under_test'] = module
+        spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+''' configuration reading and compiling (user-012): csv groups, normalized rows, compiled cache '''
+import os
+
+import pytest
+
+CSV = '''Group,Layer Name,Feature Class Name,Layer Source,Display Query,Time Budget
+Roads,Highways,WHSE_BASEMAPPING.DRA_DGTL_ROAD_ATLAS_MPAR_SP,BCGW,ROAD_CLASS = 'highway',
+Water,Streams,WHSE_BASEMAPPING.FWA_STREAM_NETWORKS_SP,BCGW, ,30
+Roads,Trails,trails.shp,C:/data, ,
+'''
+
+@pytest.fixture
+def alg(dissect):
+    return dissect.DissectAlg()
+
+def test_csv_groups_keep_first_seen_order(alg,tmp_path):
+    path = tmp_path/'config.csv'
+    path.write_text(CSV,encoding='utf-8')
+    sheets = alg.read_csv_config(str(path))
+    assert [group for group, rows in sheets] == ['Roads','Water']
+    assert [row['Layer Name'] for row in sheets[0][1]] == ['Highways','Trails']
+    assert 'Group' not in sheets[0][1][0]
+    # blank cells are None
+    assert sheets[1][1][0]['Display Query'] is None
+
+def test_csv_reads_utf8_bom(alg,tmp_path):
+    path = tmp_path/'config.csv'
+    path.write_bytes(b'\xef\xbb\xbf'+CSV.encode('utf-8'))
+    assert [group for group, rows in alg.read_csv_config(str(path))] == ['Roads','Water']
+
+def test_csv_without_group_column(alg,tmp_path):
+    path = tmp_path/'config.csv'
+    path.write_text('Layer Name,Feature Class Name,Layer Source\nRoads,roads.shp,C:/data\n',encoding='utf-8')
+    with pytest.raises(AssertionError,match='Group'):
+        alg.read_csv_config(str(path))
+
+def test_compile_keeps_config_columns_only(alg):
+    rows = [{' Layer Name ':'Roads','Feature Class Name':'roads.shp','Layer Source':'C:/data',
+        'Display Query':'  ','Time Budget':float('nan'),'Notes':'not a config column'}]
+    data = alg.compile_config([('Roads',rows)],'config.yml')
+    assert list(data[0]) == ['Roads']
+    row = data[0]['Roads'][0]
+    assert list(row) == alg.CONFIG_COLUMNS
+    assert row['Layer Name'] == 'Roads'
+    assert row['Display Query'] is None
+    assert row['Time Budget'] is None
+    assert row['Server Clip'] is None
+
+def test_compile_requires_columns(alg):
+    with pytest.raises(AssertionError,match='Layer Source'):
+        alg.compile_config([('Roads',[{'Layer Name':'Roads','Feature Class Name':'roads.shp'}])],'config.yml')
+    with pytest.raises(AssertionError,match='mapping'):
+        alg.compile_config([('Roads',['Roads'])],'config.yml')
+
+def test_cache_returns_compiled_config(dissect,alg,tmp_path):
+    config = tmp_path/'config.csv'
+    config.write_text(CSV,encoding='utf-8')
+    cache = dissect.config_cache(str(tmp_path/'cache.sqlite'))
+    assert cache.get(str(config)) is None
+    data = alg.compile_config(alg.read_csv_config(str(config)),str(config))
+    cache.put(str(config),data)
+    assert cache.get(str(config)) == data
+
+def test_cache_invalidated_by_edit(dissect,alg,tmp_path):
+    config = tmp_path/'config.csv'
+    config.write_text(CSV,encoding='utf-8')
+    cache = dissect.config_cache(str(tmp_path/'cache.sqlite'))
+    cache.put(str(config),alg.compile_config(alg.read_csv_config(str(config)),str(config)))
+    stat = os.stat(config)
+    # same modification time, only the size differs
+    config.write_text(CSV+'Water,Lakes,lakes.shp,C:/data, ,\n',encoding='utf-8')
+    os.utime(config,(stat.st_atime,stat.st_mtime))
+    assert cache.get(str(config)) is None
+
+def test_cache_invalidated_by_version(dissect,alg,tmp_path,monkeypatch):
+    config = tmp_path/'config.csv'
+    config.write_text(CSV,encoding='utf-8')
+    cache = dissect.config_cache(str(tmp_path/'cache.sqlite'))
+    cache.put(str(config),alg.compile_config(alg.read_csv_config(str(config)),str(config)))
+    monkeypatch.setattr(dissect.config_cache,'CACHE_VERSION',dissect.config_cache.CACHE_VERSION+1)
+    assert cache.get(str(config)) is None
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+''' bound area of interest (user-004): oriented, rounded WKT bound in chunks '''
+import pytest
+
+@pytest.fixture
+def helper(dissect):
+    # only the geometry helpers are used, no database connection is opened
+    helper = object.__new__(dissect.oracle_pyqgis)
+    helper.session = None
+    return helper
+
+def test_exterior_counterclockwise_interior_clockwise(dissect,helper):
+    # exterior clockwise, interior counterclockwise
+    geom = dissect.QgsGeometry.fromWkt('POLYGON ((0 0, 0 10, 10 10, 10 0, 0 0), (2 2, 4 2, 4 4, 2 4, 2 2))')
+    assert helper.polygon_wkt(geom) == ('POLYGON ((0.0 0.0,10.0 0.0,10.0 10.0,0.0 10.0,0.0 0.0),'
+        '(2.0 2.0,2.0 4.0,4.0 4.0,4.0 2.0,2.0 2.0))')
+
+def test_oriented_rings_kept(dissect,helper):
+    geom = dissect.QgsGeometry.fromWkt('POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))')
+    assert helper.polygon_wkt(geom) == 'POLYGON ((0.0 0.0,10.0 0.0,10.0 10.0,0.0 10.0,0.0 0.0))'
+
+def test_ordinates_rounded_to_millimetre(dissect,helper):
+    geom = dissect.QgsGeometry.fromWkt('POLYGON ((1000000.12345 500000.98765, 1000010.5 500000.98765, 1000010.5 500010.0004, 1000000.12345 500000.98765))')
+    assert helper.polygon_wkt(geom) == 'POLYGON ((1000000.123 500000.988,1000010.5 500000.988,1000010.5 500010.0,1000000.123 500000.988))'
+
+def test_multipolygon(dissect,helper):
+    geom = dissect.QgsGeometry.fromWkt('MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((5 5, 6 5, 6 6, 5 5)))')
+    assert helper.polygon_wkt(geom) == 'MULTIPOLYGON (((0.0 0.0,1.0 0.0,1.0 1.0,0.0 0.0)),((5.0 5.0,6.0 5.0,6.0 6.0,5.0 5.0)))'
+
+def test_empty(dissect,helper):
+    assert helper.polygon_wkt(None) is None
+    assert helper.polygon_wkt(dissect.QgsGeometry()) is None
+    with pytest.raises(ValueError):
+        helper.geometry_binds(dissect.QgsGeometry())
+
+def test_small_geometry_one_bind(dissect,helper):
+    geom = dissect.QgsGeometry.fromWkt('POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))')
+    sql, binds = helper.geometry_binds(geom)
+    assert sql == 'SDO_GEOMETRY(TO_CLOB(:dissect_g0), 3005)'
+    assert binds == {':dissect_g0':helper.polygon_wkt(geom)}
+
+def test_large_geometry_chunked(dissect,helper):
+    from qgis.core import QgsPointXY
+    points = [QgsPointXY(1000000+n*0.5,500000+(n%2)*0.25) for n in range(2000)]
+    points += [QgsPointXY(1001000,501000),QgsPointXY(1000000,501000),points[0]]
+    geom = dissect.QgsGeometry.fromPolygonXY([points])
+    wkt = helper.polygon_wkt(geom)
+    sql, binds = helper.geometry_binds(geom)
+    assert len(binds) == -(-len(wkt)//helper.BIND_CHUNK) > 1
+    assert all(len(piece) <= helper.BIND_CHUNK for piece in binds.values())
+    assert ''.join(binds.values()) == wkt
+    assert sql == 'SDO_GEOMETRY(' + '||'.join(f'TO_CLOB({p})' for p in binds) + ', 3005)'
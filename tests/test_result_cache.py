@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+''' result_cache keys (user-007): file sources invalidate on any file read with them '''
+import os
+
+def touch(path,content=b'x'):
+    with open(path,'wb') as f:
+        f.write(content)
+
+def key(dissect,location,table='roads'):
+    source = dissect.result_cache.source_signature(str(location),table)
+    return dissect.result_cache.key('aoi',source,'',['NAME'])
+
+def test_key_is_stable(dissect,tmp_path):
+    shp = tmp_path/'roads.shp'
+    for ext in ['.shp','.dbf','.shx','.prj']:
+        touch(tmp_path/f'roads{ext}')
+    assert key(dissect,shp) == key(dissect,shp)
+
+def test_key_follows_table_and_inputs(dissect,tmp_path):
+    shp = tmp_path/'roads.shp'
+    touch(shp)
+    source = dissect.result_cache.source_signature(str(shp),'roads')
+    base = dissect.result_cache.key('aoi',source,'',['NAME'])
+    assert base != dissect.result_cache.key('other aoi',source,'',['NAME'])
+    assert base != dissect.result_cache.key('aoi',source,"NAME = 'A'",['NAME'])
+    assert base != dissect.result_cache.key('aoi',source,'',['NAME'],display=[6,0])
+    assert source != dissect.result_cache.source_signature(str(shp),'rivers')
+
+def test_shapefile_sidecar_changes_key(dissect,tmp_path):
+    shp = tmp_path/'roads.shp'
+    for ext in ['.shp','.dbf','.shx','.prj']:
+        touch(tmp_path/f'roads{ext}')
+    before = key(dissect,shp)
+    # attribute edits only rewrite the .dbf, same mtime so only the size differs
+    dbf = tmp_path/'roads.dbf'
+    stat = os.stat(dbf)
+    touch(dbf,b'xy')
+    os.utime(dbf,(stat.st_atime,stat.st_mtime))
+    assert key(dissect,shp) != before
+
+def test_added_sidecar_changes_key(dissect,tmp_path):
+    shp = tmp_path/'roads.shp'
+    touch(shp)
+    before = key(dissect,shp)
+    touch(tmp_path/'roads.cpg',b'UTF-8')
+    assert key(dissect,shp) != before
+
+def test_geopackage_wal_changes_key(dissect,tmp_path):
+    gpkg = tmp_path/'roads.gpkg'
+    touch(gpkg)
+    before = key(dissect,gpkg)
+    touch(tmp_path/'roads.gpkg-wal',b'pending pages')
+    with_wal = key(dissect,gpkg)
+    assert with_wal != before
+    touch(tmp_path/'roads.gpkg-wal',b'more pending pages')
+    assert key(dissect,gpkg) != with_wal
+
+def test_unrelated_file_keeps_key(dissect,tmp_path):
+    shp = tmp_path/'roads.shp'
+    touch(shp)
+    before = key(dissect,shp)
+    touch(tmp_path/'rivers.dbf')
+    assert key(dissect,shp) == before
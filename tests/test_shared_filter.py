@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+''' shared fetches (user-019): which Display Queries can be split from one fetch locally '''
+import pytest
+
+@pytest.fixture
+def alg(dissect):
+    return dissect.DissectAlg()
+
+@pytest.fixture
+def fields(dissect):
+    from qgis.PyQt.QtCore import QVariant
+    fields = dissect.QgsFields()
+    fields.append(dissect.QgsField('NAME',QVariant.String))
+    fields.append(dissect.QgsField('AREA_HA',QVariant.Double))
+    fields.append(dissect.QgsField('CLASS',QVariant.Int))
+    return fields
+
+@pytest.mark.parametrize('sql,comparisons',[
+    ("NAME = 'A'",[('NAME','A')]),
+    ("'A' = NAME",[('NAME','A')]),
+    ("AREA_HA >= 10 AND NOT CLASS <> 3",[('AREA_HA',10),('CLASS',3)]),
+    ("CLASS IN (1, 2) OR NAME IS NULL",[('CLASS',1),('CLASS',2)]),
+    ("NAME IS NOT NULL",[]),
+])
+def test_plain_comparisons_are_shared(alg,sql,comparisons):
+    assert alg.shared_filter(sql) == comparisons
+
+@pytest.mark.parametrize('sql',[
+    "NAME LIKE 'A%'",
+    "upper(NAME) = 'A'",
+    "AREA_HA * 2 > 10",
+    "NAME = CLASS",
+    "NAME = NULL",
+    "CLASS IN (1, NULL)",
+    "NAME IS 'A'",
+    "NAME = (",
+])
+def test_other_filters_are_not_shared(alg,sql):
+    assert alg.shared_filter(sql) is None
+
+def test_collect_comparisons_appends(dissect,alg):
+    comparisons = [('NAME','A')]
+    expression = dissect.QgsExpression("CLASS = 1")
+    assert alg.collect_comparisons(expression.rootNode(),comparisons)
+    assert comparisons == [('NAME','A'),('CLASS',1)]
+
+def test_types_match(alg,fields):
+    assert alg.shared_filter_types_match([('NAME','A'),('AREA_HA',1.5),('CLASS',3)],fields)
+    assert alg.shared_filter_types_match([],fields)
+
+@pytest.mark.parametrize('comparisons',[
+    [('NAME',1)],
+    [('CLASS','3')],
+    [('CLASS',True)],
+    [('MISSING','A')],
+])
+def test_types_mismatch(alg,fields,comparisons):
+    assert not alg.shared_filter_types_match(comparisons,fields)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+''' aoi tiling (user-022): tiles cover the aoi, only large aois are tiled unless tile_vertices is set '''
+import math
+
+import pytest
+
+@pytest.fixture
+def alg(dissect):
+    alg = dissect.DissectAlg()
+    alg.TILE_VERTICES = 0
+    return alg
+
+def aoi_layer(dissect,geom):
+    layer = dissect.QgsMemoryProviderUtils.createMemoryLayer('aoi',dissect.QgsFields(),
+        dissect.QgsWkbTypes.Polygon,dissect.QgsCoordinateReferenceSystem('EPSG:3005'))
+    feature = dissect.QgsFeature()
+    feature.setGeometry(geom)
+    layer.dataProvider().addFeatures([feature])
+    return layer
+
+def square(dissect,x,y,side):
+    return dissect.QgsGeometry.fromRect(dissect.QgsRectangle(x,y,x+side,y+side))
+
+def circle(dissect,radius,vertices):
+    from qgis.core import QgsPointXY
+    points = [QgsPointXY(radius*math.cos(2*math.pi*n/vertices),radius*math.sin(2*math.pi*n/vertices)) for n in range(vertices)]
+    return dissect.QgsGeometry.fromPolygonXY([points+[points[0]]])
+
+def test_tiling_disabled(dissect,alg):
+    assert alg.plan_tiles(aoi_layer(dissect,square(dissect,0,0,10000)),0) == []
+
+def test_small_aoi_not_tiled(dissect,alg):
+    # 100 ha aoi, 1000 ha tiles
+    assert alg.plan_tiles(aoi_layer(dissect,square(dissect,0,0,1000)),1000) == []
+
+def test_small_detailed_aoi_not_tiled_by_default(dissect,alg):
+    aoi = aoi_layer(dissect,circle(dissect,500,2000))
+    assert alg.plan_tiles(aoi,1000) == []
+
+def test_large_aoi_tiles_cover_it(dissect,alg):
+    # 400 ha aoi, 100 ha tiles
+    geom = square(dissect,0,0,2000)
+    tiles = alg.plan_tiles(aoi_layer(dissect,geom),100)
+    assert len(tiles) == 4
+    assert sum(tile.area() for tile in tiles) == pytest.approx(geom.area())
+    assert dissect.QgsGeometry.unaryUnion(tiles).isGeosEqual(geom)
+
+def test_tiles_are_parts_of_the_aoi(dissect,alg):
+    geom = circle(dissect,2000,64)
+    tiles = alg.plan_tiles(aoi_layer(dissect,geom),100)
+    assert len(tiles) > 1
+    assert sum(tile.area() for tile in tiles) == pytest.approx(geom.area())
+    for tile in tiles:
+        assert tile.area() <= 100*10000*(1+1e-9)
+
+def test_vertex_trigger_is_opt_in(dissect,alg):
+    aoi = aoi_layer(dissect,circle(dissect,500,2000))
+    alg.TILE_VERTICES = 499
+    tiles = alg.plan_tiles(aoi,1000)
+    assert len(tiles) > 1
+    side = math.sqrt(1000*10000)
+    for tile in tiles:
+        # split until detailed enough, or down to the smallest tile
+        assert (tile.constGet().nCoordinates() <= alg.TILE_VERTICES
+            or tile.boundingBox().width() <= side*alg.TILE_MIN_FRACTION)